@@ -1,6 +1,7 @@
 """The entry point of the program. This file contains the main loop."""
 
 import asyncio
+import sys
 from typing import Callable, Awaitable
 
 from config import SECONDS_PER_FRAME
@@ -27,6 +28,27 @@ async def main_loop(body: Callable[[], Awaitable]):
         else:
             await asyncio.sleep(next_frame - loop.time())
 
-if __name__ == '__main__':
+
+async def main() -> int:
+    """Run the vision loop until the control loop, which runs in its own thread, has landed the drone.
+
+    :returns: The exit status of the control loop, or 1 if it ended without landing.
+    :raises Exception: Whatever made the vision loop fail, once the control loop has been stopped."""
     targeting = TargetFinder()
-    asyncio.run(main_loop(targeting.loop_body))
+    control = targeting.drone_control.start()
+    vision = asyncio.create_task(main_loop(targeting.loop_body))
+    control_ended = asyncio.create_task(asyncio.to_thread(control.join))
+    await asyncio.wait([vision, control_ended], return_when=asyncio.FIRST_COMPLETED)
+    if vision.done():
+        # The vision loop only ends by failing. Without it, the control loop would steer by the last frame.
+        targeting.drone_control.stop()
+        await control_ended
+        vision.result()
+    vision.cancel()
+    if targeting.drone_control.exitStatus is None:
+        print('ALERT: The control loop ended without landing.')
+        return 1
+    return targeting.drone_control.exitStatus
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
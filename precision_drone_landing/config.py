@@ -9,6 +9,29 @@ the FOV of the camera that is being used.
 The ARDUPILOT_CONNECTION setting connects to the drone. Note that the current default
 IP address is set. This connection method may need to be updated when this software
 is installed in a drone.
+The DISPLACEMENT_ENGINE setting chooses how position is estimated from the QR codes:
+"regressor" (the default) uses the learned regressor, "homography" solves for the pose analytically,
+and "lookup" interpolates in a precomputed grid built by scripts/build_lookup_grid.py.
+Setting REFINE_POSE to 1 tracks the pose from frame to frame, starting each frame from the
+previous one and only falling back to DISPLACEMENT_ENGINE when tracking is lost. See pose_refiner.py.
+The PREDICTION_CACHE_SIZE and PREDICTION_CACHE_STEP settings control the cache of displacement
+predictions that saves work while the drone hovers. A size of 0 disables it. See prediction_cache.py.
+The MODEL_CACHE_DIR setting is where models built by scripts/build_model.py are kept. See model_cache.py.
+The LAYER_ESTIMATOR setting chooses how the recent positions of each layer are averaged: "window" (the
+default) weights every position of the last few seconds, and "decayed" keeps an exponentially decayed
+average with a time constant of LAYER_TIME_CONSTANT seconds. See layer_estimators.py.
+The LAYER_FUSION setting chooses how the layers are combined: "mean" (the default) takes the mean of the
+layer averages, and "robust" weights every recent estimate by its layer's accuracy at the current height
+and leaves out outliers. See fusion.py.
+Setting TRACK_TARGET to 1 steers by a Kalman filter that fuses the estimates of every layer and predicts
+the position between frames and through short dropouts. See target_tracker.py.
+The LOG_FORMAT setting chooses how logs are written: "csv" (the default) or "binary", a compact columnar
+format that log.py reads back and exports to CSV.
+The control loop updates the drone's velocity CONTROL_RATE times per second, independently of the frame
+rate, in a thread of its own. Between frames it steers by the tracker's prediction with TRACK_TARGET, and otherwise
+only sends the last command again, so without TRACK_TARGET steering still changes once per frame. See DroneControl.run.
+The FRAME_BUDGET, DECODE_BUDGET and PREVIEW_BUDGET settings (seconds) control when the
+main loop starts shedding optional work. See degradation.py.
 """
 import json
 import os
@@ -17,6 +40,20 @@ MAX_FRAMES_PER_SECOND = float(os.environ.get('MAX_FRAMES_PER_SECOND') or 15)
 SECONDS_PER_FRAME = 1 / MAX_FRAMES_PER_SECOND
 HORIZONTAL_FIELD_OF_VIEW = float(os.environ.get('HORIZONTAL_FIELD_OF_VIEW') or 85)  # degrees
 TAKEOFF_HEIGHT = float(os.environ.get('TAKEOFF_HEIGHT') or 10)  # meters
+DISPLACEMENT_ENGINE = os.environ.get('DISPLACEMENT_ENGINE') or 'regressor'
+REFINE_POSE = bool(int(os.environ.get('REFINE_POSE') or 0))
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE') or 256)
+PREDICTION_CACHE_STEP = float(os.environ.get('PREDICTION_CACHE_STEP') or 1e-5)  # radians
+MODEL_CACHE_DIR = os.environ.get('MODEL_CACHE_DIR') or '~/.cache/precision_drone_landing/models'
+LAYER_ESTIMATOR = os.environ.get('LAYER_ESTIMATOR') or 'window'
+LAYER_TIME_CONSTANT = float(os.environ.get('LAYER_TIME_CONSTANT') or 1)  # seconds
+LAYER_FUSION = os.environ.get('LAYER_FUSION') or 'mean'
+TRACK_TARGET = bool(int(os.environ.get('TRACK_TARGET') or 0))
+LOG_FORMAT = os.environ.get('LOG_FORMAT') or 'csv'
+CONTROL_RATE = float(os.environ.get('CONTROL_RATE') or 30)  # updates per second
+FRAME_BUDGET = float(os.environ.get('FRAME_BUDGET') or SECONDS_PER_FRAME)  # seconds
+DECODE_BUDGET = float(os.environ.get('DECODE_BUDGET') or FRAME_BUDGET / 2)  # seconds
+PREVIEW_BUDGET = float(os.environ.get('PREVIEW_BUDGET') or FRAME_BUDGET / 4)  # seconds
 ARDUPILOT_CONNECTION: str = os.environ.get('ARDUPILOT_CONNECTION') or 'tcp:127.0.0.1:5762'
 with open('../config/qr_sizes.json', 'r') as qr_sizes_file:
     QR_SIZES = json.load(qr_sizes_file)
@@ -0,0 +1,147 @@
+"""Sheds optional per-frame work when the frame loop overruns its time budget."""
+import math
+import statistics
+import time
+from collections import deque
+from enum import IntEnum, unique
+from typing import Dict, Mapping, Optional
+
+from log import Logger
+
+
+@unique
+class QualityLevel(IntEnum):
+    """An enumeration of the levels of work shedding, in the order they are applied.
+
+    Each level keeps the savings of every level before it. That is, at REDUCED_DECODE
+    the preview is also disabled."""
+    FULL = 0
+    NO_PREVIEW = 1
+    REDUCED_DECODE = 2
+    REDUCED_LOGGING = 3
+
+
+class DegradationPolicy:
+    """Decides how much optional work each frame may do, based on how long previous frames took.
+
+    Every frame, the caller reports how long each stage took. When frames keep overrunning
+    their budgets, the policy moves one level down the QualityLevel list. When frames keep
+    finishing with time to spare, it moves one level back up. Each transition is printed
+    and written to a log file so that it can be audited after a flight.
+
+    Time to spare is judged by what a frame would cost at the level above, not at the current
+    level: the first frames at each level measure how much time it saves compared to the level
+    above, and that saving is added back to every later frame. Otherwise a steady load that only
+    fits the budget thanks to a level would restore the level above, overrun, and shed the work
+    again, over and over."""
+
+    def __init__(
+            self,
+            frame_budget: float,
+            stage_budgets: Optional[Mapping[str, float]] = None,
+            degrade_after: int = 3,
+            restore_after: int = 30,
+            headroom: float = 0.7,
+            log_filename: str = 'Degradation_Log.csv'):
+        """
+        :param frame_budget: The time in seconds that a whole frame may take.
+        :param stage_budgets: A dictionary-like object mapping from stage names (e.g. "decode") to
+            the time in seconds that the stage may take. Stages without a budget are only counted
+            towards the frame total.
+        :param degrade_after: The number of consecutive overrunning frames before shedding more work.
+        :param restore_after: The number of consecutive frames with headroom before restoring work.
+        :param headroom: A frame has headroom when it would take less than this fraction of the frame
+            budget at the level above the current one.
+        :param log_filename: The name of the log file that transitions are written to.
+        """
+        self.frame_budget = frame_budget
+        self.stage_budgets = dict(stage_budgets or {})
+        self.degrade_after = degrade_after
+        self.restore_after = restore_after
+        self.headroom = headroom
+        self.level = QualityLevel.FULL
+        self._overruns = 0
+        self._underruns = 0
+        self._frame = 0
+        # The frame times since the current level was entered, of which the first measure its saving
+        self._recent = deque(maxlen=degrade_after)
+        # The cost of a frame just before the current level was entered
+        self._departure_cost: Optional[float] = None
+        # The time in seconds that each level saves per frame compared to the level above it
+        self._savings: Dict[QualityLevel, float] = {}
+        self.logger = Logger(log_filename, ["Time", "Frame", "From", "To", "Reason", "Frame Seconds"],
+                             dtypes=["<f8", "<i8", "|S16", "|S16", "|S16", "<f4"])
+
+    @property
+    def preview_enabled(self) -> bool:
+        """Whether the preview window should be drawn this frame."""
+        return self.level < QualityLevel.NO_PREVIEW
+
+    @property
+    def reduced_decode(self) -> bool:
+        """Whether the recognizer should decode a region of interest or a downscaled frame."""
+        return self.level >= QualityLevel.REDUCED_DECODE
+
+    @property
+    def reduced_logging(self) -> bool:
+        """Whether per-frame logs should be thinned out."""
+        return self.level >= QualityLevel.REDUCED_LOGGING
+
+    def update(self, timings: Mapping[str, float]) -> QualityLevel:
+        """Report the stage timings of the frame that just finished.
+
+        :param timings: A dictionary-like object mapping from stage names to the time in seconds
+            that the stage took this frame.
+        :returns: The quality level that the next frame should run at."""
+        self._frame += 1
+        frame_seconds = sum(timings.values())
+        self._recent.append(frame_seconds)
+        if self.level not in self._savings and len(self._recent) == self._recent.maxlen \
+                and self._departure_cost is not None:
+            self._savings[self.level] = max(0.0, self._departure_cost - statistics.fmean(self._recent))
+        reason = self._overrun_reason(timings, frame_seconds)
+        if reason:
+            self._overruns += 1
+            self._underruns = 0
+            if self._overruns >= self.degrade_after and self.level < max(QualityLevel):
+                self._departure_cost = statistics.fmean(self._recent)
+                self._savings.pop(QualityLevel(self.level + 1), None)
+                self._transition(QualityLevel(self.level + 1), reason, frame_seconds)
+                self._overruns = 0
+        elif self._restored_cost(frame_seconds) < self.headroom * self.frame_budget:
+            self._underruns += 1
+            self._overruns = 0
+            if self._underruns >= self.restore_after and self.level > QualityLevel.FULL:
+                self._transition(QualityLevel(self.level - 1), 'headroom', frame_seconds)
+                self._underruns = 0
+        else:
+            # Within budget but without headroom, so there is no reason to move either way.
+            self._overruns = 0
+            self._underruns = 0
+        return self.level
+
+    def _restored_cost(self, frame_seconds: float) -> float:
+        """Estimate what a frame would have cost one level up.
+
+        :param frame_seconds: The time in seconds the frame took at the current level.
+        :returns: The estimated time in seconds, which is infinite while the saving of the current level
+            is still being measured."""
+        if self.level == QualityLevel.FULL:
+            return frame_seconds
+        return frame_seconds + self._savings.get(self.level, math.inf)
+
+    def _overrun_reason(self, timings: Mapping[str, float], frame_seconds: float) -> Optional[str]:
+        """Return a short description of why this frame overran, or None if it did not."""
+        for stage, budget in self.stage_budgets.items():
+            if timings.get(stage, 0) > budget:
+                return f'{stage} overrun'
+        if frame_seconds > self.frame_budget:
+            return 'frame overrun'
+        return None
+
+    def _transition(self, new_level: QualityLevel, reason: str, frame_seconds: float):
+        """Move to a new quality level and record the transition."""
+        print(f'Degradation: {self.level.name} -> {new_level.name} ({reason}, {frame_seconds * 1000:.1f} ms)')
+        self.logger.writeline([time.time(), self._frame, self.level.name, new_level.name, reason, frame_seconds])
+        self.level = new_level
+        self._recent.clear()
@@ -0,0 +1,89 @@
+import sys
+import threading
+from collections import namedtuple, OrderedDict
+from typing import Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from pyzbar79.pyzbar.pyzbar import Decoded
+
+# A QR code found in a single frame, parsed once and shared by every consumer.
+#   layer: The layer of the landing pad the code belongs to (0 = outer, 1 = middle, 2 = inner).
+#   code: The message embedded in the code.
+#   corners: An array of shape (4, 2) containing the pixel coordinates of the corners, in the order
+#       reported by the recognizer.
+#   frame_id: The number of the frame the code was found in.
+Detection = namedtuple('Detection', ['layer', 'code', 'corners', 'frame_id'])
+
+
+class DetectionParser:
+    """The DetectionParser class turns the output of the Recognizer into Detection records.
+
+    QR payloads are expected to look like b'<code>,<layer>'. Each distinct payload is only decoded
+    once; the result is kept in a small least-recently-used cache, since the same few codes are
+    seen in nearly every frame. Payloads that are malformed or that name an unknown layer are
+    rejected here, so that they never reach the displacement estimator."""
+
+    def __init__(
+            self,
+            levels: Mapping,
+            cache_size: int = 32):
+        """
+        :param levels: A dictionary-like object whose keys are the known level names (e.g. "0").
+        :param cache_size: The number of distinct payloads to remember.
+        """
+        self.levels = levels
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[bytes, Optional[Tuple[int, str]]]' = OrderedDict()
+
+    def parse_payload(self, data: bytes) -> Optional[Tuple[int, str]]:
+        """Get the layer and message of a QR payload.
+
+        >>> DetectionParser({'0': 1.0}).parse_payload(b'pad,0')
+        (0, 'pad')
+        >>> DetectionParser({'0': 1.0}).parse_payload(b'pad,7') is None
+        True
+
+        :param data: The raw payload of the code.
+        :returns: A tuple of (layer, code), or None if the payload is not one of our landing pad codes."""
+        with self._lock:
+            if data in self._cache:
+                self._cache.move_to_end(data)
+                return self._cache[data]
+        parsed = self._parse_uncached(data)
+        with self._lock:
+            self._cache[data] = parsed
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return parsed
+
+    def _parse_uncached(self, data: bytes) -> Optional[Tuple[int, str]]:
+        try:
+            code, layer = data.decode('utf-8').rsplit(',', 1)
+        except (UnicodeDecodeError, ValueError):
+            return None
+        if layer not in self.levels:
+            return None
+        return int(layer), sys.intern(code)
+
+    def parse(
+            self,
+            qr_codes: Iterable[Decoded],
+            frame_id: int) -> List[Detection]:
+        """Parse every code found in a frame.
+
+        :param qr_codes: The codes returned by the Recognizer.
+        :param frame_id: The number of the frame the codes were found in.
+        :returns: A Detection for each valid code. Invalid codes are dropped."""
+        detections = []
+        for qr_code in qr_codes:
+            if len(qr_code.points) != 4:
+                continue
+            parsed = self.parse_payload(qr_code.data)
+            if parsed is None:
+                continue
+            layer, code = parsed
+            corners = np.array(qr_code.points, dtype=float)
+            detections.append(Detection(layer, code, corners, frame_id))
+        return detections
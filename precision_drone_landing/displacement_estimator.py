@@ -1,15 +1,26 @@
 import json
 import math
-import pickle
 from pathlib import Path
-from typing import Optional, Sequence, Mapping, Iterable
+from typing import Optional, Sequence, Mapping, Iterable, Tuple, Union
 
 import numpy as np
-from shapely.geometry import Point
-from sklearn.neural_network import MLPRegressor
 
 from angle_unit import AngleUnit
-from util import cos_between_vectors
+from mlp_inference import NumpyMLP
+from model_cache import resolve_model
+from model_format import load_mlp
+from prediction_cache import CacheInfo, PredictionCache
+
+# The recognizer reports the corners of an upright code as top left, bottom left, bottom right and top right.
+# Image y points down, so the edges from each corner to the next run down, right, up and left.
+_NEXT_CORNER = np.array([1, 2, 3, 0])
+_UPRIGHT_EDGES = np.array([[0, 1], [1, 0], [0, -1], [-1, 0]])
+# Multiplying an edge (x, y) by the conjugate of its upright direction (a, b), as complex numbers, gives
+# (a x + b y, a y - b x). This maps each edge component to its contribution to that product.
+_EDGE_ALIGNMENT = np.stack([
+    np.stack([_UPRIGHT_EDGES[:, 0], -_UPRIGHT_EDGES[:, 1]], axis=-1),
+    np.stack([_UPRIGHT_EDGES[:, 1], _UPRIGHT_EDGES[:, 0]], axis=-1)
+], axis=1).astype(float)
 
 
 class DisplacementEstimator:
@@ -17,17 +28,22 @@ class DisplacementEstimator:
 
     def __init__(
             self,
-            regressor: Optional[MLPRegressor] = None,
+            regressor: Optional[NumpyMLP] = None,
             levels: Optional[Mapping] = None,
             fov: float = 60,
-            units: AngleUnit = AngleUnit.DEGREES):
+            units: AngleUnit = AngleUnit.DEGREES,
+            cache_size: int = 0,
+            cache_step: float = 1e-5):
         """
         :param regressor: A regressor object. Each regressor is expected to provide the
-            `regressor.predict` function. If None, init will instead search `assets/displacement_detection_models`
-            for pickle files matching the filename `regressor.pkl`.
+            `regressor.predict` function. If None, init will instead load the model artifact
+            built from the current generation code. See model_cache.py and model_format.py.
         :param levels: A dictionary-like object mapping from level names (e.g. "0") to scaling factors.
         :param fov: The horizontal field of view. Units are specified by the units argument.
         :param units: The units of the fov argument.
+        :param cache_size: The number of predictions to remember, or 0 to always run the regressor.
+            See prediction_cache.py.
+        :param cache_step: The quantization step in radians of the hull angles used as cache keys.
         """
         self.fov_unit = units
         self.horizontal_fov = fov
@@ -37,19 +53,28 @@ class DisplacementEstimator:
         if regressor:
             self._regressor = regressor
         else:
-            model_path = Path('../assets/displacement_detection_models/regressor.pkl')
-            with open(model_path, 'rb') as model_file:
-                try:
-                    self._regressor = pickle.load(model_file)
-                except pickle.UnpicklingError:
-                    print(f'ALERT: File "{model_path}" is named like a pickled regressor but cannot be unpickled.')
-                    raise
+            model_path = resolve_model()
+            try:
+                self._regressor = load_mlp(model_path)
+            except ValueError:
+                print(f'ALERT: File "{model_path}" is named like a model artifact but cannot be loaded.')
+                raise
+        if cache_size > 0:
+            self._regressor = PredictionCache(self._regressor, maxsize=cache_size, step=cache_step)
         if levels:
             self.levels = levels
         else:
             levels_path = Path('../config/qr_sizes.json')
             with open(levels_path, 'r') as levels_file:
                 self.levels = json.load(levels_file)
+        # We imagine that the image is projected on a screen 1 unit away from the camera. These
+        # constants only depend on the field of view, so they are computed once here.
+        # See get_hull_angles_batch.
+        self._virtual_distance = 1
+        self._virtual_width = 2 * math.tan(self.horizontal_fov / (2 * self._virtual_distance))
+        first, second = zip(*self.pairs(range(4)))
+        self._pair_first = np.array(first)
+        self._pair_second = np.array(second)
 
     def get_hull_angles(
             self,
@@ -58,46 +83,57 @@ class DisplacementEstimator:
             image_width: int):
         """Calculate the hull angles given the four corners of the hull and some information about the image.
 
+        This is a convenience wrapper around get_hull_angles_batch for a single hull.
+
+        :param hull: An iterable of points. These points are the corners of the detected QR code.
+            Each point is expected to be an (x, y) pair, such as a row of `Detection.corners`. They are
+            expected to be in units of pixels.
+        :param image_height: The height of the image in pixels.
+        :param image_width: The width of the image in pixels.
+        :returns: An array of shape (1, 5). Each value is the angular diameter of a side of the QR code.
+        """
+        return self.get_hull_angles_batch(
+            corners=np.asarray(hull, dtype=float)[np.newaxis],
+            image_height=image_height,
+            image_width=image_width
+        )
+
+    def get_hull_angles_batch(
+            self,
+            corners: np.ndarray,
+            image_height: int,
+            image_width: int) -> np.ndarray:
+        """Calculate the hull angles of every QR code in a frame at once.
+
         This function uses the pinhole camera model to determine the angular diameter of the sides of the QR code.
         https://en.wikipedia.org/wiki/Pinhole_camera_model
 
-        :param hull: An iterable of points. These points are the corners of the detected QR code.
-            Each point is expected to have the `point.x` and `point.y` fields. They are expected to be
+        :param corners: An array of shape (N, 4, 2) containing the corners of N detected QR codes,
             in units of pixels.
         :param image_height: The height of the image in pixels.
         :param image_width: The width of the image in pixels.
-        :returns: A list containing floats. Each float is the angular diameter of a side of the QR code.
+        :returns: An array of shape (N, 5). Each row contains the angular diameters of the four sides
+            and one diagonal of a QR code, in the order given by the pairs method.
         """
         # Instead of doing lots of error-prone trigonometric trickery, we simply imagine that the image
         # is projected on a screen 1 unit away. Since we know the locations of the points in the image,
         # we can construct vectors from the origin to these points. Then, we use the vector cosine
         # similarity formula to determine the angular diameter.
-        virtual_distance = 1  # The distance between the origin and our imagined screen
-        virtual_width = 2 * math.tan(self.horizontal_fov / (2 * virtual_distance))  # The width of the screen
-        virtual_height = virtual_width * image_height / image_width  # The height of the screen
-        # Notice that the screen may scale to the size required, but the aspect ratio does not change.
-
-        centered_points = [
-            Point(p.x - (image_width / 2), p.y - (image_height / 2))
-            for p in hull
-        ]
+        # The screen keeps the aspect ratio of the image, so both axes share one pixel-to-screen scale.
+        scale = self._virtual_width / image_width
+        corners = np.asarray(corners, dtype=float)
+        vectors = np.empty(corners.shape[:-1] + (3,))
         # Our math assumes that the center of the screen is at (x, y) = (0, 0). Since computer image origins are in
-        # the upper left, we have to shift the points.
+        # the upper left, we have to shift the points before projecting them onto the screen.
+        vectors[..., 0] = (corners[..., 0] - image_width / 2) * scale
+        vectors[..., 1] = (corners[..., 1] - image_height / 2) * scale
+        vectors[..., 2] = self._virtual_distance
 
-        virtual_points = [
-            Point(p.x * virtual_width / image_width, p.y * virtual_height / image_height)
-            for p in centered_points
-        ]
-        # We project the points from the image to the screen
-
-        return [[
-            math.acos(cos_between_vectors(
-                v1=np.array((p1.x, p1.y, virtual_distance)),
-                v2=np.array((p2.x, p2.y, virtual_distance))
-            ))
-            for p1, p2 in self.pairs(virtual_points)
-        ]]
-        # Finally, we apply the cosine similarity formula to arrive at the list of angles
+        # Finally, we apply the cosine similarity formula to every pair at once
+        v1 = vectors[:, self._pair_first]
+        v2 = vectors[:, self._pair_second]
+        cosines = np.einsum('ijk,ijk->ij', v1, v2) / (np.linalg.norm(v1, axis=-1) * np.linalg.norm(v2, axis=-1))
+        return np.arccos(np.clip(cosines, -1, 1))
 
     @staticmethod
     def estimate_rotation(hull: Iterable[Iterable[int]]):
@@ -121,35 +157,88 @@ class DisplacementEstimator:
             delta -= math.copysign(2 * math.pi, delta)
         return delta
 
+    @staticmethod
+    def estimate_rotation_batch(corners: np.ndarray) -> Tuple[float, float]:
+        """Estimate the rotation of the drone relative to the target from every QR code in a frame at once.
+
+        Unlike estimate_rotation, this uses all four edges of every code. Each edge is compared with the
+        direction it would have if the code were upright in the image, and the rotation that best aligns
+        all of them is found in closed form, like in the 2D Procrustes problem. Treating the edges as
+        complex numbers, that rotation is the argument of the sum of each edge times the conjugate of its
+        upright direction. Each edge is weighted by its length, so larger, better resolved codes count more.
+        See https://en.wikipedia.org/wiki/Orthogonal_Procrustes_problem
+
+        >>> rotation, confidence = DisplacementEstimator.estimate_rotation_batch(
+        ...     np.array([[[10, 0], [0, 0], [0, 10], [10, 10]]]))
+        >>> round(rotation, 4), round(confidence, 4)
+        (-1.5708, 1.0)
+
+        :param corners: An array of shape (N, 4, 2) containing the corners of N detected QR codes,
+            in units of pixels, in the order reported by the recognizer.
+        :returns: A tuple of the rotation in radians, with the sign of estimate_rotation, and a confidence
+            between 0 and 1. The confidence is 1 when every edge agrees on the rotation, and falls towards 0
+            as they disagree, e.g. for codes seen at a steep angle or with their corners out of order.
+            Both are 0 if there are no codes."""
+        corners = np.asarray(corners, dtype=float)
+        if corners.size == 0:
+            return 0.0, 0.0
+        edges = corners[:, _NEXT_CORNER] - corners
+        resultant = np.einsum('ijk,jkl->l', edges, _EDGE_ALIGNMENT)
+        total_length = float(np.sum(np.sqrt(np.einsum('ijk,ijk->ij', edges, edges))))
+        if total_length == 0:
+            return 0.0, 0.0
+        confidence = math.hypot(*resultant) / total_length
+        return -math.atan2(resultant[1], resultant[0]), confidence
+
     def estimate_displacement(
             self,
             hull_angles: Iterable[Iterable[float]],
             level: str = '0'):
         """Calculate the displacement vector from the target to the camera.
 
-        Retrieve a hull from the Recognizer.recognize(...).points attribute.
+        This is a convenience wrapper around estimate_displacements for a single QR code.
+
+        :param hull_angles: An iterable containing one row of five angles in radians, as returned
+            by get_hull_angles.
+        :param level: A string containing the level of the QR code.
+        :returns: A 3-vector of x, y, z coordinates of the drone relative to the target, i.e. in target-space.
+            If the level is unknown, returns None instead."""
+        result = self.estimate_displacements(hull_angles, [level])[0]
+        if np.isnan(result).any():
+            return None  # Unknown QR code, we have no idea what size it is
+        return result
+
+    def estimate_displacements(
+            self,
+            hull_angles: np.ndarray,
+            levels: Sequence[str]) -> np.ndarray:
+        """Calculate the displacement vectors from the target to the camera for every QR code in a frame.
 
-        If you have a hull, use the get_hull_angles method to get the hull angles.
+        Retrieve hulls from `Detection.corners`, and use the get_hull_angles_batch method to get
+        the hull angles.
 
-        Note that this calculation results in an angle in target-space. You
-        cannot use this vector directly for controlling the drone, since the
+        Note that this calculation results in vectors in target-space. You
+        cannot use these vectors directly for controlling the drone, since the
         drone controller operates in drone-space, not target-space. Use the
-        target_to_drone_space method to transform the vector to drone-space.
-
-        :param hull_angles: An iterable of four angles in radians. These should be the angular diameters
-            of each side of the QR code.
-        :param level: A string containing the level of the QR code. This is used to choose which regressor
-            to use, as each size of code requires a different regressor.
-        :returns: A 3-vector of x, y, z coordinates of the drone relative to the target, i.e. in target-space."""
-        regressor = self._regressor
-        level_factor = self.levels.get(level)
-
-        result: Optional[np.ndarray]
-        if level_factor:
-            result = np.multiply(level_factor, np.reshape(regressor.predict(hull_angles), (3,)))
-        else:
-            result = None  # Unknown QR code, we have no idea what size it is
-        return result
+        target_to_drone_space method to transform the vectors to drone-space.
+
+        :param hull_angles: An array of shape (N, 5) containing angles in radians. These should be the
+            angular diameters of each side and one diagonal of each QR code.
+        :param levels: N strings containing the level of each QR code. The level determines the size
+            of the code, and thus how the regressor's output is scaled.
+        :returns: An array of shape (N, 3) of x, y, z coordinates of the drone relative to the target,
+            i.e. in target-space. Rows for codes of unknown levels are filled with NaN."""
+        level_factors = np.array([self.levels.get(level, math.nan) for level in levels], dtype=float)
+        if len(level_factors) == 0:
+            return np.empty((0, 3))
+        predictions = np.reshape(self._regressor.predict(hull_angles), (-1, 3))
+        return level_factors[:, np.newaxis] * predictions
+
+    def cache_info(self) -> Optional[CacheInfo]:
+        """Get the hit and miss counts of the prediction cache, or None if there is no cache."""
+        if isinstance(self._regressor, PredictionCache):
+            return self._regressor.cache_info()
+        return None
 
     @staticmethod
     def target_to_drone_space(
@@ -172,6 +261,27 @@ class DisplacementEstimator:
         ])
         return np.dot(vector, transform_matrix)
 
+    @staticmethod
+    def targets_to_drone_space(
+            vectors: np.ndarray,
+            rotations: Union[float, np.ndarray]) -> np.ndarray:
+        """Transform many vectors in target-space to displacements in drone-space at once.
+
+        This is the batched form of target_to_drone_space.
+
+        :param vectors: An array of shape (N, 3) containing x, y, z coordinates in target-space.
+        :param rotations: The z-rotation of the drone relative to the target in radians. Either a scalar
+            shared by every vector, or an array of shape (N,).
+        :returns: An array of shape (N, 3) containing the vectors transformed to drone-space."""
+        vectors = np.asarray(vectors, dtype=float).reshape(-1, 3)
+        cosines = np.cos(rotations)
+        sines = np.sin(rotations)
+        result = np.empty_like(vectors)
+        result[:, 0] = cosines * vectors[:, 0] + sines * vectors[:, 1]
+        result[:, 1] = cosines * vectors[:, 1] - sines * vectors[:, 0]
+        result[:, 2] = vectors[:, 2]
+        return result
+
     @staticmethod
     def pairs(lst: Sequence):
         """Return pairs of items in the list in a specific order
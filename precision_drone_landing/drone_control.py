@@ -1,23 +1,36 @@
+import asyncio
 import copy
 import math
 import statistics
-import sys
+import threading
 import time
-from collections import namedtuple
+from collections import deque, namedtuple
 from numbers import Real
-from typing import List, Tuple, Iterable
+from typing import Optional, Tuple, Union
 
 from dronekit import VehicleMode
 from dronekit import connect
+import numpy as np
 from pymavlink import mavutil
 
-from config import ARDUPILOT_CONNECTION
+from config import ARDUPILOT_CONNECTION, CONTROL_RATE, LAYER_ESTIMATOR, LAYER_FUSION, LAYER_TIME_CONSTANT, QR_SIZES, \
+    SECONDS_PER_FRAME, TRACK_TARGET
 from controller import Controller
+from fusion import LayerFusion
+from layer_estimators import DecayedLayerEstimator, LayerRingBuffer
 from log import Logger
 from simple_guidance import SimplePosition
 from target_handler import TargetHandler
+from target_tracker import KalmanTargetTracker
 
-Target = namedtuple('Target', ['x', 'y', 'z', 'layer', 'time'])
+# The timing of the recent iterations of the control loop, see DroneControl.run.
+#   ticks: The number of iterations since the loop started.
+#   overruns: The number of iterations that took longer than the control period.
+#   mean_period, p95_period, max_period: The time in seconds from the start of one iteration to the next.
+#   mean_update, max_update: The time in seconds update_velocity took.
+#   mean_age: The age in seconds of the newest frame when the velocity was updated.
+ControlTiming = namedtuple('ControlTiming', ['ticks', 'overruns', 'mean_period', 'p95_period', 'max_period',
+                                             'mean_update', 'max_update', 'mean_age'])
 
 
 class PositionAggregator:
@@ -30,64 +43,103 @@ class PositionAggregator:
     qr code has been visible in the frame for at least 3 consecutive
     frames."""
 
-    def __init__(self, handler: TargetHandler):
-        """:param handler: The source for landing position data."""
+    def __init__(
+            self,
+            handler: TargetHandler,
+            layer_estimator: str = LAYER_ESTIMATOR,
+            layer_fusion: str = LAYER_FUSION,
+            track_target: bool = TRACK_TARGET):
+        """:param handler: The source for landing position data.
+        :param layer_estimator: How the positions of each layer are averaged, "window" or "decayed".
+        :param layer_fusion: How the layers are combined, "mean" or "robust".
+        :param track_target: Whether to estimate the position with a KalmanTargetTracker instead of
+            the mean of the layer averages."""
         self.targetHandler = handler
-        self.targetZero: List[Target] = []
-        self.targetOne: List[Target] = []
-        self.targetTwo: List[Target] = []
+        # The recent position estimates of each layer, see layer_estimators.py
+        if layer_estimator == 'decayed':
+            self.layers = [DecayedLayerEstimator(time_constant=LAYER_TIME_CONSTANT) for _ in range(3)]
+        elif layer_estimator == 'window':
+            self.layers = [LayerRingBuffer() for _ in range(3)]
+        else:
+            raise ValueError(f'Unknown layer estimator "{layer_estimator}"')
+        self.targetZero, self.targetOne, self.targetTwo = self.layers
+        if layer_fusion == 'robust':
+            self.fusion = LayerFusion(levels=QR_SIZES)
+        elif layer_fusion == 'mean':
+            self.fusion = None
+        else:
+            raise ValueError(f'Unknown layer fusion "{layer_fusion}"')
+        self.tracker = KalmanTargetTracker(levels=QR_SIZES) if track_target else None
         self.missCount = 0
         self.hitCount = 0
         self.lost = True
         self.targetLayer = 0
         self.logger = Logger("Position_Estimate_Averages.csv",
-                             ["Level 0", "X", "Y", "Z", "Level 1", "X", "Y", "Z", "Level 2", "X", "Y", "Z"])
+                             ["Level 0", "X", "Y", "Z", "Level 1", "X", "Y", "Z", "Level 2", "X", "Y", "Z"],
+                             dtypes=["|S1", "<f4", "<f4", "<f4"] * 3)
+        # Every estimate while logging is not reduced, so that sequences can be replayed by
+        # scripts/compare_layer_estimators.py
+        self.observationLogger = Logger("Layer_Observations.csv", ["Time", "Layer", "X", "Y", "Z"],
+                                        dtypes=["<f8", "|i1", "<f4", "<f4", "<f4"])
         self.finalApproach = False
         self.targetLayer = 0
         self.lastHeight: float = 10
         self.missTime: float = 0
         self._firstLost = 0
         self.lastSeen = None
+        # The id and capture time of the last TargetHandler snapshot taken in
+        self.lastFrameId = 0
+        self.lastFrameTime: Optional[float] = None
 
     @staticmethod
-    def estimate_layer_position(targets: Iterable[Target]):
+    def estimate_layer_position(targets: Union[LayerRingBuffer, DecayedLayerEstimator]):
         """Get a weighted average of previously seen positions.
 
         Newer positions are weighted more heavily.
 
-        :param targets:
+        :param targets: The recent position estimates of one layer.
         :returns: The x, y, z weighted averages."""
-        now = time.time()
-        x_sum = 0
-        y_sum = 0
-        z_sum = 0
-        weight_sum = 0
-        for target in targets:
-            current_weight = 1 / (1 + (now - target.time))
-            x_sum += current_weight * target.x
-            y_sum += current_weight * target.y
-            z_sum += current_weight * target.z
-            weight_sum += current_weight
-        if weight_sum > 0:
-            x_sum = x_sum / weight_sum
-            y_sum = y_sum / weight_sum
-            z_sum = z_sum / weight_sum
-            return x_sum, y_sum, z_sum
-        return None, None, None
+        return targets.weighted_average(time.time())
 
     def estimate_position(self):
-        """Get the mean of position estimates over levels."""
+        """Get the current estimate of the position of the target.
+
+        By default, this is the mean of the layer averages. With robust fusion, it is the weighted mean
+        of the recent estimates of every layer, leaving out outliers, see fusion.py. With a tracker, it
+        is the tracker's prediction for the current time, which is available between frames and for a
+        short while after the target was last seen."""
         zero_x, zero_y, zero_z = self.estimate_layer_position(self.targetZero)
         one_x, one_y, one_z = self.estimate_layer_position(self.targetOne)
         two_x, two_y, two_z = self.estimate_layer_position(self.targetTwo)
         self.logger.writeline(["0", zero_x, zero_y, zero_z, "1", one_x, one_y, one_z, "2", two_x, two_y, two_z])
-        avg_x = self._generate_averages(zero_x, one_x, two_x)
-        avg_y = self._generate_averages(zero_y, one_y, two_y)
-        avg_z = self._generate_averages(zero_z, one_z, two_z)
+        if self.tracker is not None:
+            target = self.tracker.predict(time.time())
+            avg_x, avg_y, avg_z = (None, None, None) if target is None else map(float, target.position)
+        elif self.fusion is not None:
+            avg_x, avg_y, avg_z = self._fuse_layers()
+        else:
+            avg_x = self._generate_averages(zero_x, one_x, two_x)
+            avg_y = self._generate_averages(zero_y, one_y, two_y)
+            avg_z = self._generate_averages(zero_z, one_z, two_z)
         if avg_z is not None:
             self.lastHeight = abs(avg_z)
         return avg_x, avg_y, avg_z
 
+    def _fuse_layers(self):
+        """Get the robustly fused position of the recent estimates of every layer.
+
+        :returns: The x, y, z position, or three Nones if there are no usable estimates."""
+        now = time.time()
+        observations = [layer.observations(now) for layer in self.layers]
+        fused = self.fusion.fuse(
+            np.concatenate([positions for positions, _ in observations]),
+            np.concatenate([np.full(len(weights), index) for index, (_, weights) in enumerate(observations)]),
+            np.concatenate([weights for _, weights in observations])
+        )
+        if fused is None:
+            return None, None, None
+        return float(fused[0]), float(fused[1]), float(fused[2])
+
     @staticmethod
     def _generate_averages(*args: Real):
         """Get the mean of arguments within certain limits.
@@ -104,47 +156,49 @@ class PositionAggregator:
             return statistics.mean(outputs)
         return None
 
-    def update_target_data(self):
+    def update_target_data(self) -> bool:
         """Receives input from the TargetHandler class, parses the input layer
-        by layer, and adds the new data to the other data stored within."""
-        for i in range(0, 3):
-            lz = self.targetHandler.get_target(i)
-            if lz is not None:
-                if lz.getLayer() > self.targetLayer:
-                    self.targetLayer = lz.getLayer()
-                self.missCount = 0
-                self.hitCount += 1
-                self.lost = False
-                target = Target(*lz.getPosition(), layer=lz.getLayer(), time=time.time())
-                if target.layer == 0:
-                    self.targetZero.append(target)
-                elif target.layer == 1:
-                    self.targetOne.append(target)
-                elif target.layer == 2:
-                    self.targetTwo.append(target)
-                self.lastSeen = target.layer
-            else:
-                self.missCount += 1
-                if len(self.targetTwo) == 0 and len(self.targetOne) == 0 and len(self.targetZero) == 0:
-                    self.hitCount = 0
-                    if not self.lost:
-                        self.lost = True
-                        self.missTime = time.time()
+        by layer, and adds the new data to the other data stored within.
+
+        Only a snapshot that has not been seen yet is taken in, so calling this
+        more often than frames arrive does not count the same estimates twice.
+
+        :returns: Whether there was a new snapshot."""
+        snapshot = self.targetHandler.snapshot_after(self.lastFrameId)
+        if snapshot is not None:
+            self.lastFrameId = snapshot.frame_id
+            self.lastFrameTime = snapshot.timestamp
+            for i in range(0, 3):
+                lz = snapshot.targets[i]
+                if lz is not None:
+                    if lz.getLayer() > self.targetLayer:
+                        self.targetLayer = lz.getLayer()
+                    self.missCount = 0
+                    self.hitCount += 1
+                    self.lost = False
+                    layer = lz.getLayer()
+                    if 0 <= layer < len(self.layers):
+                        # Estimates are weighted by the age of the frame they come from
+                        self.layers[layer].append(*lz.getPosition(), timestamp=snapshot.timestamp)
+                        self.observationLogger.writeline([snapshot.timestamp, layer, *lz.getPosition()])
+                        if self.tracker is not None:
+                            self.tracker.update(lz.getPosition(), layer, snapshot.timestamp)
+                    self.lastSeen = layer
+                else:
+                    self.missCount += 1
+                    if len(self.targetTwo) == 0 and len(self.targetOne) == 0 and len(self.targetZero) == 0:
+                        self.hitCount = 0
+                        if not self.lost:
+                            self.lost = True
+                            self.missTime = time.time()
         if len(self.targetTwo) > 3:
             self.finalApproach = True
         else:
             self.finalApproach = False
-        self._clear_position_data(self.targetZero)
-        self._clear_position_data(self.targetOne)
-        self._clear_position_data(self.targetTwo)
-
-    @staticmethod
-    def _clear_position_data(targets: List[Target]):
-        """Removes old position data from the list."""
         now = time.time()
-        for target in targets:
-            if now - target.time > 3:
-                targets.remove(target)
+        for layer in self.layers:
+            layer.expire(now)
+        return snapshot is not None
 
     def get_last_height(self):
         return self.lastHeight
@@ -171,11 +225,14 @@ class DroneControl:
         self.down_start = None
         self.loc = None
         self.attitude = None
-        self.poll_delay = 0
+        self.poll_delay = 1 / CONTROL_RATE
         self.currentTime = self.previousTime = self.start_time = 0
         self.positioning = PositionAggregator(handler)
         self.simplePosition = None
         self.missLimit = 1000
+        # The age in seconds of the last frame after which vision counts as stalled, see update_velocity
+        self.maxFrameAge = 1
+        self._lastStaleMiss = 0
         # Connect to the Vehicle
         print(f'Connecting to vehicle on: {ARDUPILOT_CONNECTION}')
         self.vehicle = connect(ARDUPILOT_CONNECTION, wait_ready=True)
@@ -214,14 +271,32 @@ class DroneControl:
             scalar=0
         )
         self.landed = False
+        # 0 once the drone has landed on the pad, or 1 if it gave up searching and landed where it was
+        self.exitStatus: Optional[int] = None
         self.waiting = True
+        # The last velocity sent, which is sent again when there is nothing new to steer by
+        self.lastCommand: Optional[Tuple[float, float, float]] = None
+        self.ticks = 0
+        self.overruns = 0
+        # (period, update, age) of the recent iterations of the control loop
+        self._tick_times = deque(maxlen=1000)
+        # The task running the control loop, and whether it has been asked to stop, see stop
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
 
         # logging
         self.logging = Logger("Drone_Control_Log.csv", ["Time", "Mode", "Roll", "Pitch", "Z Relative distance",
                                                         "Y Relative Distance", "X Relative Distance",
                                                         "Z Velocity Input", "Y Velocity Input", "X Velocity Input",
                                                         "Z Absolute Variance", "Y Absolute Variance",
-                                                        "X Absolute Variance"])
+                                                        "X Absolute Variance", "Z Estimate", "Y Estimate",
+                                                        "X Estimate"],
+                              dtypes=["<f8", "|S8"] + ["<f4"] * 14)
+        # One line per iteration of the control loop, which the control log leaves out when the last command
+        # is sent again. Each line holds its own period, so thinning it out still leaves a fair sample.
+        self.timingLogger = Logger("Control_Timing_Log.csv", ["Time", "Period", "Update Seconds", "Frame Age",
+                                                               "Frame"],
+                                   dtypes=["<f8", "<f4", "<f4", "<f4", "<i4"])
 
     def startup_simulation(
             self,
@@ -234,7 +309,7 @@ class DroneControl:
         10 meters above the landing site before initiating landing procedure.
 
         :param starting_altitude: integer value for altitude achieved before landing sequence begins.
-        :param target_rate: desired minimum polling frequency (in polls per second)"""
+        :param target_rate: the rate of the control loop (in updates per second)"""
         self.poll_delay = 1 / target_rate
         self.attitude = self.vehicle.attitude
         self.loc = self.vehicle.location
@@ -274,7 +349,7 @@ class DroneControl:
         ensuring the drone is armed or in flight before starting. This should be achieved
         in other code.
 
-        :param target_rate: desired minimum polling frequency (in polls per second)"""
+        :param target_rate: the rate of the control loop (in updates per second)"""
         self.poll_delay = 1 / target_rate
         self.attitude = self.vehicle.attitude
         self.loc = self.vehicle.location
@@ -300,6 +375,17 @@ class DroneControl:
         self.vehicle.commands.wait_ready()
         self.vehicle.commands.clear()
 
+    def set_log_stride(self, stride: int):
+        """Only log one out of every `stride` control updates, control loop timings, position estimates and
+        layer observations.
+
+        Used to reduce log volume when the frame loop is running behind.
+        Landing events are always logged."""
+        self.logging.set_stride(stride)
+        self.timingLogger.set_stride(stride)
+        self.positioning.logger.set_stride(stride)
+        self.positioning.observationLogger.set_stride(stride)
+
     def init_simple_position(self, agent: SimplePosition):
         """
         This function is used to pass in a simple_position
@@ -370,16 +456,107 @@ class DroneControl:
         component = base / modifier
         x = math.cos(component)
         y = math.sin(component)
-        self.positioning.missCount += 1
         return x, y
 
+    def start(self) -> threading.Thread:
+        """Run the control loop in a thread of its own, with its own event loop.
+
+        The vision loop runs parsing, estimation and the preview on the main event loop, so
+        control ticks sharing that loop would wait for every slow frame. In its own thread, the
+        control loop only competes with the vision loop for the GIL, which the camera, decoding
+        and most NumPy work release.
+
+        :returns: The thread, which ends once the drone has landed or the loop has been stopped. See exitStatus."""
+        thread = threading.Thread(target=asyncio.run, args=(self.run(),), name='Control loop', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop the control loop from another thread, leaving the drone holding its position.
+
+        Used when the vision loop has failed, so that the drone does not keep steering by the last frame.
+        A drone that is already landing carries on landing."""
+        self._stopping = True
+        task = self._task
+        if task is not None and not task.done():
+            try:
+                task.get_loop().call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # The loop has just finished on its own
+
+    async def run(self):
+        """Run the control loop until the drone has landed.
+
+        Once the first frame has been published, the loop updates the velocity
+        every poll_delay seconds, whether or not a new frame has arrived since,
+        so that slow frames make the estimates older rather than the control
+        less frequent. When an update overruns the period, the missed updates
+        are skipped rather than run back to back. The loop also ends when stop
+        is called, with the drone holding its position. See start."""
+        loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        if self._stopping:
+            return
+        try:
+            await self._run_ticks(loop)
+        except asyncio.CancelledError:
+            if not self._stopping:
+                raise
+            print("Control loop stopped!")
+            if self.vehicle.mode.name != "LAND":
+                self.send_ned_velocity(0, 0, 0)
+
+    async def _run_ticks(self, loop: asyncio.AbstractEventLoop):
+        """Wait for the first frame, then update the velocity every poll_delay seconds until the drone has landed."""
+        await self.positioning.targetHandler.wait_for_snapshot(0)
+        next_tick = loop.time()
+        last_start = None
+        while not self.landed:
+            start = loop.time()
+            now = time.time()
+            await self.update_velocity()
+            end = loop.time()
+            frame_time = self.positioning.lastFrameTime
+            tick_times = (
+                math.nan if last_start is None else start - last_start,
+                end - start,
+                math.nan if frame_time is None else now - frame_time
+            )
+            self._tick_times.append(tick_times)
+            self.timingLogger.writeline([now, *tick_times, self.positioning.lastFrameId])
+            last_start = start
+            self.ticks += 1
+            next_tick += self.poll_delay
+            if end > next_tick:
+                self.overruns += 1
+                next_tick += math.ceil((end - next_tick) / self.poll_delay) * self.poll_delay
+            await asyncio.sleep(next_tick - loop.time())
+
+    def timing(self) -> Optional[ControlTiming]:
+        """Get the timing of the recent iterations of the control loop, or None before it has run."""
+        # Copied in one step, since the control thread appends to it
+        tick_times = list(self._tick_times)
+        if not tick_times:
+            return None
+        periods, updates, ages = np.array(tick_times).T
+        return ControlTiming(
+            ticks=self.ticks,
+            overruns=self.overruns,
+            mean_period=float(np.nanmean(periods)) if len(periods) > 1 else math.nan,
+            p95_period=float(np.nanpercentile(periods, 95)) if len(periods) > 1 else math.nan,
+            max_period=float(np.nanmax(periods)) if len(periods) > 1 else math.nan,
+            mean_update=float(updates.mean()),
+            max_update=float(updates.max()),
+            mean_age=float(np.nanmean(ages)) if not np.isnan(ages).all() else math.nan
+        )
+
     async def update_velocity(self):
         """
         This master function does the heavy lifting within the drone_control module.
         At a high level, the function begins by updating the internal state. This
         includes updating the time, getting the latest position estimate from the
-        target handler and passing it into the position aggregator, which produces
-        a time-weighted position estimate average.
+        target handler, if it has not been seen yet, and passing it into the position
+        aggregator, which produces a time-weighted position estimate average.
 
         Then, the function checks the drone state. If it is RTL mode, the rest
         of the function activates. It immediately switches the drone to guided
@@ -402,6 +579,10 @@ class DroneControl:
         As the drone nears the landing pad, it will check how centered it is and pause
         descent until the drone is more centered. If the landing pad fills enough of
         the frame and is close enough to being centered, the drone will land and disarm.
+
+        If no frame has arrived for maxFrameAge seconds, the drone hovers and counts
+        the frames it should have received as misses, so that a stalled vision loop
+        ends in the same landing as a lost target.
         """
         now = time.time()
         mode = "Tracking"
@@ -410,20 +591,49 @@ class DroneControl:
             return
         attitude = self.vehicle.attitude
         self.currentTime = time.time()
-        time_dif = self.currentTime - self.previousTime
-        self.positioning.update_target_data()
-        # early return
-        if time_dif < self.poll_delay:
-            return
-        self.previousTime = self.currentTime
-
-        x_vector, y_vector, z_vector = self.positioning.estimate_position()
+        new_frame = self.positioning.update_target_data()
 
         if self.vehicle.mode.name == "RTL":
             self.vehicle.mode = VehicleMode("GUIDED")
             self.send_ned_velocity(0, 0, 0)
             self.waiting = False
             self.start_time = time.time()
+            # Hold position while waiting, rather than sending the last command again
+            self.lastCommand = None
+
+        frame_time = self.positioning.lastFrameTime
+        if not new_frame and (frame_time is None or now - frame_time > self.maxFrameAge):
+            # Vision has stalled, so there is nothing current to steer by. Hover rather than fly the last
+            # command, and count a miss for every frame that should have arrived, so that the drone
+            # lands once the target counts as lost, just as if the frames had arrived without it.
+            mode = "Stale"
+            if now - self._lastStaleMiss >= SECONDS_PER_FRAME:
+                self.positioning.missCount += 1
+                self._lastStaleMiss = now
+            self.lastCommand = None
+            if self.should_land():
+                await self.land(attitude)
+                return
+            self.send_ned_velocity(0, 0, 0)
+            absolute_x, absolute_y, absolute_z = self.get_absolute_position()
+            self.logging.writeline([now, mode, attitude.roll, attitude.pitch, "N/A", "N/A", "N/A",
+                                    0, 0, 0, absolute_z, absolute_y, absolute_x, "N/A", "N/A", "N/A"])
+            return
+
+        if not new_frame and self.positioning.tracker is None and self.lastCommand is not None:
+            # Without a tracker, the position has not changed since the last frame. Feeding it to the
+            # PIDs again would only distort their derivative terms, so only the attitude-dependent
+            # landing check is made again.
+            if self.should_land():
+                await self.land(attitude)
+            else:
+                self.send_ned_velocity(*self.lastCommand)
+            return
+        self.previousTime = self.currentTime
+
+        x_vector, y_vector, z_vector = self.positioning.estimate_position()
+        # The vectors are replaced while searching, so the estimate is logged on its own
+        estimate = z_vector, y_vector, x_vector
 
         if self.waiting or (now - self.start_time < 3):
             mode = "Wait"
@@ -431,6 +641,9 @@ class DroneControl:
         if (x_vector is None or y_vector is None) and mode != "Wait":
             x_vector, y_vector = self.circle(math.ceil(self.positioning.get_last_height()))
             mode = "Circle"
+            if new_frame:
+                # Misses are counted per frame, so that the search lasts as long at any control rate
+                self.positioning.missCount += 1
 
         if mode != "Wait":
             new_z = 0.15
@@ -460,28 +673,36 @@ class DroneControl:
         absolute_x, absolute_y, absolute_z = self.get_absolute_position()
 
         self.logging.writeline([now, mode, attitude.roll, attitude.pitch, z_vector, y_vector, x_vector,
-                                new_z, new_y, new_x, absolute_z, absolute_y, absolute_x])
+                                new_z, new_y, new_x, absolute_z, absolute_y, absolute_x, *estimate])
 
         # land drone
         if self.should_land():
-            mode = "Land"
-            print("Landing!")
-            self.vehicle.mode = VehicleMode("LAND")
-            time.sleep(2)
-            self.vehicle.disarm()
-            self.landed = True
-            absolute_x, absolute_y, absolute_z = self.get_absolute_position()
-            self.logging.writeline([time.time(), mode, attitude.roll, attitude.pitch, "N/A", "N/A", "N/A",
-                                    "N/A", "N/A", "N/A", absolute_z, absolute_y, absolute_x])
-            if self.positioning.missCount <= self.missLimit:
-                print("Successfully Landed!")
-                sys.exit(0)
-            else:
-                print("Safety Abort Landed!")
-                sys.exit(1)
+            await self.land(attitude)
         elif mode != "Wait":
             # fly drone
             self.send_ned_velocity(new_x, new_y, new_z)
+            self.lastCommand = (new_x, new_y, new_z)
+
+    async def land(self, attitude):
+        """Land and disarm the drone, which ends the control loop.
+
+        :param attitude: The attitude of the drone when it decided to land, which is logged."""
+        mode = "Land"
+        print("Landing!")
+        self.vehicle.mode = VehicleMode("LAND")
+        await asyncio.sleep(2)
+        self.vehicle.disarm()
+        self.landed = True
+        absolute_x, absolute_y, absolute_z = self.get_absolute_position()
+        self.logging.writeline([time.time(), mode, attitude.roll, attitude.pitch, "N/A", "N/A", "N/A",
+                                "N/A", "N/A", "N/A", absolute_z, absolute_y, absolute_x, "N/A", "N/A", "N/A"],
+                               force=True)
+        if self.positioning.missCount <= self.missLimit:
+            print("Successfully Landed!")
+            self.exitStatus = 0
+        else:
+            print("Safety Abort Landed!")
+            self.exitStatus = 1
 
     def send_ned_velocity(
             self,
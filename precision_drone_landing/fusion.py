@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+from typing import Mapping, Optional
+
+import numpy as np
+
+# The MAD of normally distributed values times this is their standard deviation
+_MAD_TO_STD = 1.4826
+
+
+def expected_error(size, height, noise_floor: float = 0.02, noise_scale: float = 0.03):
+    """Get the expected error in meters of a position estimated from a code.
+
+    A code covers fewer pixels the further away or the smaller it is, and the error grows with the square
+    of the height over the size. The default parameters are fitted to the regressor's errors in
+    scripts/benchmark_envelope.py.
+
+    >>> round(float(expected_error(1.0, 10)), 2)
+    3.02
+
+    :param size: The scaling factor of the code, or an array of them.
+    :param height: The height in meters above the code, or an array of them.
+    :param noise_floor: The error in meters of an estimate made from up close.
+    :param noise_scale: How fast the error grows with the square of the height over the size."""
+    return noise_floor + noise_scale * np.square(height) / size
+
+
+def weighted_median(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Get the weighted median of each column.
+
+    >>> weighted_median(np.array([[1.0], [2.0], [10.0]]), np.array([1.0, 1.0, 1.0]))
+    array([2.])
+
+    :param values: An array of shape (N, M).
+    :param weights: An array of shape (N,) of non-negative weights that do not all equal 0.
+    :returns: An array of shape (M,)."""
+    order = np.argsort(values, axis=0)
+    cumulative = np.cumsum(weights[order], axis=0)
+    middle = np.argmax(cumulative >= cumulative[-1] / 2, axis=0)
+    columns = np.arange(values.shape[1])
+    return values[order[middle, columns], columns]
+
+
+class LayerFusion:
+    """The LayerFusion class combines the recent position estimates of every layer into one position.
+
+    Estimates are weighted by their recency and by how accurate their layer is at the current height,
+    see expected_error. Estimates that are further from the weighted median than gate times the weighted
+    median absolute deviation on any axis are left out, so that one bad regressor output does not pull
+    the position away. The rest are averaged with their weights. Every step works on all estimates at
+    once."""
+
+    def __init__(
+            self,
+            levels: Optional[Mapping] = None,
+            gate: float = 3.5,
+            min_spread: float = 0.05,
+            limit: float = 15):
+        """
+        :param levels: A dictionary-like object mapping from level names (e.g. "0") to scaling factors.
+        :param gate: How many standard deviations, estimated from the MAD, an estimate may be from the median.
+        :param min_spread: The smallest standard deviation in meters to gate with, so that estimates that
+            agree very closely do not leave out good ones.
+        :param limit: Estimates with any coordinate this far from the drone in meters are left out.
+        """
+        if levels:
+            self.levels = levels
+        else:
+            levels_path = Path('../config/qr_sizes.json')
+            with open(levels_path, 'r') as levels_file:
+                self.levels = json.load(levels_file)
+        self.gate = gate
+        self.min_spread = min_spread
+        self.limit = limit
+        self._sizes = np.array([self.levels[level] for level in sorted(self.levels, key=int)])
+
+    def fuse(self, positions: np.ndarray, layers: np.ndarray, weights: np.ndarray) -> Optional[np.ndarray]:
+        """Get the fused position.
+
+        :param positions: An array of shape (N, 3) of the x, y, z position estimates.
+        :param layers: An array of shape (N,) of the layer each estimate was made from.
+        :param weights: An array of shape (N,) of the recency weight of each estimate.
+        :returns: An array of shape (3,), or None if there are no usable estimates."""
+        usable = np.all(np.abs(positions) < self.limit, axis=1) & (weights > 0)
+        if not usable.any():
+            return None
+        positions, layers, weights = positions[usable], layers[usable], weights[usable]
+        height = abs(weighted_median(positions[:, 2:], weights)[0])
+        weights = weights / expected_error(self._sizes[layers], height) ** 2
+        median = weighted_median(positions, weights)
+        deviations = np.abs(positions - median)
+        spread = np.maximum(_MAD_TO_STD * weighted_median(deviations, weights), self.min_spread)
+        inliers = np.all(deviations <= self.gate * spread, axis=1)
+        if not inliers.any():
+            # Every estimate is an outlier on some axis, which leaves the median of each axis
+            return median
+        return weights[inliers] @ positions[inliers] / weights[inliers].sum()
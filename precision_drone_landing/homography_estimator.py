@@ -0,0 +1,128 @@
+import json
+import math
+from pathlib import Path
+from typing import Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from angle_unit import AngleUnit
+
+# The corners of a code one unit across, centered on the origin, in the order that the
+# recognizer reports them when the code is upright in the image.
+MODEL_CORNERS = np.array([
+    [-0.5, -0.5],
+    [-0.5, 0.5],
+    [0.5, 0.5],
+    [0.5, -0.5]
+])
+
+
+class HomographyEstimator:
+    """The HomographyEstimator class estimates the pose of the drone relative to the target analytically.
+
+    Unlike the DisplacementEstimator, which feeds hull angles to a learned regressor and guesses the
+    rotation from a single diagonal, this class solves for the planar homography between each code
+    and its image. Since the size of each code and the camera's field of view are known, the homography
+    can be decomposed into the full pose (x, y, z, yaw) of the camera relative to the code.
+    See https://en.wikipedia.org/wiki/Homography_(computer_vision)
+
+    The results use the same conventions as the DisplacementEstimator, so the two are interchangeable:
+    displacements are in target-space and are turned into drone-space with
+    DisplacementEstimator.target_to_drone_space, and yaws have the sign of
+    DisplacementEstimator.estimate_rotation."""
+
+    def __init__(
+            self,
+            levels: Optional[Mapping] = None,
+            fov: float = 60,
+            units: AngleUnit = AngleUnit.DEGREES,
+            side_length: float = 1):
+        """
+        :param levels: A dictionary-like object mapping from level names (e.g. "0") to scaling factors.
+        :param fov: The horizontal field of view. Units are specified by the units argument.
+        :param units: The units of the fov argument.
+        :param side_length: The side length in meters of a code whose scaling factor is 1.
+        """
+        self.horizontal_fov = fov
+        if units == AngleUnit.DEGREES:
+            self.horizontal_fov = math.radians(fov)
+        if levels:
+            self.levels = levels
+        else:
+            levels_path = Path('../config/qr_sizes.json')
+            with open(levels_path, 'r') as levels_file:
+                self.levels = json.load(levels_file)
+        self.side_length = side_length
+        # As in the DisplacementEstimator, the image is projected on a screen 1 unit away from the camera.
+        self._virtual_width = 2 * math.tan(self.horizontal_fov / 2)
+
+    def estimate_poses(
+            self,
+            corners: np.ndarray,
+            levels: Sequence[str],
+            image_height: int,
+            image_width: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Estimate the pose of the drone from every QR code in a frame at once.
+
+        :param corners: An array of shape (N, 4, 2) containing the corners of N detected QR codes,
+            in units of pixels, in the order reported by the recognizer.
+        :param levels: N strings containing the level of each QR code.
+        :param image_height: The height of the image in pixels.
+        :param image_width: The width of the image in pixels.
+        :returns: A tuple of two arrays. The first has shape (N, 3) and contains the displacement of
+            the drone from the target in target-space. The second has shape (N,) and contains the
+            yaw of the drone relative to each code in radians. Rows for codes of unknown levels are NaN."""
+        corners = np.asarray(corners, dtype=float)
+        n = corners.shape[0]
+        if n == 0:
+            return np.empty((0, 3)), np.empty(0)
+        sizes = self.side_length * np.array([self.levels.get(level, math.nan) for level in levels], dtype=float)
+
+        # Image points on the virtual screen, with the optical axis at (0, 0)
+        scale = self._virtual_width / image_width
+        image_x = (corners[..., 0] - image_width / 2) * scale
+        image_y = (corners[..., 1] - image_height / 2) * scale
+
+        # The homography from the unit square to each quadrilateral has a closed form, see
+        # Heckbert, "Fundamentals of Texture Mapping and Image Warping", section 2.2.3.
+        # The square's corner i maps to image corner i: (0, 0), (1, 0), (1, 1), (0, 1) in (s, t).
+        x0, x1, x2, x3 = image_x.T
+        y0, y1, y2, y3 = image_y.T
+        sum_x = x0 - x1 + x2 - x3
+        sum_y = y0 - y1 + y2 - y3
+        dx1 = x1 - x2
+        dx2 = x3 - x2
+        dy1 = y1 - y2
+        dy2 = y3 - y2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            denominator = dx1 * dy2 - dx2 * dy1  # Zero for degenerate hulls, which then become NaN
+            g = (sum_x * dy2 - dx2 * sum_y) / denominator
+            h = (dx1 * sum_y - sum_x * dy1) / denominator
+        # The columns of the square's homography are (x1 - x0 + g * x1, ...), (x3 - x0 + h * x3, ...) and (x0, y0, 1).
+        # The model corners run along the code's y-axis first, so s = y / size + 1/2 and t = x / size + 1/2.
+        # Substituting those gives the columns of the homography from the target plane, in meters.
+        s_column = np.stack([x1 - x0 + g * x1, y1 - y0 + g * y1, g])
+        t_column = np.stack([x3 - x0 + h * x3, y3 - y0 + h * y3, h])
+        r1 = t_column / sizes
+        r2 = s_column / sizes
+        offset = (s_column + t_column) / 2
+        offset[0] += x0
+        offset[1] += y0
+        offset[2] += 1
+
+        # Since the camera intrinsics are folded into the virtual screen, H = k * [r1 r2 t], where r1 and r2
+        # are unit vectors. The homography's last row ends in 1 > 0, which keeps the target in front of the camera.
+        normalization = 2 / (np.sqrt(np.einsum('ij,ij->j', r1, r1)) + np.sqrt(np.einsum('ij,ij->j', r2, r2)))
+        translation = offset * normalization
+
+        # The rotation of the code in the image. The drone has to yaw the other way to align itself.
+        yaws = -np.arctan2(r1[1], r1[0])
+        # The regressor reports the code's position in the image rotated by a quarter turn.
+        # Keep that convention, then undo the yaw so the result is in target-space.
+        cos_yaw = np.cos(yaws)
+        sin_yaw = np.sin(yaws)
+        displacements = np.empty((n, 3))
+        displacements[:, 0] = cos_yaw * translation[1] + sin_yaw * translation[0]
+        displacements[:, 1] = sin_yaw * translation[1] - cos_yaw * translation[0]
+        displacements[:, 2] = translation[2]
+        return displacements, yaws
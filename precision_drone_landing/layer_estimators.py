@@ -0,0 +1,167 @@
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+
+# The columns of a LayerRingBuffer row
+_TIME, _X, _Y, _Z = range(4)
+
+
+class LayerRingBuffer:
+    """Keeps the recent position estimates of one layer of the landing pad in a fixed-size circular array.
+
+    Rows are (time, x, y, z), appended in time order. Appending is O(1), and when the buffer is full the
+    oldest row is overwritten, so memory use does not grow however long the drone hovers. Rows older than
+    max_age are dropped by expire, and the weighted average is computed over all rows at once."""
+
+    def __init__(
+            self,
+            capacity: int = 256,
+            max_age: float = 3):
+        """
+        :param capacity: The most rows to keep. This should be more than the number of frames in max_age.
+        :param max_age: The age in seconds after which a row expires.
+        """
+        self.capacity = capacity
+        self.max_age = max_age
+        self._rows = np.empty((capacity, 4))
+        self._start = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, x: float, y: float, z: float, timestamp: float):
+        """Add a position estimate, overwriting the oldest one if the buffer is full."""
+        end = (self._start + self._count) % self.capacity
+        self._rows[end] = timestamp, x, y, z
+        if self._count < self.capacity:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def clear(self):
+        """Drop every row."""
+        self._start = 0
+        self._count = 0
+
+    def rows(self) -> np.ndarray:
+        """Get a copy of the rows, oldest first, as an array of shape (N, 4)."""
+        return self._rows[(self._start + np.arange(self._count)) % self.capacity]
+
+    def expire(self, now: float):
+        """Drop the rows older than max_age.
+
+        Rows are in time order, so the expired rows are always the oldest ones."""
+        if self._count == 0:
+            return
+        expired = np.count_nonzero(now - self.rows()[:, _TIME] > self.max_age)
+        self._start = (self._start + expired) % self.capacity
+        self._count -= expired
+
+    def weighted_average(self, now: float) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """Get a weighted average of the positions. Newer positions are weighted more heavily.
+
+        :param now: The current time, which the age of each row is measured from.
+        :returns: The x, y, z weighted averages, or three Nones if the buffer is empty."""
+        if self._count == 0:
+            return None, None, None
+        rows = self.rows()
+        weights = 1 / (1 + (now - rows[:, _TIME]))
+        x, y, z = weights @ rows[:, _X:] / weights.sum()
+        return float(x), float(y), float(z)
+
+    def observations(self, now: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the positions with the weights weighted_average gives them.
+
+        :param now: The current time, which the age of each row is measured from.
+        :returns: An array of shape (N, 3) of positions and an array of shape (N,) of weights."""
+        rows = self.rows()
+        return rows[:, _X:], 1 / (1 + (now - rows[:, _TIME]))
+
+
+class DecayedLayerEstimator:
+    """Keeps an exponentially decayed average of the position estimates of one layer of the landing pad.
+
+    Instead of storing rows, this keeps the decayed sums of the weights and of the weighted positions,
+    as of the time of the newest estimate. Appending decays the sums to the new time and adds the new
+    estimate with a weight of 1, so both appending and averaging are O(1) in time and memory. An
+    estimate of age a ends up weighted by exp(-a / time_constant), which, like the 1 / (1 + a) weights
+    of LayerRingBuffer, favours newer positions. Unlike LayerRingBuffer, old estimates fade out instead
+    of being dropped at max_age, and the whole average is dropped once the newest estimate is older than
+    max_age, so the drone still knows when it has lost the pad. scripts/compare_layer_estimators.py
+    measures how far the two averages are apart."""
+
+    def __init__(
+            self,
+            time_constant: float = 1,
+            max_age: float = 3):
+        """
+        :param time_constant: The age in seconds at which the weight of an estimate has decayed to 1 / e.
+        :param max_age: The age in seconds of the newest estimate after which the average is dropped.
+        """
+        self.time_constant = time_constant
+        self.max_age = max_age
+        self._weight = 0.0
+        self._sums = np.zeros(3)
+        self._time: Optional[float] = None
+        self._count = 0
+
+    def __len__(self) -> int:
+        """The number of estimates appended since the average was last dropped.
+
+        This is not the number of estimates younger than max_age as for LayerRingBuffer, but the two only
+        differ when a layer is seen in sparse bursts less than max_age apart."""
+        return self._count
+
+    def append(self, x: float, y: float, z: float, timestamp: float):
+        """Decay the sums to the time of a position estimate and add it."""
+        if self._time is None or timestamp >= self._time:
+            if self._time is not None:
+                decay = math.exp((self._time - timestamp) / self.time_constant)
+                self._weight *= decay
+                self._sums *= decay
+            self._time = timestamp
+            weight = 1.0
+        else:
+            # An estimate older than the newest one is added already decayed
+            weight = math.exp((timestamp - self._time) / self.time_constant)
+        self._weight += weight
+        self._sums += weight * x, weight * y, weight * z
+        self._count += 1
+
+    def clear(self):
+        """Drop the average."""
+        self._weight = 0.0
+        self._sums[:] = 0
+        self._time = None
+        self._count = 0
+
+    def expire(self, now: float):
+        """Drop the average if the newest estimate is older than max_age."""
+        if self._time is not None and now - self._time > self.max_age:
+            self.clear()
+
+    def weighted_average(self, now: float) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """Get the decayed average of the positions.
+
+        Decaying the sums to now would scale the weights and the weighted positions alike, so the
+        average does not depend on it, and now is only used to leave out an average that has expired.
+
+        :param now: The current time.
+        :returns: The x, y, z weighted averages, or three Nones if there is no average."""
+        if self._time is None or now - self._time > self.max_age:
+            return None, None, None
+        x, y, z = self._sums / self._weight
+        return float(x), float(y), float(z)
+
+    def observations(self, now: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the average as a single position, weighted by the decayed weight of the estimates in it.
+
+        :param now: The current time, which the weight is decayed to.
+        :returns: An array of shape (N, 3) of positions and an array of shape (N,) of weights, where N is
+            0 or 1."""
+        if self._time is None or now - self._time > self.max_age:
+            return np.empty((0, 3)), np.empty(0)
+        decay = math.exp(-max(0.0, now - self._time) / self.time_constant)
+        return (self._sums / self._weight)[np.newaxis], np.array([self._weight * decay])
@@ -1,27 +1,290 @@
+"""Writing logs without holding up the caller.
+
+Rows passed to a Logger are appended to a bounded buffer, and a background thread wakes up once a
+second, or once a batch has built up, and writes every waiting row. If the buffer is full, the row is
+dropped and counted rather than waited for. The writer converts and writes the rows a slice at a time
+and lets other threads run between slices, so it never holds the GIL for long enough to stall the
+control loop. scripts/benchmark_log.py measures how much logging adds to each iteration of such a loop.
+Lines that cannot be written, such as a value too large for its column, are counted and reported on
+close. Logs are written as CSV, or, with LOG_FORMAT set to "binary", in a columnar binary format
+laid out as follows:
+
+    8 bytes   The magic string b'PDLTELEM'
+    4 bytes   The length of the header in bytes, as a little-endian unsigned integer
+    n bytes   A JSON header with the format version and the name and dtype of each column
+    ...       Blocks of rows, each made of the number of rows as a little-endian unsigned integer
+              followed by the values of each column in turn, as fixed-width little-endian values
+
+Numbers are stored at the width of their column's dtype, so a binary log is a fraction of the size of
+the CSV. Values that are not numbers, such as None or "N/A", are stored as NaN in float columns.
+read_binary_log reads a log back into arrays, and export_csv converts it to CSV.
+"""
+import atexit
 import csv
-from typing import Sequence
+import json
+import math
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from config import LOG_FORMAT
+
+MAGIC = b'PDLTELEM'
+FORMAT_VERSION = 1
+BINARY_SUFFIX = '.bin'
+_LENGTH = struct.Struct('<I')
+# The most rows converted and written without letting other threads run
+_SLICE = 32
+
+
+def _infer_dtype(value) -> str:
+    """Get the column dtype for a value, when the caller does not give one."""
+    if isinstance(value, bool):
+        return '|b1'
+    if isinstance(value, str):
+        return '|S16'
+    return '<f8'
+
+
+def _to_number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _column(values: Sequence, dtype: np.dtype) -> np.ndarray:
+    """Convert the values of one column to an array of its dtype."""
+    try:
+        # Most columns hold nothing but numbers, or None, which becomes NaN, or ASCII strings
+        return np.array(values, dtype=dtype)
+    except (TypeError, ValueError, UnicodeEncodeError):
+        pass
+    if dtype.kind == 'S':
+        return np.array([str(value).encode('utf-8')[:dtype.itemsize] for value in values], dtype=dtype)
+    if dtype.kind == 'f':
+        return np.array([_to_number(value) for value in values], dtype=dtype)
+    return np.array(values, dtype=dtype)
 
 
 class Logger:
-    def __init__(self, filename: str, params: Sequence[str]):
+    def __init__(
+            self,
+            filename: str,
+            params: Sequence[str],
+            dtypes: Optional[Sequence[str]] = None,
+            log_format: str = LOG_FORMAT,
+            buffer_size: int = 4096,
+            batch_size: int = 256,
+            flush_interval: float = 1):
         """
-        :param filename: The name of the log file to save
-        :param params: A list of first row titles"""
-        self.file = open(filename, 'w')
-        self.writer = csv.writer(self.file, dialect='excel')
+        :param filename: The name of the log file to save. Binary logs replace its suffix with ".bin".
+        :param params: A list of first row titles
+        :param dtypes: The numpy dtype of each column of a binary log, e.g. "<f4" or "|S8". Defaults to
+            64-bit floats for numbers and 16-byte strings for strings, guessed from the first line.
+        :param log_format: "csv" or "binary".
+        :param buffer_size: The most lines waiting to be written. Lines beyond it are dropped.
+        :param batch_size: The number of waiting lines that wakes the writer before flush_interval is up.
+        :param flush_interval: The most time in seconds a line waits before it is written."""
+        if log_format not in ('csv', 'binary'):
+            raise ValueError(f'Unknown log format "{log_format}"')
+        if dtypes is not None and len(dtypes) != len(params):
+            raise ValueError(f'{len(dtypes)} dtypes for {len(params)} columns')
+        self.binary = log_format == 'binary'
+        self.filename = str(Path(filename).with_suffix(BINARY_SUFFIX)) if self.binary else filename
         self.params = params
-        self.writer.writerow(params)
+        self.dtypes = None if dtypes is None else [np.dtype(dtype).newbyteorder('<') for dtype in dtypes]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.stride = 1
+        self.dropped = 0
+        # The lines that could not be written, and the first error that stopped them
+        self.failed = 0
+        self.error: Optional[Exception] = None
+        self._skipped = 0
+        self._closed = False
+        self._header_written = False
+        self._lines = deque()
+        self._wake = threading.Event()
+        if self.binary:
+            self.file = open(self.filename, 'wb')
+        else:
+            self.file = open(self.filename, 'w', newline='')
+            self.writer = csv.writer(self.file, dialect='excel')
+            self.writer.writerow(params)
+        self._thread = threading.Thread(target=self._run, name=f'Logger {self.filename}', daemon=True)
+        self._thread.start()
+        # The program ends with sys.exit when the drone lands, which does not wait for daemon threads
+        atexit.register(self.close)
 
     def __del__(self):
+        if hasattr(self, '_thread'):
+            self.close()
+
+    def close(self):
+        """Write every waiting line and close the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        if self.binary and not self._header_written:
+            self._write_header(None)
         self.file.close()
+        if self.dropped:
+            print(f'ALERT: {self.dropped} lines did not fit in the buffer of "{self.filename}" and were dropped')
+        if self.failed:
+            print(f'ALERT: {self.failed} lines could not be written to "{self.filename}": {self.error!r}')
+
+    def set_stride(self, stride: int):
+        """Only keep one line out of every `stride` lines passed to writeline.
 
-    def writeline(self, arguments: Sequence):
+        A stride of 1 keeps every line."""
+        stride = max(1, stride)
+        if stride != self.stride:
+            self.stride = stride
+            self._skipped = 0
+
+    def writeline(self, arguments: Sequence, force: bool = False):
         """Enter a new line of elements to the log.
 
         Must have the same number of elements
-        as this element was initialized with.
+        as this element was initialized with. The line is written
+        later by a background thread.
+
+        :param arguments: The elements of the line
+        :param force: Write the line even if the stride would skip it
         """
-        if len(arguments) == len(self.params):
-            self.writer.writerow(arguments)
-        else:
+        if len(arguments) != len(self.params):
             print("Exception: improper number of arguments!")
+            return
+        if not force and self._skipped + 1 < self.stride:
+            self._skipped += 1
+            return
+        self._skipped = 0
+        if self._closed:
+            return
+        # Only the writer thread removes lines, so the buffer cannot grow past buffer_size
+        waiting = len(self._lines)
+        if waiting >= self.buffer_size:
+            self.dropped += 1
+            return
+        self._lines.append(tuple(arguments))
+        if waiting + 1 == self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        """Write the waiting lines every flush_interval, or as soon as a batch is waiting, until closed."""
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            closing = self._closed
+            while self._lines:
+                lines = [self._lines.popleft() for _ in range(min(_SLICE, len(self._lines)))]
+                try:
+                    self._write(lines)
+                except Exception:
+                    # A line that cannot be converted must not stop every later line from being written
+                    self._write_each(lines)
+                # Let the control loop run between slices
+                time.sleep(0)
+            self.file.flush()
+            if closing:
+                return
+
+    def _write_each(self, lines: List[tuple]):
+        """Write lines one at a time, counting the ones that cannot be written."""
+        for line in lines:
+            try:
+                self._write([line])
+            except Exception as error:
+                self.failed += 1
+                if self.error is None:
+                    self.error = error
+
+    def _write(self, lines: List[tuple]):
+        if not self.binary:
+            self.writer.writerows(lines)
+            return
+        if not self._header_written:
+            self._write_header(lines[0])
+        # Convert every column before writing anything, so that a bad value cannot leave half a block
+        columns = [_column(values, dtype).tobytes() for values, dtype in zip(zip(*lines), self.dtypes)]
+        self.file.write(_LENGTH.pack(len(lines)))
+        for column in columns:
+            self.file.write(column)
+
+    def _write_header(self, first_line: Optional[tuple]):
+        if self.dtypes is None:
+            self.dtypes = [np.dtype(_infer_dtype(value)) for value in (first_line or [None] * len(self.params))]
+        header = json.dumps({
+            'format_version': FORMAT_VERSION,
+            'columns': [{'name': name, 'dtype': dtype.str} for name, dtype in zip(self.params, self.dtypes)]
+        }).encode('utf-8')
+        self.file.write(MAGIC)
+        self.file.write(_LENGTH.pack(len(header)))
+        self.file.write(header)
+        self._header_written = True
+
+
+def read_binary_log(path: Union[str, Path]) -> Tuple[List[str], List[np.ndarray]]:
+    """Read a binary log.
+
+    A block cut short, as when the program was killed while writing it, is ignored.
+
+    :param path: The file to read.
+    :returns: The names of the columns and an array of the values of each column.
+    :raises ValueError: If the file is not a binary log of a version this code can read."""
+    with open(path, 'rb') as log_file:
+        data = log_file.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f'"{path}" is not a binary log')
+    (header_length,) = _LENGTH.unpack_from(data, len(MAGIC))
+    offset = len(MAGIC) + _LENGTH.size
+    header = json.loads(data[offset:offset + header_length])
+    if header['format_version'] != FORMAT_VERSION:
+        raise ValueError(f'"{path}" has format version {header["format_version"]}, expected {FORMAT_VERSION}')
+    offset += header_length
+    names = [column['name'] for column in header['columns']]
+    dtypes = [np.dtype(column['dtype']) for column in header['columns']]
+    row_size = sum(dtype.itemsize for dtype in dtypes)
+    blocks = [[] for _ in dtypes]
+    while offset + _LENGTH.size <= len(data):
+        (rows,) = _LENGTH.unpack_from(data, offset)
+        if offset + _LENGTH.size + rows * row_size > len(data):
+            break
+        offset += _LENGTH.size
+        for block, dtype in zip(blocks, dtypes):
+            block.append(np.frombuffer(data, dtype=dtype, count=rows, offset=offset))
+            offset += rows * dtype.itemsize
+    return names, [
+        np.concatenate(block) if block else np.empty(0, dtype=dtype)
+        for block, dtype in zip(blocks, dtypes)
+    ]
+
+
+def export_csv(path: Union[str, Path], csv_path: Union[str, Path]):
+    """Convert a binary log to CSV, the way the Logger would have written it.
+
+    :param path: The binary log to read.
+    :param csv_path: The CSV file to write."""
+    names, columns = read_binary_log(path)
+    text_columns = []
+    for column in columns:
+        if column.dtype.kind == 'S':
+            text_columns.append([value.decode('utf-8', 'replace') for value in column])
+        elif column.dtype.kind == 'f':
+            # None was written as an empty field
+            text_columns.append(['' if math.isnan(value) else str(value) for value in column])
+        else:
+            text_columns.append(column.tolist())
+    with open(csv_path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file, dialect='excel')
+        writer.writerow(names)
+        writer.writerows(zip(*text_columns))
@@ -0,0 +1,115 @@
+from pathlib import Path
+from typing import Mapping, Union
+
+import numpy as np
+
+from model_format import load_arrays, save_arrays
+
+# Where scripts/build_lookup_grid.py writes the grid, which is not checked into git
+LOOKUP_GRID = Path('../assets/displacement_detection_models/lookup_grid.lut')
+# The eight corners of a grid cell, as offsets along each axis
+_CELL_CORNERS = np.array([[(corner >> axis) & 1 for axis in range(3)] for corner in range(8)])
+
+
+def hull_features(hull_angles: np.ndarray) -> np.ndarray:
+    """Reduce hull angles to the three features the lookup grid is indexed by.
+
+    The first two features compare the angular diameters of opposite sides, which tells how far
+    off-center the code is. The third is the logarithm of the mean side angle, which tells how far
+    away it is.
+
+    >>> hull_features(np.array([[0.2, 0.2, 0.2, 0.2, 0.28]]))
+    array([[ 0.        ,  0.        , -1.60943791]])
+
+    :param hull_angles: An array of shape (N, 5), as returned by DisplacementEstimator.get_hull_angles_batch.
+    :returns: An array of shape (N, 3)."""
+    hull_angles = np.asarray(hull_angles, dtype=float)
+    sides = hull_angles[:, :4]
+    return np.stack([
+        (sides[:, 0] - sides[:, 2]) / (sides[:, 0] + sides[:, 2]),
+        (sides[:, 1] - sides[:, 3]) / (sides[:, 1] + sides[:, 3]),
+        np.log(sides.mean(axis=1))
+    ], axis=1)
+
+
+def displacement_to_cell_values(displacements: np.ndarray) -> np.ndarray:
+    """Convert displacements to the values stored in the grid: (x / z, y / z, log z).
+
+    These vary much more smoothly over the grid than the displacements themselves."""
+    displacements = np.asarray(displacements, dtype=float)
+    z = displacements[:, 2]
+    return np.stack([displacements[:, 0] / z, displacements[:, 1] / z, np.log(z)], axis=1)
+
+
+class LookupGridEstimator:
+    """Estimates displacement by interpolating in a precomputed table instead of running a regressor.
+
+    The geometry the regressor learns is fully known, so scripts/build_lookup_grid.py samples it
+    offline and stores the average displacement seen in each cell of a regular grid over the
+    hull_features. At runtime, a query is a trilinear interpolation between the eight surrounding
+    cells, which is done for all codes of a frame at once.
+
+    This class has the same `predict` method as the regressor, so it can be passed to a
+    DisplacementEstimator in place of one."""
+
+    def __init__(
+            self,
+            table: np.ndarray,
+            lower: np.ndarray,
+            cell_size: np.ndarray):
+        """
+        :param table: An array of shape (nx, ny, nz, 3) containing the cell values, see displacement_to_cell_values.
+        :param lower: The features at the center of the first cell.
+        :param cell_size: The distance between cell centers along each feature axis.
+        """
+        self.table = table
+        self.lower = np.asarray(lower, dtype=float)
+        self.cell_size = np.asarray(cell_size, dtype=float)
+        self.shape = np.array(table.shape[:3])
+        self._flat_table = table.reshape(-1, 3)
+        self._strides = np.array([self.shape[1] * self.shape[2], self.shape[2], 1])
+
+    @classmethod
+    def load(cls, path: Union[str, Path] = LOOKUP_GRID) -> 'LookupGridEstimator':
+        """Memory map a lookup grid written by save.
+
+        :raises FileNotFoundError: If the grid has not been built."""
+        if not Path(path).exists():
+            raise FileNotFoundError(f'The lookup grid "{path}" has not been built. Run scripts/build_lookup_grid.py '
+                                    f'to build it, or set DISPLACEMENT_ENGINE to another engine.')
+        arrays, metadata = load_arrays(path, 'lookup_grid')
+        return cls(arrays['table'], metadata['lower'], metadata['cell_size'])
+
+    def save(self, path: Union[str, Path], metadata: Mapping = None):
+        """Write the lookup grid to an artifact file. See model_format.py."""
+        save_arrays(path, 'lookup_grid', {'table': self.table}, dict(
+            metadata or {},
+            lower=self.lower.tolist(),
+            cell_size=self.cell_size.tolist()
+        ))
+
+    @property
+    def nbytes(self) -> int:
+        """The size of the table in bytes."""
+        return self.table.nbytes
+
+    def predict(self, X) -> np.ndarray:
+        """Estimate the displacements for some hull angles.
+
+        :param X: An array of shape (N, 5) containing hull angles.
+        :returns: An array of shape (N, 3) containing displacements for a code whose scaling factor is 1."""
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X[np.newaxis]
+        position = (hull_features(X) - self.lower) / self.cell_size
+        position = np.clip(position, 0, self.shape - 1.000001)  # Queries off the grid use its edge
+        first = np.floor(position).astype(int)
+        fraction = position - first
+
+        # (N, 8) indices and weights of the surrounding cells
+        indices = (first[:, np.newaxis, :] + _CELL_CORNERS) @ self._strides
+        weights = np.prod(np.where(_CELL_CORNERS, fraction[:, np.newaxis, :], 1 - fraction[:, np.newaxis, :]), axis=2)
+        values = np.einsum('ij,ijk->ik', weights, self._flat_table[indices])
+
+        depth = np.exp(values[:, 2])
+        return np.stack([values[:, 0] * depth, values[:, 1] * depth, depth], axis=1)
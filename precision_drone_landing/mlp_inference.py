@@ -0,0 +1,140 @@
+import threading
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+def _identity(x: np.ndarray):
+    pass
+
+
+def _tanh(x: np.ndarray):
+    np.tanh(x, out=x)
+
+
+def _relu(x: np.ndarray):
+    np.maximum(x, 0, out=x)
+
+
+def _logistic(x: np.ndarray):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1
+    np.reciprocal(x, out=x)
+
+
+# In-place activation functions, named the same way as sklearn names them.
+ACTIVATIONS = {
+    'identity': _identity,
+    'tanh': _tanh,
+    'relu': _relu,
+    'logistic': _logistic
+}
+
+
+class NumpyMLP:
+    """Evaluates a trained multi-layer perceptron using nothing but NumPy.
+
+    sklearn's MLPRegressor.predict spends most of its time validating its input, which dominates
+    the cost of running our tiny network on a handful of QR codes per frame. This class only keeps
+    the weights and biases of the network and runs the forward pass into buffers that are allocated
+    once and reused, so that each call costs a few microseconds.
+
+    Predictions are serialized with a lock, since the buffers are shared between calls."""
+
+    def __init__(
+            self,
+            coefs: Sequence[np.ndarray],
+            intercepts: Sequence[np.ndarray],
+            activation: str = 'tanh',
+            out_activation: str = 'identity',
+            dtype=np.float64,
+            max_batch: int = 8,
+            input_offset: Optional[np.ndarray] = None,
+            input_scale: Optional[np.ndarray] = None,
+            output_scale: Optional[np.ndarray] = None):
+        """
+        :param coefs: The weight matrices of each layer. Layer i has shape (inputs, outputs).
+        :param intercepts: The bias vectors of each layer. Layer i has shape (outputs,).
+        :param activation: The name of the activation function of the hidden layers.
+        :param out_activation: The name of the activation function of the output layer.
+        :param dtype: The floating point type to evaluate the network in, np.float64 or np.float32.
+        :param max_batch: The number of rows to allocate buffers for up front. Larger batches
+            grow the buffers as needed.
+        :param input_offset: If given, subtracted from each input row before the first layer.
+        :param input_scale: If given, multiplies each input row after the offset is subtracted.
+        :param output_scale: If given, multiplies each output row.
+        """
+        if len(coefs) != len(intercepts):
+            raise ValueError('Each layer needs both weights and biases')
+        self.dtype = np.dtype(dtype)
+        self.coefs = [np.asarray(coef, dtype=self.dtype) for coef in coefs]
+        self.intercepts = [np.asarray(intercept, dtype=self.dtype) for intercept in intercepts]
+        self.activation = activation
+        self.out_activation = out_activation
+        self.input_offset = None if input_offset is None else np.asarray(input_offset, dtype=self.dtype)
+        self.input_scale = None if input_scale is None else np.asarray(input_scale, dtype=self.dtype)
+        self.output_scale = None if output_scale is None else np.asarray(output_scale, dtype=self.dtype)
+        self._activations = [ACTIVATIONS[activation]] * (len(self.coefs) - 1) + [ACTIVATIONS[out_activation]]
+        self._lock = threading.Lock()
+        self._buffers = []
+        self._allocate(max_batch)
+
+    @classmethod
+    def from_regressor(cls, regressor, dtype=np.float64) -> 'NumpyMLP':
+        """Copy the network out of a trained sklearn MLPRegressor.
+
+        :param regressor: A fitted MLPRegressor, or any object with the same `coefs_`, `intercepts_`,
+            `activation` and `out_activation_` attributes.
+        :param dtype: The floating point type to evaluate the network in."""
+        return cls(
+            coefs=regressor.coefs_,
+            intercepts=regressor.intercepts_,
+            activation=regressor.activation,
+            out_activation=regressor.out_activation_,
+            dtype=dtype
+        )
+
+    @property
+    def n_features_in(self) -> int:
+        """The number of inputs the network takes."""
+        return self.coefs[0].shape[0]
+
+    @property
+    def n_outputs(self) -> int:
+        """The number of outputs the network produces."""
+        return self.coefs[-1].shape[1]
+
+    def _allocate(self, batch: int):
+        """Allocate one output buffer per layer, large enough for `batch` rows."""
+        self._buffers = [np.empty((batch, coef.shape[1]), dtype=self.dtype) for coef in self.coefs]
+
+    def predict(self, X) -> np.ndarray:
+        """Run the forward pass.
+
+        :param X: An array of shape (n_samples, n_features_in), or a single sample of shape (n_features_in,).
+        :returns: An array of shape (n_samples, n_outputs)."""
+        X = np.asarray(X, dtype=self.dtype)
+        if X.ndim == 1:
+            X = X[np.newaxis]
+        if X.shape[1] != self.n_features_in:
+            raise ValueError(f'Expected {self.n_features_in} features, got {X.shape[1]}')
+        n = X.shape[0]
+        if self.input_offset is not None:
+            X = X - self.input_offset
+        if self.input_scale is not None:
+            X = X * self.input_scale
+        with self._lock:
+            if n > self._buffers[0].shape[0]:
+                self._allocate(n)
+            layer_input = X
+            for coef, intercept, activation, buffer in zip(
+                    self.coefs, self.intercepts, self._activations, self._buffers):
+                layer_output = buffer[:n]
+                np.dot(layer_input, coef, out=layer_output)
+                layer_output += intercept
+                activation(layer_output)
+                layer_input = layer_output
+            if self.output_scale is not None:
+                return layer_input * self.output_scale
+            return layer_input.copy()
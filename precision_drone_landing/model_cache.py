@@ -0,0 +1,67 @@
+"""Finding the displacement model that matches the code that generates it.
+
+A model is identified by a build key: a hash of the generation script, which also holds the geometry
+of the training data, and of the hyperparameters in config/model_build.json. scripts/build_model.py
+trains a model only when no model with the current key is in the cache directory, and the drone
+software looks the model up by the same key. Changing the generation code or its parameters therefore
+changes which model is used, without any model being checked into git.
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional, Union
+
+from config import MODEL_CACHE_DIR
+from model_format import FORMAT_VERSION
+
+BUILD_SCRIPT = Path('../scripts/generate_displacement_model.py')
+BUILD_CONFIG = Path('../config/model_build.json')
+FALLBACK_MODEL = Path('../assets/displacement_detection_models/regressor.mlp')
+
+
+def build_key(
+        script_path: Union[str, Path] = BUILD_SCRIPT,
+        config_path: Union[str, Path] = BUILD_CONFIG) -> str:
+    """Get the key that identifies the model built by a script and its parameters.
+
+    :param script_path: The script that generates the model.
+    :param config_path: The JSON file of hyperparameters the script is run with.
+    :returns: A hexadecimal SHA-256 digest.
+    :raises OSError: If either file cannot be read."""
+    digest = hashlib.sha256()
+    with open(script_path, 'rb') as script_file:
+        digest.update(script_file.read())
+    with open(config_path, 'r') as config_file:
+        # Formatting changes to the JSON file do not change the model, so they do not change the key
+        digest.update(json.dumps(json.load(config_file), sort_keys=True).encode('utf-8'))
+    digest.update(f'format {FORMAT_VERSION}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cached_model_path(key: str, cache_dir: Union[str, Path] = MODEL_CACHE_DIR) -> Path:
+    """Get where the model with a build key is stored in the cache."""
+    return Path(cache_dir).expanduser() / f'regressor-{key}.mlp'
+
+
+def resolve_model(cache_dir: Optional[Union[str, Path]] = None) -> Path:
+    """Get the path of the model built from the current generation code.
+
+    An alert is only printed when the cache holds models built from other generation code, which
+    means the model needs to be rebuilt. Without a cache, the model in the assets directory is the
+    one to use.
+
+    :param cache_dir: The cache directory. Defaults to MODEL_CACHE_DIR.
+    :returns: The path of the cached model, or of the model checked into the assets
+        directory if the cache has no model for the current code."""
+    cache_dir = Path(cache_dir or MODEL_CACHE_DIR).expanduser()
+    try:
+        path = cached_model_path(build_key(), cache_dir)
+    except OSError:
+        print(f'ALERT: Cannot read the model generation code, using "{FALLBACK_MODEL}".')
+        return FALLBACK_MODEL
+    if path.exists():
+        return path
+    if any(cache_dir.glob('regressor-*.mlp')):
+        print(f'ALERT: The models in "{cache_dir}" were built from other generation code, using '
+              f'"{FALLBACK_MODEL}". Run scripts/build_model.py to rebuild the model.')
+    return FALLBACK_MODEL
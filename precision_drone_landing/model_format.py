@@ -0,0 +1,152 @@
+"""Reading and writing model artifacts without pickle.
+
+An artifact is a flat binary file laid out as follows:
+
+    8 bytes   The magic string b'PDLMODEL'
+    4 bytes   The length of the header in bytes, as a little-endian unsigned integer
+    n bytes   A JSON header, padded with spaces so that the data starts on a 64 byte boundary
+    ...       The raw arrays, each starting on a 64 byte boundary
+
+The header records the format version, the kind of model, the dtype, shape and offset of each
+array, and free-form metadata such as the activation functions and the hash of the code that
+trained the model. Arrays are memory mapped when loaded, so loading is nearly instant and several
+processes using the same artifact share its pages. (An .npz file would have been simpler, but
+numpy cannot memory map the members of a zip archive.)
+"""
+import json
+import struct
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+from mlp_inference import NumpyMLP
+
+MAGIC = b'PDLMODEL'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_LENGTH = struct.Struct('<I')
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def save_arrays(
+        path: Union[str, Path],
+        kind: str,
+        arrays: Mapping[str, np.ndarray],
+        metadata: Optional[Mapping] = None):
+    """Write named arrays and their metadata to an artifact file.
+
+    :param path: The file to write.
+    :param kind: What the arrays represent, e.g. "mlp". Loaders check this before using the arrays.
+    :param arrays: A dictionary-like object mapping from array names to arrays.
+    :param metadata: JSON-serializable information about the arrays."""
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {
+            'dtype': array.dtype.newbyteorder('<').str,
+            'shape': list(array.shape),
+            'offset': offset
+        }
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({
+        'format_version': FORMAT_VERSION,
+        'kind': kind,
+        'arrays': layout,
+        'metadata': dict(metadata or {})
+    }).encode('utf-8')
+    data_start = _align(len(MAGIC) + _LENGTH.size + len(header))
+    header += b' ' * (data_start - len(MAGIC) - _LENGTH.size - len(header))
+
+    with open(path, 'wb') as artifact:
+        artifact.write(MAGIC)
+        artifact.write(_LENGTH.pack(len(header)))
+        artifact.write(header)
+        for name, array in arrays.items():
+            artifact.seek(data_start + layout[name]['offset'])
+            artifact.write(array.astype(layout[name]['dtype'], copy=False).tobytes())
+
+
+def load_arrays(
+        path: Union[str, Path],
+        kind: str) -> Tuple[Dict[str, np.ndarray], dict]:
+    """Memory map the arrays of an artifact file.
+
+    :param path: The file to read.
+    :param kind: The kind of model expected in the file.
+    :returns: A tuple of a dictionary of read-only arrays and the metadata dictionary.
+    :raises ValueError: If the file is not an artifact, has an unsupported version or holds
+        a different kind of model."""
+    with open(path, 'rb') as artifact:
+        if artifact.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'"{path}" is not a model artifact')
+        header_length, = _LENGTH.unpack(artifact.read(_LENGTH.size))
+        header = json.loads(artifact.read(header_length).decode('utf-8'))
+    if header['format_version'] != FORMAT_VERSION:
+        raise ValueError(f'"{path}" has format version {header["format_version"]}, expected {FORMAT_VERSION}')
+    if header['kind'] != kind:
+        raise ValueError(f'"{path}" contains a {header["kind"]} model, expected {kind}')
+
+    data_start = len(MAGIC) + _LENGTH.size + header_length
+    if not header['arrays']:
+        return {}, header['metadata']
+    raw = np.memmap(path, dtype=np.uint8, mode='r', offset=data_start)
+    arrays = {}
+    for name, layout in header['arrays'].items():
+        dtype = np.dtype(layout['dtype'])
+        count = int(np.prod(layout['shape'], dtype=np.int64))
+        start = layout['offset']
+        arrays[name] = raw[start:start + count * dtype.itemsize].view(dtype).reshape(layout['shape'])
+    return arrays, header['metadata']
+
+
+def save_mlp(
+        path: Union[str, Path],
+        mlp: NumpyMLP,
+        training_code_hash: Optional[str] = None):
+    """Write a NumpyMLP to an artifact file.
+
+    :param path: The file to write.
+    :param mlp: The network to save.
+    :param training_code_hash: A hash identifying the code and parameters that trained the network."""
+    arrays = {}
+    for index, (coef, intercept) in enumerate(zip(mlp.coefs, mlp.intercepts)):
+        arrays[f'coef_{index}'] = coef
+        arrays[f'intercept_{index}'] = intercept
+    for name in ('input_offset', 'input_scale', 'output_scale'):
+        if getattr(mlp, name) is not None:
+            arrays[name] = getattr(mlp, name)
+    save_arrays(path, 'mlp', arrays, {
+        'layer_sizes': [mlp.n_features_in] + [coef.shape[1] for coef in mlp.coefs],
+        'activation': mlp.activation,
+        'out_activation': mlp.out_activation,
+        'training_code_hash': training_code_hash
+    })
+
+
+def load_mlp(
+        path: Union[str, Path],
+        dtype=None) -> NumpyMLP:
+    """Load a NumpyMLP from an artifact file.
+
+    :param path: The file to read.
+    :param dtype: The floating point type to evaluate the network in. If None, uses the type the
+        weights were saved in, so that the weights stay memory mapped rather than copied.
+    :returns: The network."""
+    arrays, metadata = load_arrays(path, 'mlp')
+    num_layers = len(metadata['layer_sizes']) - 1
+    coefs = [arrays[f'coef_{index}'] for index in range(num_layers)]
+    return NumpyMLP(
+        coefs=coefs,
+        intercepts=[arrays[f'intercept_{index}'] for index in range(num_layers)],
+        activation=metadata['activation'],
+        out_activation=metadata['out_activation'],
+        dtype=dtype or coefs[0].dtype,
+        input_offset=arrays.get('input_offset'),
+        input_scale=arrays.get('input_scale'),
+        output_scale=arrays.get('output_scale')
+    )
@@ -0,0 +1,209 @@
+import json
+import math
+from collections import namedtuple
+from pathlib import Path
+from typing import Mapping, Optional, Sequence
+
+import numpy as np
+
+from angle_unit import AngleUnit
+from homography_estimator import MODEL_CORNERS
+
+# A pose of the drone relative to the center of the landing pad.
+#   displacement: An array of shape (3,) containing the displacement of the drone from the target in drone-space,
+#       as returned by DisplacementEstimator.target_to_drone_space.
+#   yaw: The yaw of the drone relative to the target in radians, with the sign of
+#       DisplacementEstimator.estimate_rotation.
+#   error: The root mean square reprojection error of the corners in pixels.
+#   iterations: The number of iterations it took to find the pose.
+Pose = namedtuple('Pose', ['displacement', 'yaw', 'error', 'iterations'])
+
+
+class PoseRefiner:
+    """The PoseRefiner class tracks the pose of the drone from frame to frame.
+
+    The codes of the landing pad are nested inside each other, so a single pose (x, y, z, yaw) explains
+    the corners of every code in a frame. This class finds that pose by minimizing the reprojection error
+    of the known corner geometry with Levenberg-Marquardt iterations.
+    See https://en.wikipedia.org/wiki/Levenberg%E2%80%93Marquardt_algorithm
+
+    While tracking, the previous frame's pose is the starting point, and one or two iterations are enough
+    to follow the drone, or none when the previous pose already explains the corners to within their noise.
+    When tracking is lost, the caller acquires it again from a cold estimate, such as the one made by the
+    DisplacementEstimator or the HomographyEstimator."""
+
+    def __init__(
+            self,
+            levels: Optional[Mapping] = None,
+            fov: float = 60,
+            units: AngleUnit = AngleUnit.DEGREES,
+            side_length: float = 1,
+            iterations: int = 2,
+            max_iterations: int = 20,
+            max_error: float = 3,
+            tolerance: float = 1,
+            damping: float = 1e-3):
+        """
+        :param levels: A dictionary-like object mapping from level names (e.g. "0") to scaling factors.
+        :param fov: The horizontal field of view. Units are specified by the units argument.
+        :param units: The units of the fov argument.
+        :param side_length: The side length in meters of a code whose scaling factor is 1.
+        :param iterations: The most iterations to run each frame while tracking.
+        :param max_iterations: The most iterations to run when acquiring a pose from a cold estimate.
+        :param max_error: The largest reprojection error in pixels that a pose may have. Above it, tracking is lost.
+        :param tolerance: The reprojection error in pixels below which a pose is not refined any further,
+            such as the noise of the corners. Frames where the drone barely moved then need no iterations.
+        :param damping: The initial Levenberg-Marquardt damping factor.
+        """
+        self.horizontal_fov = fov
+        if units == AngleUnit.DEGREES:
+            self.horizontal_fov = math.radians(fov)
+        if levels:
+            self.levels = levels
+        else:
+            levels_path = Path('../config/qr_sizes.json')
+            with open(levels_path, 'r') as levels_file:
+                self.levels = json.load(levels_file)
+        self.side_length = side_length
+        self.iterations = iterations
+        self.max_iterations = max_iterations
+        self.max_error = max_error
+        self.tolerance = tolerance
+        self.damping = damping
+        # As in the DisplacementEstimator, the image is projected on a screen 1 unit away from the camera.
+        self._virtual_width = 2 * math.tan(self.horizontal_fov / 2)
+        # The tracked parameters: the code's center on the camera's x and y axes, its depth, and its rotation
+        # in the image. These are the camera's own axes, which makes the projection and its derivatives simple.
+        self._parameters: Optional[np.ndarray] = None
+
+    @property
+    def tracking(self) -> bool:
+        """Whether there is a pose from a previous frame to start from."""
+        return self._parameters is not None
+
+    def reset(self):
+        """Lose tracking, so that the next pose has to be acquired from a cold estimate."""
+        self._parameters = None
+
+    def track(
+            self,
+            corners: np.ndarray,
+            levels: Sequence[str],
+            image_height: int,
+            image_width: int) -> Optional[Pose]:
+        """Refine the previous frame's pose with the codes of this frame.
+
+        :param corners: An array of shape (N, 4, 2) containing the corners of N detected QR codes,
+            in units of pixels, in the order reported by the recognizer.
+        :param levels: N strings containing the level of each QR code.
+        :param image_height: The height of the image in pixels.
+        :param image_width: The width of the image in pixels.
+        :returns: The refined pose, or None if there is no pose to start from or tracking was lost."""
+        if self._parameters is None:
+            return None
+        return self._fit(self._parameters, corners, levels, image_height, image_width, self.iterations)
+
+    def acquire(
+            self,
+            corners: np.ndarray,
+            levels: Sequence[str],
+            image_height: int,
+            image_width: int,
+            displacement: np.ndarray,
+            yaw: float) -> Optional[Pose]:
+        """Find the pose starting from a cold estimate, and start tracking it.
+
+        :param corners: An array of shape (N, 4, 2), as in track.
+        :param levels: N strings containing the level of each QR code.
+        :param image_height: The height of the image in pixels.
+        :param image_width: The width of the image in pixels.
+        :param displacement: The estimated displacement of the drone from the target in drone-space.
+        :param yaw: The estimated yaw of the drone relative to the target in radians.
+        :returns: The refined pose, or None if the estimate did not converge to a pose that explains the corners."""
+        displacement = np.asarray(displacement, dtype=float)
+        if not (np.isfinite(displacement).all() and math.isfinite(yaw)) or displacement[2] <= 0:
+            self._parameters = None
+            return None
+        # Undo the quarter turn of the drone-space convention, see HomographyEstimator.estimate_poses
+        parameters = np.array([-displacement[1], displacement[0], displacement[2], -yaw])
+        return self._fit(parameters, corners, levels, image_height, image_width, self.max_iterations)
+
+    def _fit(self, parameters, corners, levels, image_height, image_width, iterations) -> Optional[Pose]:
+        sizes = self.side_length * np.array([self.levels.get(level, math.nan) for level in levels], dtype=float)
+        known = np.isfinite(sizes)
+        if not known.any():
+            self._parameters = None
+            return None
+        # Work on the virtual screen, where the projection of a point is simply (x / z, y / z)
+        scale = self._virtual_width / image_width
+        corners = np.asarray(corners, dtype=float)[known]
+        observed = np.stack([
+            (corners[..., 0] - image_width / 2) * scale,
+            (corners[..., 1] - image_height / 2) * scale
+        ]).reshape(2, -1)
+        model = (MODEL_CORNERS[np.newaxis] * sizes[known, np.newaxis, np.newaxis]).reshape(-1, 2).T
+
+        residuals, jacobian = self._linearize(parameters, model, observed)
+        cost = residuals @ residuals
+        # The cost at which the RMS reprojection error is within tolerance
+        tolerable_cost = observed.shape[1] * (self.tolerance * scale) ** 2
+        damping = self.damping
+        iteration = 0
+        for iteration in range(1, iterations + 1):
+            if cost <= tolerable_cost:
+                iteration -= 1
+                break
+            hessian = jacobian.T @ jacobian
+            gradient = jacobian.T @ residuals
+            try:
+                step = np.linalg.solve(hessian + damping * np.diag(np.diag(hessian)), -gradient)
+            except np.linalg.LinAlgError:
+                break
+            candidate = parameters + step
+            if candidate[2] > 0:
+                candidate_residuals, candidate_jacobian = self._linearize(candidate, model, observed)
+                candidate_cost = candidate_residuals @ candidate_residuals
+            else:
+                candidate_cost = math.inf  # The target would be behind the camera
+            if candidate_cost < cost:
+                parameters, residuals, jacobian = candidate, candidate_residuals, candidate_jacobian
+                cost = candidate_cost
+                damping /= 10
+                if np.abs(step[:3]).max() < 1e-6 * parameters[2] and abs(step[3]) < 1e-6:
+                    break
+            else:
+                damping *= 10
+
+        error = math.sqrt(cost / observed.shape[1]) / scale
+        if not error <= self.max_error:
+            self._parameters = None
+            return None
+        self._parameters = parameters
+        center_x, center_y, depth, rotation = parameters
+        yaw = math.remainder(-rotation, 2 * math.pi)
+        return Pose(np.array([center_y, -center_x, depth]), yaw, error, iteration)
+
+    @staticmethod
+    def _linearize(parameters, model, observed):
+        """Get the residuals of the projected corners and their derivatives with respect to the parameters.
+
+        :param parameters: The parameters (center_x, center_y, depth, rotation).
+        :param model: An array of shape (2, M) containing the corners of every code in meters.
+        :param observed: An array of shape (2, M) containing the observed corners on the virtual screen.
+        :returns: The residuals, of shape (2M,), and the Jacobian, of shape (2M, 4)."""
+        center_x, center_y, depth, rotation = parameters
+        cos_rotation = math.cos(rotation)
+        sin_rotation = math.sin(rotation)
+        rotated_x = cos_rotation * model[0] - sin_rotation * model[1]
+        rotated_y = sin_rotation * model[0] + cos_rotation * model[1]
+        projected = np.stack([rotated_x + center_x, rotated_y + center_y]) / depth
+        residuals = (projected - observed).ravel()
+
+        m = model.shape[1]
+        jacobian = np.zeros((2, m, 4))
+        jacobian[0, :, 0] = 1 / depth
+        jacobian[1, :, 1] = 1 / depth
+        jacobian[:, :, 2] = -projected / depth
+        jacobian[0, :, 3] = -rotated_y / depth
+        jacobian[1, :, 3] = rotated_x / depth
+        return residuals, jacobian.reshape(2 * m, 4)
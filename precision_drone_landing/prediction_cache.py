@@ -0,0 +1,87 @@
+import threading
+from collections import namedtuple, OrderedDict
+
+import numpy as np
+
+# The statistics of a PredictionCache, like those of functools.lru_cache.
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class PredictionCache:
+    """Remembers the predictions of a regressor for recently seen hull angles.
+
+    While the drone hovers over the pad, the corners of the codes land on the same pixels frame after
+    frame, so the regressor is asked the same question over and over. This class quantizes each row of
+    hull angles and keeps the predictions in a least-recently-used cache. Rows that miss are predicted
+    in one batch.
+
+    Predictions are made for the quantized angles, so a row always gets the same answer whether or not
+    it was cached. The regressor's output does not depend on the level of the code, which only scales it
+    afterwards, so the level is not part of the key and every level shares the cache.
+
+    This class has the same `predict` method as the regressor, so it can be passed to a
+    DisplacementEstimator in place of one. It is safe to call from several threads."""
+
+    def __init__(
+            self,
+            regressor,
+            maxsize: int = 256,
+            step: float = 1e-5):
+        """
+        :param regressor: A regressor object providing the `regressor.predict` function.
+        :param maxsize: The number of predictions to remember.
+        :param step: The quantization step of the hull angles in radians.
+        """
+        self.regressor = regressor
+        self.maxsize = maxsize
+        self.step = step
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[bytes, np.ndarray]' = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def predict(self, X) -> np.ndarray:
+        """Get the regressor's predictions for some hull angles.
+
+        :param X: An array of shape (N, 5) containing hull angles.
+        :returns: An array of shape (N, 3)."""
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X[np.newaxis]
+        quantized = np.rint(X / self.step).astype(np.int64)
+        keys = [row.tobytes() for row in quantized]
+        results = [None] * len(keys)
+        missing = {}
+        with self._lock:
+            for index, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[index] = self._cache[key]
+                    self._hits += 1
+                else:
+                    missing.setdefault(key, []).append(index)
+                    self._misses += 1
+        if missing:
+            rows = [indices[0] for indices in missing.values()]
+            predictions = np.reshape(self.regressor.predict(quantized[rows] * self.step), (len(rows), -1))
+            with self._lock:
+                for (key, indices), prediction in zip(missing.items(), predictions):
+                    for index in indices:
+                        results[index] = prediction
+                    self._cache[key] = prediction
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+        return np.array(results)
+
+    def cache_info(self) -> CacheInfo:
+        """Get the hit and miss counts of the cache."""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize, len(self._cache))
+
+    def cache_clear(self):
+        """Forget every prediction and reset the statistics."""
+        with self._lock:
+            self._cache.clear()
+            self._hits = 0
+            self._misses = 0
@@ -4,7 +4,7 @@ from typing import Iterable, Sequence, List
 import cv2
 import numpy as np
 
-from pyzbar79.pyzbar.pyzbar import Decoded
+from detection import Detection
 from util import adjacent_pairs, calc_center
 
 
@@ -16,7 +16,7 @@ class PreviewOutput:
     def __init__(self):
         self.image = None
         self.output = None
-        self.qr_data: List[Decoded] = []
+        self.detections: List[Detection] = []
         self.estimated_distance = np.zeros(3)
         self.estimated_rotation = 0
 
@@ -32,9 +32,9 @@ class PreviewOutput:
         """Set the current image."""
         self.image = image
 
-    def set_qr_data(self, qr_data: Sequence[Decoded]):
-        """Set the current QR data."""
-        self.qr_data = qr_data
+    def set_detections(self, detections: Sequence[Detection]):
+        """Set the current QR detections."""
+        self.detections = detections
 
     def set_estimated_distance(self, estimated_distance: Sequence[Real]):
         """Set the current estimated distance."""
@@ -55,19 +55,20 @@ class PreviewOutput:
 
     def _highlight_qr_codes(self):
         """Draw lines around each QR code."""
-        for code in self.qr_data:
+        for detection in self.detections:
+            points = [tuple(point) for point in detection.corners.astype(int).tolist()]
             # Draw a line around the QR code hull
-            for p1, p2 in adjacent_pairs(code.points):
+            for p1, p2 in adjacent_pairs(points):
                 cv2.line(self.output, p1, p2, (255, 0, 0))
 
             # Draw a point in the apparent center of the code
-            center = calc_center(code.points)
+            center = calc_center(points)
             cv2.circle(self.output, (int(center.x), int(center.y)), 3, (255, 0, 0))
 
             # Label each vertex in the hull with a number.
             # If pyzbar returns consistent orderings, these should
             # never appear to change.
-            for index, point in enumerate(code.points, start=1):
+            for index, point in enumerate(points, start=1):
                 cv2.putText(
                     img=self.output,
                     text=str(index),
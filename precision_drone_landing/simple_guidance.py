@@ -4,8 +4,8 @@ import matplotlib.pyplot as plt
 import shapely.geometry as geometry
 
 from camera_input import CameraInput
+from detection import Detection
 from point_sorter import PointSorter
-from pyzbar79.pyzbar.pyzbar import Decoded
 
 
 class SimplePosition:
@@ -47,17 +47,14 @@ class SimplePosition:
         self.pointSorter = PointSorter()
         self.shapes = [None, None, None]
 
-    async def update_state(self, qrcodes: Iterable[Decoded]):
+    async def update_state(self, detections: Iterable[Detection]):
         """Update the object with new QR data
 
-        :param qrcodes: A list of decoded QR objects"""
-        for qrcode in qrcodes:
-            contents = qrcode.data.split(b',', 2)
-            layer = contents[1]
-            layer = int(layer)
-            if 0 <= layer <= 2:
-                shape = self.generate_shape(qrcode.points)
-                self.shapes[layer] = shape
+        :param detections: A list of parsed QR detections"""
+        for detection in detections:
+            if 0 <= detection.layer <= 2:
+                shape = self.generate_shape(detection.corners.tolist())
+                self.shapes[detection.layer] = shape
 
     def get_scale_and_offset(self, targetLayer: int):
         """
@@ -1,5 +1,7 @@
 """The body of the program. Seeks the target."""
 import asyncio
+import math
+import time
 from functools import partial
 from numbers import Real
 from typing import List
@@ -7,9 +9,16 @@ from typing import List
 import numpy as np
 
 from camera_input import CameraInput
-from config import HORIZONTAL_FIELD_OF_VIEW, TAKEOFF_HEIGHT, MAX_FRAMES_PER_SECOND, QR_SIZES
+from config import HORIZONTAL_FIELD_OF_VIEW, TAKEOFF_HEIGHT, QR_SIZES, FRAME_BUDGET, \
+    DECODE_BUDGET, PREVIEW_BUDGET, DISPLACEMENT_ENGINE, REFINE_POSE, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_STEP, \
+    CONTROL_RATE
+from degradation import DegradationPolicy
+from detection import Detection, DetectionParser
 from displacement_estimator import DisplacementEstimator
 from drone_control import DroneControl
+from homography_estimator import HomographyEstimator
+from lookup_estimator import LOOKUP_GRID, LookupGridEstimator
+from pose_refiner import PoseRefiner
 from preview_output import PreviewOutput
 from pyzbar79.pyzbar.pyzbar import Decoded
 from recognizer import Recognizer
@@ -25,11 +34,35 @@ class TargetFinder:
         self.handler = TargetHandler()
         self.camera_input = CameraInput()
         self.preview_output = PreviewOutput()
-        self.displacement_estimator = DisplacementEstimator()
+        if DISPLACEMENT_ENGINE == 'lookup':
+            lookup_grid = LookupGridEstimator.load(LOOKUP_GRID)
+            self.displacement_estimator = DisplacementEstimator(
+                regressor=lookup_grid,
+                cache_size=PREDICTION_CACHE_SIZE,
+                cache_step=PREDICTION_CACHE_STEP
+            )
+        else:
+            self.displacement_estimator = DisplacementEstimator(
+                cache_size=PREDICTION_CACHE_SIZE,
+                cache_step=PREDICTION_CACHE_STEP
+            )
         self.horizontal_field_of_view = HORIZONTAL_FIELD_OF_VIEW
+        self.homography_estimator = None
+        if DISPLACEMENT_ENGINE == 'homography':
+            self.homography_estimator = HomographyEstimator(levels=QR_SIZES, fov=self.horizontal_field_of_view)
+        self.pose_refiner = None
+        if REFINE_POSE:
+            self.pose_refiner = PoseRefiner(levels=QR_SIZES, fov=self.horizontal_field_of_view)
         self.drone_control = DroneControl(self.handler)
-        self.drone_control.startup_simulation(TAKEOFF_HEIGHT, MAX_FRAMES_PER_SECOND)
+        self.drone_control.startup_simulation(TAKEOFF_HEIGHT, CONTROL_RATE)
         self.simple_guidance = None
+        self.degradation = DegradationPolicy(
+            frame_budget=FRAME_BUDGET,
+            stage_budgets={'decode': DECODE_BUDGET, 'preview': PREVIEW_BUDGET}
+        )
+        self.previous_codes: List[Decoded] = []
+        self.detection_parser = DetectionParser(QR_SIZES)
+        self.frame_id = 0
 
     async def loop_body(self):
         """
@@ -37,88 +70,145 @@ class TargetFinder:
         This function handles the routing between all of the different modules.
         It also enables multi-threading, which allows for some heavy functions
         (such as image processing) to be offloaded onto different threads.
+
+        Each stage is timed, and the timings are passed to the degradation policy,
+        which decides how much optional work the next frame may do.
         """
         loop = asyncio.get_running_loop()
+        timings = {}
         with concurrent.futures.ThreadPoolExecutor() as pool:
+            stage_start = time.perf_counter()
             frame = await loop.run_in_executor(pool, self.camera_input.get_frame)
+            capture_time = time.time()
+            timings['capture'] = time.perf_counter() - stage_start
             if frame is None:
                 return
-            width, height, _ = frame.shape
+            height, width, _ = frame.shape
             if not self.simple_guidance:
                 self.simple_guidance = SimplePosition(width, height, self.camera_input)
             self.drone_control.init_simple_position(self.simple_guidance)
             self.preview_output.set_image(frame)
-            qr_codes: List[Decoded] = await loop.run_in_executor(pool, partial(self.recognizer.recognize, image=frame))
-            await self.simple_guidance.update_state(qr_codes)
-            self.preview_output.set_qr_data(qr_codes)
-            hull_angle_coroutines = [
-                loop.run_in_executor(
-                    None,
-                    partial(
-                        self.displacement_estimator.get_hull_angles,
-                        hull=qr_code.points,
+            stage_start = time.perf_counter()
+            if self.degradation.reduced_decode:
+                recognize = partial(self.recognizer.recognize_reduced, image=frame, previous_codes=self.previous_codes)
+            else:
+                recognize = partial(self.recognizer.recognize, image=frame)
+            qr_codes: List[Decoded] = await loop.run_in_executor(pool, recognize)
+            self.previous_codes = qr_codes
+            timings['decode'] = time.perf_counter() - stage_start
+            stage_start = time.perf_counter()
+            self.frame_id += 1
+            detections = self.detection_parser.parse(qr_codes, self.frame_id)
+            await self.simple_guidance.update_state(detections)
+            self.preview_output.set_detections(detections)
+            corners = np.array([detection.corners for detection in detections]).reshape(-1, 4, 2)
+            levels = [str(detection.layer) for detection in detections]
+            pose = None
+            if self.pose_refiner is not None:
+                pose = self.pose_refiner.track(corners, levels, height, width)
+            if pose is None:
+                displacement_estimates, rotation_estimate = self.estimate_cold(corners, levels, height, width)
+                if self.pose_refiner is not None and len(displacement_estimates):
+                    pose = self.pose_refiner.acquire(
+                        corners=corners,
+                        levels=levels,
                         image_height=height,
-                        image_width=width
-                    )
-                )
-                for qr_code in qr_codes
-            ]
-            hull_angles_list = await asyncio.gather(*hull_angle_coroutines)
-            displacement_estimate_coroutines = [
-                loop.run_in_executor(
-                    pool,
-                    partial(
-                        self.displacement_estimator.estimate_displacement,
-                        hull_angles=hull_angles,
-                        level=qr_code.data.decode('utf-8').split(',')[-1]
+                        image_width=width,
+                        displacement=self.displacement_estimator.target_to_drone_space(
+                            vector=np.nanmean(displacement_estimates, axis=0),
+                            rotation=rotation_estimate
+                        ),
+                        yaw=rotation_estimate
                     )
-                )
-                for hull_angles, qr_code in zip(hull_angles_list, qr_codes)
-            ]
-            displacement_estimates = await asyncio.gather(*displacement_estimate_coroutines)
             targets = [None, None, None]
-            if displacement_estimates:
-                rotation_estimate = self.displacement_estimator.estimate_rotation(qr_codes[0].points)
-                average_displacement = np.mean(displacement_estimates, axis=0)
+            if pose is not None:
+                # Every code is explained by the same pose, so every layer gets the refined position
+                rotation_estimate = pose.yaw
+                self.preview_output.set_estimated_distance(
+                    self.displacement_estimator.target_to_drone_space(pose.displacement, -pose.yaw)
+                )
+                for detection in detections:
+                    target = self.process_code(detection, *pose.displacement)
+                    targets[target.getLayer()] = target
+            elif len(displacement_estimates):
+                average_displacement = np.nanmean(displacement_estimates, axis=0)
                 self.preview_output.set_estimated_distance(average_displacement)
-                for code, displacement in zip(qr_codes, displacement_estimates):
-                    drone_space_displacement = self.displacement_estimator.target_to_drone_space(
-                        vector=displacement,
-                        rotation=rotation_estimate
-                    )
-                    target = self.process_code(code.data, *drone_space_displacement)
-                    if target is not None:
-                        properties = target.getLayer()
-                        targets[properties] = target
+                drone_space_displacements = self.displacement_estimator.targets_to_drone_space(
+                    vectors=displacement_estimates,
+                    rotations=rotation_estimate
+                )
+                for detection, displacement in zip(detections, drone_space_displacements):
+                    if np.isnan(displacement).any():
+                        continue  # The hull was degenerate
+                    target = self.process_code(detection, *displacement)
+                    targets[target.getLayer()] = target
             else:
-                rotation_estimate = 0
-                print('No codes found')
+                if not self.degradation.reduced_logging:
+                    print('No codes found')
                 self.preview_output.set_estimated_distance(np.zeros(3))
-            self.handler.update(targets)
-            self.preview_output.set_estimated_rotation(rotation_estimate)
-            self.preview_output.prepare_output()
-            self.preview_output.display_image()
-            await self.drone_control.update_velocity()
+            # Publishing the snapshot wakes the control loop, see DroneControl.run
+            self.handler.update(targets, frame_id=self.frame_id, timestamp=capture_time)
+            timings['estimate'] = time.perf_counter() - stage_start
+            if self.degradation.preview_enabled:
+                stage_start = time.perf_counter()
+                self.preview_output.set_estimated_rotation(rotation_estimate)
+                self.preview_output.prepare_output()
+                self.preview_output.display_image()
+                timings['preview'] = time.perf_counter() - stage_start
+        self.degradation.update(timings)
+        cache_info = self.displacement_estimator.cache_info()
+        if cache_info and self.frame_id % 150 == 0 and not self.degradation.reduced_logging:
+            print(f'Prediction cache: {cache_info.hits} hits, {cache_info.misses} misses, '
+                  f'{cache_info.currsize}/{cache_info.maxsize} entries')
+        control_timing = self.drone_control.timing()
+        if control_timing and self.frame_id % 150 == 0 and not self.degradation.reduced_logging:
+            print(f'Control loop: {control_timing.ticks} updates, {control_timing.overruns} overruns, '
+                  f'period {1000 * control_timing.mean_period:.1f} ms mean, '
+                  f'{1000 * control_timing.p95_period:.1f} ms p95, {1000 * control_timing.max_period:.1f} ms max, '
+                  f'update {1000 * control_timing.mean_update:.1f} ms mean, '
+                  f'frame age {1000 * control_timing.mean_age:.1f} ms mean')
+        self.drone_control.set_log_stride(5 if self.degradation.reduced_logging else 1)
+
+    def estimate_cold(
+            self,
+            corners: np.ndarray,
+            levels: List[str],
+            image_height: int,
+            image_width: int):
+        """
+        Estimate the displacement to every code of a frame from scratch, with the configured engine.
+        Returns the target-space displacements and the estimated rotation of the drone.
+        """
+        if self.homography_estimator is not None:
+            displacement_estimates, yaws = self.homography_estimator.estimate_poses(
+                corners=corners,
+                levels=levels,
+                image_height=image_height,
+                image_width=image_width
+            )
+            rotation_estimate = math.atan2(np.nanmean(np.sin(yaws)), np.nanmean(np.cos(yaws))) if len(yaws) else 0
+        else:
+            hull_angles = self.displacement_estimator.get_hull_angles_batch(
+                corners=corners,
+                image_height=image_height,
+                image_width=image_width
+            )
+            displacement_estimates = self.displacement_estimator.estimate_displacements(
+                hull_angles=hull_angles,
+                levels=levels
+            )
+            rotation_estimate, _ = self.displacement_estimator.estimate_rotation_batch(corners)
+        return displacement_estimates, rotation_estimate
 
     @staticmethod
     def process_code(
-            data: bytes,
+            detection: Detection,
             X: Real,
             Y: Real,
             Z: Real):
         """
-        This function takes input from the zbar and distance estimation algorithms.
+        This function takes input from the detection parser and distance estimation algorithms.
         It creates a new LandingZone object that contains the position estimation data,
-        enumerates the layer the code comes from, and stores the contents of the
-        code message.
+        the layer the code comes from, and the contents of the code message.
         """
-        try:
-            code, layer = data.split(b',', 2)
-            code = code.decode('utf-8')
-            layer = layer.decode('utf-8')
-        except IndexError:
-            return None
-
-        if layer in QR_SIZES.keys():
-            return LandingZone(int(layer), code, X, Y, Z)
-        return None
+        return LandingZone(detection.layer, detection.code, X, Y, Z)
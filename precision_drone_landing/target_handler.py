@@ -1,25 +1,23 @@
+import asyncio
 import threading
+import time
+from collections import namedtuple
+from typing import List, Optional
 
+# The targets found in one frame.
+#   frame_id: The number of the frame, which is greater for every new snapshot.
+#   timestamp: The time the frame was captured, as returned by time.time().
+#   targets: A tuple with the LandingZone of each layer, or None for the layers that were not seen.
+TargetSnapshot = namedtuple('TargetSnapshot', ['frame_id', 'timestamp', 'targets'])
 
-class LandingZone:
+
+class LandingZone(namedtuple('LandingZone', ['layer', 'code', 'x', 'y', 'z'])):
     """The LandingZone class contains data extracted from image recognition
     including the x,y,z distance estimations, the layer number, and the
     message embedded in the code. This is designed to store data
-    extracted from a single frame of capture. This class is also
-    thread-safe if multi-threading is implemented at a later date."""
-    X = None
-    Y = None
-    Z = None
-    Layer = None
-    Code = None
-
-    def __init__(self, layer, code, x, y, z):
-        self._lock = threading.Lock()
-        self._X = x
-        self._Y = y
-        self._Z = z
-        self._Layer = layer
-        self._Code = code
+    extracted from a single frame of capture. It is an immutable tuple,
+    so it can be shared between threads without a lock."""
+    __slots__ = ()
 
     def getPosition(self):
         """Return a position estimate.
@@ -27,9 +25,7 @@ class LandingZone:
         The estimate is a three-element tuple containing the (x,y,z)
         position estimation contained in this LandingZone object.
         """
-        with self._lock:
-            position = (self._X, self._Y, self._Z)
-        return position
+        return self.x, self.y, self.z
 
     def getLayer(self):
         """Return the layer that the position estimate was made from.
@@ -38,40 +34,96 @@ class LandingZone:
             0 = outer
             1 = middle
             2 = inner"""
-        with self._lock:
-            layer = self._Layer
-        return layer
+        return self.layer
 
     def print(self):
         """A debugging function to allow the LandingZone object to print debug output.
         """
-        with self._lock:
-            print("Layer:", self.Layer, "Code:", self.Code, "Position(", "X:", self.X, "Y:", self.Y, "Z:", self.Z, ")")
+        print("Layer:", self.layer, "Code:", self.code, "Position(", "X:", self.x, "Y:", self.y, "Z:", self.z, ")")
 
 
 class TargetHandler:
     """TargetHandler is designed to be a thread-safe accessor and
     repository for the most recent position data available,
     in the form of LandingZone objects. It stores up to three
-    of these, one for each layer in the landing pad."""
+    of these, one for each layer in the landing pad.
+
+    Each update is published as a TargetSnapshot stamped with a frame id
+    and the time the frame was captured. Consumers remember the last frame
+    id they saw, so that they only take in new snapshots, and coroutines
+    can wait for the next one instead of polling."""
     def __init__(self):
         self.__lock = threading.Lock()
-        self.__targets = [None, None, None]
+        self.__snapshot = TargetSnapshot(0, None, (None, None, None))
+        self.__waiters: List[asyncio.Future] = []
 
-    def update(self, newTargets):
+    def update(self, newTargets, frame_id: Optional[int] = None, timestamp: Optional[float] = None) -> TargetSnapshot:
         """Receive a batch of new LandingZone objects.
 
-        This replaces any previous ones."""
+        This replaces any previous ones, and wakes every coroutine waiting for a new snapshot.
+
+        :param newTargets: The LandingZone of each layer, or None for the layers that were not seen.
+        :param frame_id: The id of the frame the targets were found in. Defaults to one more than the last.
+        :param timestamp: The time the frame was captured. Defaults to now.
+        :returns: The new snapshot.
+        :raises ValueError: If frame_id is not greater than the id of the last snapshot."""
+        with self.__lock:
+            if frame_id is None:
+                frame_id = self.__snapshot.frame_id + 1
+            elif frame_id <= self.__snapshot.frame_id:
+                raise ValueError(f'Frame {frame_id} is not newer than frame {self.__snapshot.frame_id}')
+            snapshot = TargetSnapshot(frame_id, time.time() if timestamp is None else timestamp, tuple(newTargets))
+            self.__snapshot = snapshot
+            waiters, self.__waiters = self.__waiters, []
+        for waiter in waiters:
+            # Waiters may belong to the event loop of another thread
+            waiter.get_loop().call_soon_threadsafe(_resolve, waiter, snapshot)
+        return snapshot
+
+    def snapshot(self) -> TargetSnapshot:
+        """Return the latest snapshot."""
+        with self.__lock:
+            return self.__snapshot
+
+    def snapshot_after(self, frame_id: int) -> Optional[TargetSnapshot]:
+        """Return the latest snapshot if it is newer than a frame.
+
+        :param frame_id: The id of the last frame the caller has seen.
+        :returns: The latest snapshot, or None if there is none newer than frame_id."""
         with self.__lock:
-            self.__targets = newTargets
-        return
+            if self.__snapshot.frame_id > frame_id:
+                return self.__snapshot
+        return None
+
+    async def wait_for_snapshot(self, frame_id: int) -> TargetSnapshot:
+        """Wait until there is a snapshot newer than a frame.
+
+        Waiting can be given up by cancelling the caller, e.g. with asyncio.wait_for.
+
+        :param frame_id: The id of the last frame the caller has seen.
+        :returns: The latest snapshot, which is returned immediately if it is already newer than frame_id."""
+        with self.__lock:
+            if self.__snapshot.frame_id > frame_id:
+                return self.__snapshot
+            waiter = asyncio.get_running_loop().create_future()
+            self.__waiters.append(waiter)
+        try:
+            return await waiter
+        finally:
+            if waiter.cancelled():
+                # Otherwise every timeout would leave a future behind until the next update
+                with self.__lock:
+                    if waiter in self.__waiters:
+                        self.__waiters.remove(waiter)
 
     def get_target(self, index):
         """Return the LandingZone object with the specified index.
 
         Returns None otherwise."""
-        with self.__lock:
-            target = None
-            if self.__targets[index] is not None:
-                target = self.__targets[index]
-        return target
+        return self.snapshot().targets[index]
+
+
+def _resolve(waiter: asyncio.Future, snapshot: TargetSnapshot):
+    """Hand a snapshot to a waiting coroutine, unless it stopped waiting."""
+    if not waiter.done():
+        waiter.set_result(snapshot)
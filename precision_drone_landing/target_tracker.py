@@ -0,0 +1,143 @@
+import json
+from collections import namedtuple
+from pathlib import Path
+from typing import Mapping, Optional, Sequence
+
+import numpy as np
+
+from fusion import expected_error
+
+# The state of a KalmanTargetTracker at some time.
+#   position: An array of shape (3,) containing the drone-space displacement of the target.
+#   velocity: An array of shape (3,) containing the rate of change of the position in meters per second.
+#   std: An array of shape (3,) containing the standard deviation of each axis of the position.
+TrackedTarget = namedtuple('TrackedTarget', ['position', 'velocity', 'std'])
+
+
+class KalmanTargetTracker:
+    """The KalmanTargetTracker class fuses the position estimates of every layer into one track.
+
+    The state is the position and velocity of the target relative to the drone, which is assumed to
+    move at a constant velocity, changed only by random accelerations. Every estimate is weighted by how
+    accurate its layer is at the height it was made from, see fusion.expected_error.
+    See https://en.wikipedia.org/wiki/Kalman_filter
+
+    The state can be predicted at any time, so the drone can be steered between frames, and through
+    dropouts of up to max_prediction seconds without any estimate."""
+
+    def __init__(
+            self,
+            levels: Optional[Mapping] = None,
+            acceleration_noise: float = 0.1,
+            noise_floor: float = 0.02,
+            noise_scale: float = 0.03,
+            initial_speed: float = 1,
+            max_prediction: float = 1,
+            gate: float = 4,
+            max_rejections: int = 10):
+        """
+        :param levels: A dictionary-like object mapping from level names (e.g. "0") to scaling factors.
+        :param acceleration_noise: The spectral density of the random accelerations in m²/s³.
+        :param noise_floor: The error in meters of an estimate made from up close.
+        :param noise_scale: How fast the error of an estimate grows with the square of the height over
+            the size of the code.
+        :param initial_speed: The standard deviation of the velocity in m/s when a track starts.
+        :param max_prediction: The most seconds after the last estimate that the state can be predicted for.
+        :param gate: The largest Mahalanobis distance from the predicted position that an estimate may have.
+            Estimates further away are outliers and are left out.
+        :param max_rejections: The number of outliers in a row after which the track is assumed to be wrong,
+            and a new one is started.
+        """
+        if levels:
+            self.levels = levels
+        else:
+            levels_path = Path('../config/qr_sizes.json')
+            with open(levels_path, 'r') as levels_file:
+                self.levels = json.load(levels_file)
+        self.acceleration_noise = acceleration_noise
+        self.noise_floor = noise_floor
+        self.noise_scale = noise_scale
+        self.initial_speed = initial_speed
+        self.max_prediction = max_prediction
+        self.gate = gate
+        self.max_rejections = max_rejections
+        self._rejections = 0
+        self._state: Optional[np.ndarray] = None
+        self._covariance: Optional[np.ndarray] = None
+        self._time: Optional[float] = None
+
+    @property
+    def tracking(self) -> bool:
+        """Whether any estimate has been received since the track was last reset."""
+        return self._state is not None
+
+    def reset(self):
+        """Drop the track, so that the next estimate starts a new one."""
+        self._state = None
+        self._covariance = None
+        self._time = None
+        self._rejections = 0
+
+    def measurement_noise(self, layer, height: float) -> float:
+        """Get the expected error in meters of an estimate made from a layer at a height."""
+        return float(expected_error(self.levels[str(layer)], height, self.noise_floor, self.noise_scale))
+
+    def _predict(self, dt: float):
+        """Get the state and covariance predicted dt seconds after the last estimate."""
+        transition = np.eye(6)
+        transition[:3, 3:] = dt * np.eye(3)
+        # Random accelerations, integrated over dt into position and velocity
+        process_noise = self.acceleration_noise * np.block([
+            [dt ** 3 / 3 * np.eye(3), dt ** 2 / 2 * np.eye(3)],
+            [dt ** 2 / 2 * np.eye(3), dt * np.eye(3)]
+        ])
+        return transition @ self._state, transition @ self._covariance @ transition.T + process_noise
+
+    def update(self, position: Sequence[float], layer, timestamp: float) -> bool:
+        """Add a position estimate.
+
+        :param position: The x, y, z drone-space displacement estimated from one layer.
+        :param layer: The layer of the landing pad the estimate was made from.
+        :param timestamp: The time the estimate was made. Estimates older than the last one are treated
+            as if they were made at the same time. An estimate more than max_prediction seconds after
+            the last one starts a new track.
+        :returns: Whether the estimate was used, rather than left out as an outlier."""
+        position = np.asarray(position, dtype=float)
+        if self._state is not None and timestamp - self._time > self.max_prediction:
+            # The target has been lost for too long for the old velocity to mean anything
+            self.reset()
+        if self._state is None:
+            variance = self.measurement_noise(layer, abs(position[2])) ** 2
+            self._state = np.concatenate([position, np.zeros(3)])
+            self._covariance = np.diag([variance] * 3 + [self.initial_speed ** 2] * 3)
+            self._time = timestamp
+            return True
+        state, covariance = self._predict(max(0.0, timestamp - self._time))
+        # The noise is modeled at the predicted height rather than the estimated one. Otherwise estimates
+        # that are too low would be trusted more than those that are too high, and pull the track down.
+        variance = self.measurement_noise(layer, abs(state[2])) ** 2
+        innovation = position - state[:3]
+        innovation_covariance = covariance[:3, :3] + variance * np.eye(3)
+        if innovation @ np.linalg.solve(innovation_covariance, innovation) > self.gate ** 2:
+            self._rejections += 1
+            if self._rejections > self.max_rejections:
+                self.reset()
+                return self.update(position, layer, timestamp)
+            return False
+        self._rejections = 0
+        gain = np.linalg.solve(innovation_covariance, covariance[:3]).T
+        self._state = state + gain @ innovation
+        covariance = covariance - gain @ covariance[:3]
+        self._covariance = (covariance + covariance.T) / 2
+        self._time = max(self._time, timestamp)
+        return True
+
+    def predict(self, timestamp: float) -> Optional[TrackedTarget]:
+        """Get the state of the target at a time, without changing the track.
+
+        :returns: The predicted state, or None if there is no track or its last estimate is more than
+            max_prediction seconds before timestamp."""
+        if self._state is None or timestamp - self._time > self.max_prediction:
+            return None
+        state, covariance = self._predict(max(0.0, timestamp - self._time))
+        return TrackedTarget(state[:3], state[3:], np.sqrt(np.diag(covariance)[:3]))
@@ -0,0 +1,276 @@
+"""Summarize the landing accuracy and timing of many flights, to compare tuning changes.
+
+Each flight is a directory holding the logs the software writes to its working directory:
+Drone_Control_Log and, if present, Control_Timing_Log and Position_Estimate_Averages, as CSV or as
+binary logs. Flights are loaded in parallel, and for each one the script computes:
+
+- the time to land, from the first control command to the "Land" line,
+- the final error, the horizontal distance of the drone from where it took off when it landed, as
+  measured by get_absolute_position. In simulation the drone takes off from the pad.
+- the error of the position estimate against that truth, by mode and by altitude. The estimate is in
+  the drone's frame and the log does not record the heading, so the errors compared are those of the
+  height and of the horizontal distance to the pad, which do not depend on it. Lines without an
+  estimate, such as while circling, are left out. Older logs only have the vectors steered by, which
+  are the search pattern while circling and a height of 10 m while searching, so circling lines and
+  heights of exactly 10 m are left out of them.
+- the control loop rate, from the period of each iteration logged in Control_Timing_Log. Older flights only
+  have the times between control log lines, which read low when logging was reduced,
+- how often each layer of the pad had a position estimate.
+
+Run from the scripts directory:
+
+    python analyze_flight_logs.py ../flights/*
+    python analyze_flight_logs.py ../flights/* --compare flight_report.json --output flight_report_new.json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, '../precision_drone_landing')
+from log import BINARY_SUFFIX, read_binary_log  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='analyze_flight_logs.py'
+)
+arg_parser.add_argument('flights', nargs='+', help='The directories holding the logs of each flight')
+arg_parser.add_argument(
+    '--altitudes',
+    type=float,
+    nargs='+',
+    default=[0, 0.5, 1, 2, 4, 8, 12],
+    help='The edges of the altitude bins in meters'
+)
+arg_parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='The number of flights to load at once')
+arg_parser.add_argument('--per-flight', action='store_true', help='Print a line for every flight')
+arg_parser.add_argument('-o', '--output', default='flight_report.json', help='The file to write the report to')
+arg_parser.add_argument('--compare', help='A previous report to compare the results with')
+
+
+def load_log(directory, name):
+    """Read a log of a flight, whichever format it was written in.
+
+    :returns: The names of the columns and an array of each column, with numbers as floats (NaN where
+        the line had no number) and text as strings, or None if the flight has no such log."""
+    binary_path = Path(directory) / f'{name}{BINARY_SUFFIX}'
+    if binary_path.exists():
+        names, columns = read_binary_log(binary_path)
+        return names, [column.astype(str) if column.dtype.kind == 'S' else column.astype(float)
+                       for column in columns]
+    csv_path = Path(directory) / f'{name}.csv'
+    if not csv_path.exists():
+        return None
+    with open(csv_path, 'r', newline='') as log_file:
+        names, *rows = list(csv.reader(log_file))
+    text = np.array(rows, dtype=str).reshape(len(rows), len(names))
+    columns = []
+    for values in text.T:
+        missing = np.isin(values, ['', 'N/A', 'None'])
+        numbers = np.full(len(values), np.nan)
+        try:
+            numbers[~missing] = values[~missing].astype(float)
+            columns.append(numbers)
+        except ValueError:
+            columns.append(values)
+    return names, columns
+
+
+def analyze_flight(directory, altitude_edges):
+    """Compute the statistics of one flight.
+
+    :returns: A dictionary of per-flight statistics, and under 'samples' the per-line errors that the
+        summary of every flight is computed from, or None if the flight has no control log."""
+    control_log = load_log(directory, 'Drone_Control_Log')
+    if control_log is None:
+        return None
+    log = dict(zip(*control_log))
+    times, modes = log['Time'], log['Mode']
+    if 'Z Estimate' in log:
+        estimate = np.stack([log['X Estimate'], log['Y Estimate'], log['Z Estimate']], axis=1)
+    else:
+        estimate = np.stack([log['X Relative Distance'], log['Y Relative Distance'], log['Z Relative distance']],
+                            axis=1)
+        estimate[modes == 'Circle'] = np.nan
+        estimate[estimate[:, 2] == 10, 2] = np.nan
+    # get_absolute_position returns the east, north and down distances from where the drone took off
+    truth = np.stack([log['X Absolute Variance'], log['Y Absolute Variance'], -log['Z Absolute Variance']], axis=1)
+    flying = modes != 'Wait'
+    landed = modes == 'Land'
+    final = np.flatnonzero(landed)[-1] if landed.any() else len(modes) - 1
+    start = times[np.argmax(flying)] if flying.any() else np.nan
+
+    commands = flying & ~landed
+    timing_log = load_log(directory, 'Control_Timing_Log')
+    if timing_log is not None:
+        timing = dict(zip(*timing_log))
+        periods = timing['Period'][~np.isnan(timing['Period'])]
+    else:
+        periods = np.diff(times[commands])
+    statistics = {
+        'flight': str(directory),
+        'landed': bool(landed.any()),
+        'time_to_land': float(times[final] - start) if landed.any() else None,
+        'final_error': float(np.hypot(*truth[final, :2])),
+        'lines': int(len(times)),
+        'loop_rate': float(1 / np.median(periods)) if len(periods) else None,
+        'p95_period': float(np.percentile(periods, 95)) if len(periods) else None,
+        'max_period': float(periods.max()) if len(periods) else None
+    }
+
+    estimated = commands & ~np.isnan(estimate[:, :2]).any(axis=1)
+    statistics['samples'] = {
+        'mode': modes[estimated],
+        'altitude': truth[estimated, 2],
+        # NaN where only the height of an older log was overwritten
+        'height_error': estimate[estimated, 2] - truth[estimated, 2],
+        'range_error': np.hypot(*estimate[estimated, :2].T) - np.hypot(*truth[estimated, :2].T)
+    }
+    statistics['altitude_bins'] = summarize_bins(statistics['samples'], altitude_edges)
+
+    averages_log = load_log(directory, 'Position_Estimate_Averages')
+    if averages_log is not None:
+        # The columns are the level and its X, Y and Z, for each level in turn
+        _, columns = averages_log
+        statistics['layer_coverage'] = [float(np.mean(~np.isnan(columns[4 * level + 1]))) for level in range(3)]
+    return statistics
+
+
+def summarize_errors(samples, selected):
+    """Get error statistics for the selected samples."""
+    height_error = np.abs(samples['height_error'][selected])
+    height_error = height_error[~np.isnan(height_error)]
+    range_error = np.abs(samples['range_error'][selected])
+    if len(range_error) == 0 or len(height_error) == 0:
+        return {'lines': 0}
+    return {
+        'lines': int(len(range_error)),
+        'median_height_error': float(np.median(height_error)),
+        'p95_height_error': float(np.percentile(height_error, 95)),
+        'median_range_error': float(np.median(range_error)),
+        'p95_range_error': float(np.percentile(range_error, 95))
+    }
+
+
+def summarize_bins(samples, edges):
+    """Summarize the errors of the samples whose altitude falls in each bin."""
+    bins = []
+    for lower, upper in zip(edges[:-1], edges[1:]):
+        selected = (samples['altitude'] >= lower) & (samples['altitude'] < upper)
+        bins.append({'lower': lower, 'upper': upper, **summarize_errors(samples, selected)})
+    return bins
+
+
+def describe(values):
+    """Get the median, 95th percentile and maximum of some values, leaving out missing ones."""
+    values = np.array([value for value in values if value is not None], dtype=float)
+    if len(values) == 0:
+        return None
+    return {
+        'median': float(np.median(values)),
+        'p95': float(np.percentile(values, 95)),
+        'max': float(values.max())
+    }
+
+
+def summarize_flights(flights, altitude_edges):
+    """Combine the statistics of every flight."""
+    samples = {
+        name: np.concatenate([flight['samples'][name] for flight in flights])
+        for name in ('mode', 'altitude', 'height_error', 'range_error')
+    }
+    coverage = [flight['layer_coverage'] for flight in flights if 'layer_coverage' in flight]
+    return {
+        'flights': len(flights),
+        'landed': float(np.mean([flight['landed'] for flight in flights])),
+        'time_to_land': describe(flight['time_to_land'] for flight in flights),
+        'final_error': describe(flight['final_error'] for flight in flights if flight['landed']),
+        'loop_rate': describe(flight['loop_rate'] for flight in flights),
+        'max_period': describe(flight['max_period'] for flight in flights),
+        'layer_coverage': np.mean(coverage, axis=0).tolist() if coverage else None,
+        'overall': summarize_errors(samples, np.ones(len(samples['mode']), dtype=bool)),
+        'modes': {str(mode): summarize_errors(samples, samples['mode'] == mode) for mode in np.unique(samples['mode'])},
+        'altitude_bins': summarize_bins(samples, altitude_edges)
+    }
+
+
+def format_change(current, previous, key):
+    if not previous or previous.get(key) is None or current.get(key) is None:
+        return ''
+    return f' ({current[key] - previous[key]:+.3f})'
+
+
+def print_summary(summary, previous=None):
+    previous = previous or {}
+    print(f'Flights: {summary["flights"]}, landed: {100 * summary["landed"]:.1f}%'
+          + (f' ({100 * (summary["landed"] - previous["landed"]):+.1f} pp)' if 'landed' in previous else ''))
+    for name, unit in [('time_to_land', 's'), ('final_error', 'm'), ('loop_rate', 'Hz'), ('max_period', 's')]:
+        if summary[name]:
+            print(f'{name.replace("_", " "):>14}: median {summary[name]["median"]:.3f} {unit}'
+                  f'{format_change(summary[name], previous.get(name), "median")}, '
+                  f'p95 {summary[name]["p95"]:.3f} {unit}, max {summary[name]["max"]:.3f} {unit}')
+    if summary['layer_coverage']:
+        print('Layer coverage: ' + ', '.join(f'{100 * coverage:.1f}%' for coverage in summary['layer_coverage']))
+
+    print(f'{"":>14}{"lines":>8}{"height m":>10}{"p95":>8}{"range m":>10}{"p95":>8}')
+    rows = [('overall', summary['overall'], previous.get('overall'))]
+    rows += [(mode, errors, previous.get('modes', {}).get(mode)) for mode, errors in summary['modes'].items()]
+    previous_bins = previous.get('altitude_bins') or [None] * len(summary['altitude_bins'])
+    rows += [
+        (f'{altitude_bin["lower"]:g}-{altitude_bin["upper"]:g} m', altitude_bin, previous_bin)
+        for altitude_bin, previous_bin in zip(summary['altitude_bins'], previous_bins)
+    ]
+    for name, errors, previous_errors in rows:
+        line = f'{name:>14}{errors["lines"]:>8}'
+        if errors['lines']:
+            line += (
+                f'{errors["median_height_error"]:10.3f}{errors["p95_height_error"]:8.3f}'
+                f'{errors["median_range_error"]:10.3f}{errors["p95_range_error"]:8.3f}'
+                f'{format_change(errors, previous_errors, "median_height_error")}'
+                f'{format_change(errors, previous_errors, "median_range_error")}'
+            )
+        print(line)
+
+
+def main():
+    args = arg_parser.parse_args()
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        results = list(pool.map(partial(analyze_flight, altitude_edges=args.altitudes), args.flights))
+    flights = [flight for flight in results if flight is not None]
+    for directory, flight in zip(args.flights, results):
+        if flight is None:
+            print(f'ALERT: No Drone_Control_Log in "{directory}"')
+    if not flights:
+        return
+
+    if args.per_flight:
+        print(f'{"flight":<40}{"landed":>7}{"time s":>9}{"error m":>9}{"rate Hz":>9}')
+        for flight in flights:
+            print(
+                f'{flight["flight"][-40:]:<40}{"yes" if flight["landed"] else "no":>7}'
+                f'{flight["time_to_land"] or float("nan"):9.2f}{flight["final_error"]:9.3f}'
+                f'{flight["loop_rate"] or float("nan"):9.2f}'
+            )
+
+    summary = summarize_flights(flights, args.altitudes)
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r') as previous_file:
+            previous = json.load(previous_file)['summary']
+        print(f'Comparing with "{args.compare}"')
+    print_summary(summary, previous)
+
+    for flight in flights:
+        del flight['samples']
+    with open(args.output, 'w') as report_file:
+        json.dump({'altitudes': args.altitudes, 'summary': summary, 'flights': flights}, report_file, indent=2)
+    print(f'Report written to "{args.output}"')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""Measure the accuracy and latency of the DisplacementEstimator across the flight envelope.
+
+Ground-truth poses are drawn across the x/y/z range, the pad's codes are projected into a virtual camera
+with the configured HORIZONTAL_FIELD_OF_VIEW, and the codes visible in each frame go through the same
+calls TargetFinder makes with the regressor: get_hull_angles_batch, estimate_displacements,
+estimate_rotation_batch and targets_to_drone_space. The errors of each code and the latency of the frame
+it was in are reported per altitude bin, per offset bin and per bin of both, and saved as JSON so that runs
+of different versions can be compared. Run from the scripts directory:
+
+    python benchmark_envelope.py
+    python benchmark_envelope.py --compare envelope_report.json --output envelope_new.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from virtual_camera import VirtualCamera
+
+sys.path.insert(0, '../precision_drone_landing')
+from config import HORIZONTAL_FIELD_OF_VIEW, QR_SIZES  # noqa: E402
+from displacement_estimator import DisplacementEstimator  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='benchmark_envelope.py'
+)
+arg_parser.add_argument('-n', '--samples', type=int, default=5000, help='The number of poses per altitude bin')
+arg_parser.add_argument(
+    '--altitudes',
+    type=float,
+    nargs='+',
+    default=[0.5, 1, 2, 4, 8, 12, 16, 20],
+    help='The edges of the altitude bins in meters'
+)
+arg_parser.add_argument(
+    '--offsets',
+    type=float,
+    nargs='+',
+    default=[0, 0.1, 0.2, 0.3, 0.4, 0.6],
+    help='The edges of the offset bins, as horizontal distance over altitude'
+)
+arg_parser.add_argument('--width', type=int, default=640, help='The image width in pixels')
+arg_parser.add_argument('--height', type=int, default=480, help='The image height in pixels')
+arg_parser.add_argument('--max-yaw', type=float, default=np.pi, help='The largest yaw in radians to test')
+arg_parser.add_argument('--pixel-noise', type=float, default=0.5, help='The corner noise in pixels')
+arg_parser.add_argument('--seed', type=int, default=0, help='The seed of the poses')
+arg_parser.add_argument('-o', '--output', default='envelope_report.json', help='The file to write the report to')
+arg_parser.add_argument('--compare', help='A previous report to compare the results with')
+
+
+def sample_poses(n, altitude_range, max_offset, max_yaw, rng):
+    """Draw drone-space displacements and yaws within an altitude bin.
+
+    :returns: A tuple of an array of shape (n, 3) and an array of shape (n,)."""
+    altitude = rng.uniform(*altitude_range, n)
+    # Uniform over a disc, so every offset bin gets a fair share of samples
+    radius = max_offset * altitude * np.sqrt(rng.uniform(0, 1, n))
+    direction = rng.uniform(-np.pi, np.pi, n)
+    displacements = np.stack([radius * np.cos(direction), radius * np.sin(direction), altitude], axis=1)
+    return displacements, rng.uniform(-max_yaw, max_yaw, n)
+
+
+def run_frame(estimator, corners, levels, camera):
+    """Estimate the drone-space displacement from every code of a frame, the way TargetFinder.estimate_cold does.
+
+    :returns: A tuple of an array of shape (N, 3) of displacements and the time the calls took in seconds."""
+    start = time.perf_counter()
+    hull_angles = estimator.get_hull_angles_batch(corners, camera.image_height, camera.image_width)
+    displacements = estimator.estimate_displacements(hull_angles, levels)
+    rotation, _ = estimator.estimate_rotation_batch(corners)
+    drone_space_displacements = estimator.targets_to_drone_space(displacements, rotation)
+    return drone_space_displacements, time.perf_counter() - start
+
+
+def summarize(errors, relative_errors, latencies):
+    """Get error and latency statistics for one bin."""
+    if len(errors) == 0:
+        return {'codes': 0}
+    return {
+        'codes': len(errors),
+        'mean_error': float(np.mean(errors)),
+        'median_error': float(np.median(errors)),
+        'p95_error': float(np.percentile(errors, 95)),
+        'median_relative_error': float(np.median(relative_errors)),
+        # The latencies are of the frames the codes were in
+        'mean_latency_us': float(np.mean(latencies) * 1e6),
+        'p95_latency_us': float(np.percentile(latencies, 95) * 1e6)
+    }
+
+
+def bin_results(values, edges, errors, relative_errors, latencies):
+    """Summarize the results whose values fall in each bin."""
+    bins = []
+    for lower, upper in zip(edges[:-1], edges[1:]):
+        selected = (values >= lower) & (values < upper)
+        bins.append({
+            'lower': lower,
+            'upper': upper,
+            **summarize(errors[selected], relative_errors[selected], latencies[selected])
+        })
+    return bins
+
+
+def joint_bin_results(altitudes, offsets, altitude_edges, offset_edges, errors, relative_errors, latencies):
+    """Summarize the results in each offset bin of each altitude bin."""
+    bins = []
+    for lower, upper in zip(altitude_edges[:-1], altitude_edges[1:]):
+        selected = (altitudes >= lower) & (altitudes < upper)
+        bins.append({
+            'lower': lower,
+            'upper': upper,
+            'offset_bins': bin_results(
+                offsets[selected], offset_edges, errors[selected], relative_errors[selected], latencies[selected]
+            )
+        })
+    return bins
+
+
+def git_revision():
+    """Get the commit the benchmark ran on, if it can be found."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(name, bins, previous_bins=None):
+    print(f'{name:>14}{"codes":>8}{"median m":>10}{"p95 m":>10}{"median %":>10}{"us/frame":>10}')
+    previous_bins = previous_bins or [{}] * len(bins)
+    for current, previous in zip(bins, previous_bins):
+        line = f'{current["lower"]:6.2f} - {current["upper"]:5.2f}{current["codes"]:>8}'
+        if current['codes']:
+            line += (
+                f'{current["median_error"]:10.4f}{current["p95_error"]:10.4f}'
+                f'{100 * current["median_relative_error"]:10.2f}{current["mean_latency_us"]:10.1f}'
+            )
+            if previous.get('codes'):
+                line += (
+                    f'   ({100 * (current["median_relative_error"] - previous["median_relative_error"]):+.2f} pp, '
+                    f'{current["mean_latency_us"] - previous["mean_latency_us"]:+.1f} us)'
+                )
+        print(line)
+
+
+def print_joint_table(bins, offset_edges):
+    """Print the median relative error in percent of each offset bin of each altitude bin."""
+    print(f'{"altitude m":>14}' + ''.join(f'{f"{lower:g}-{upper:g}":>10}'
+                                          for lower, upper in zip(offset_edges[:-1], offset_edges[1:])))
+    for altitude_bin in bins:
+        print(f'{altitude_bin["lower"]:6.2f} - {altitude_bin["upper"]:5.2f}' + ''.join(
+            f'{100 * offset_bin["median_relative_error"]:10.2f}' if offset_bin['codes'] else f'{"":>10}'
+            for offset_bin in altitude_bin['offset_bins']
+        ))
+
+
+def main():
+    args = arg_parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    camera = VirtualCamera(HORIZONTAL_FIELD_OF_VIEW, args.width, args.height)
+    estimator = DisplacementEstimator(fov=HORIZONTAL_FIELD_OF_VIEW)
+    sizes = np.array(list(QR_SIZES.values()))
+
+    levels = list(QR_SIZES)
+    altitudes, offsets, errors, relative_errors, latencies = [], [], [], [], []
+    for altitude_range in zip(args.altitudes[:-1], args.altitudes[1:]):
+        displacements, yaws = sample_poses(args.samples, altitude_range, args.offsets[-1], args.max_yaw, rng)
+        # Every level of the pad in every frame, of shape (levels, frames, 4, 2)
+        corners = np.stack([
+            camera.project(displacements, np.full(len(displacements), QR_SIZES[level]), yaws, args.pixel_noise, rng)
+            for level in levels
+        ])
+        visible = np.stack([camera.visible(level_corners) for level_corners in corners])
+        for frame, truth in enumerate(displacements):
+            if not visible[:, frame].any():
+                continue
+            frame_levels = [level for level, seen in zip(levels, visible[:, frame]) if seen]
+            estimates, seconds = run_frame(estimator, corners[visible[:, frame], frame], frame_levels, camera)
+            for estimate in estimates:
+                error = np.linalg.norm(estimate - truth)
+                errors.append(error)
+                relative_errors.append(error / np.linalg.norm(truth))
+                latencies.append(seconds)
+                altitudes.append(truth[2])
+                offsets.append(np.hypot(truth[0], truth[1]) / truth[2])
+    errors, relative_errors, latencies = np.array(errors), np.array(relative_errors), np.array(latencies)
+    altitudes, offsets = np.array(altitudes), np.array(offsets)
+    report = {
+        'revision': git_revision(),
+        'fov': HORIZONTAL_FIELD_OF_VIEW,
+        'image_size': [args.width, args.height],
+        'levels': {level: float(size) for level, size in zip(QR_SIZES, sizes)},
+        'pixel_noise': args.pixel_noise,
+        'max_yaw': args.max_yaw,
+        'seed': args.seed,
+        'overall': summarize(errors, relative_errors, latencies),
+        'altitude_bins': bin_results(altitudes, args.altitudes, errors, relative_errors, latencies),
+        'offset_bins': bin_results(offsets, args.offsets, errors, relative_errors, latencies),
+        'joint_bins': joint_bin_results(
+            altitudes, offsets, args.altitudes, args.offsets, errors, relative_errors, latencies
+        )
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r') as previous_file:
+            previous = json.load(previous_file)
+        print(f'Comparing with "{args.compare}" (revision {previous.get("revision")})')
+    print_table('altitude m', report['altitude_bins'], previous and previous['altitude_bins'])
+    print_table('offset', report['offset_bins'], previous and previous['offset_bins'])
+    print('Median error % by altitude and offset')
+    print_joint_table(report['joint_bins'], args.offsets)
+    with open(args.output, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f'Report written to "{args.output}"')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Compare the latency and accuracy of the displacement estimation engines.
+
+Poses are drawn from the same volume that generate_displacement_model.py trains the regressor on,
+projected into a virtual camera, and passed to each engine. Run from the scripts directory:
+
+    python benchmark_estimators.py
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+from generate_displacement_model import sample_displacements, xyz_range
+from virtual_camera import VirtualCamera
+
+sys.path.insert(0, '../precision_drone_landing')
+from config import HORIZONTAL_FIELD_OF_VIEW, QR_SIZES  # noqa: E402
+from displacement_estimator import DisplacementEstimator  # noqa: E402
+from homography_estimator import HomographyEstimator  # noqa: E402
+from lookup_estimator import LookupGridEstimator  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='benchmark_estimators.py'
+)
+arg_parser.add_argument('-n', '--samples', type=int, default=20000, help='The number of poses per level')
+arg_parser.add_argument('--width', type=int, default=640, help='The image width in pixels')
+arg_parser.add_argument('--height', type=int, default=480, help='The image height in pixels')
+arg_parser.add_argument('--max-yaw', type=float, default=0.0, help='The largest yaw in radians to test')
+arg_parser.add_argument('--pixel-noise', type=float, default=0.0, help='The corner noise in pixels')
+arg_parser.add_argument('--repeat', type=int, default=2000, help='The number of frames to time')
+arg_parser.add_argument(
+    '--lookup-grid',
+    default='../assets/displacement_detection_models/lookup_grid.lut',
+    help='The lookup grid to benchmark, if it exists. See build_lookup_grid.py'
+)
+
+
+def regressor_engine(estimator, corners, levels, camera):
+    """Run the regressor path used by TargetFinder and return drone-space displacements."""
+    hull_angles = estimator.get_hull_angles_batch(corners, camera.image_height, camera.image_width)
+    displacements = estimator.estimate_displacements(hull_angles, levels)
+    # Every sample is a different pose, so each code gets its own rotation here. In flight, the codes of a
+    # frame share one rotation, which estimate_rotation_batch fits from all of them together.
+    rotations = np.array([estimator.estimate_rotation_batch(hull[np.newaxis])[0] for hull in corners])
+    return estimator.targets_to_drone_space(displacements, rotations)
+
+
+def homography_engine(estimator, corners, levels, camera):
+    """Run the homography path and return drone-space displacements."""
+    displacements, yaws = estimator.estimate_poses(corners, levels, camera.image_height, camera.image_width)
+    return DisplacementEstimator.targets_to_drone_space(displacements, yaws)
+
+
+def error_summary(estimates, truth):
+    """Get error statistics in meters and relative to the distance."""
+    errors = np.linalg.norm(estimates - truth, axis=1)
+    relative = errors / np.linalg.norm(truth, axis=1)
+    return {
+        'mean': np.nanmean(errors),
+        'median': np.nanmedian(errors),
+        'p95': np.nanpercentile(errors, 95),
+        'relative_median': np.nanmedian(relative)
+    }
+
+
+def main():
+    args = arg_parser.parse_args()
+    rng = np.random.default_rng(0)
+    camera = VirtualCamera(HORIZONTAL_FIELD_OF_VIEW, args.width, args.height)
+    engines = {
+        'regressor': (regressor_engine, DisplacementEstimator(fov=HORIZONTAL_FIELD_OF_VIEW)),
+        'homography': (homography_engine, HomographyEstimator(fov=HORIZONTAL_FIELD_OF_VIEW))
+    }
+    if os.path.exists(args.lookup_grid):
+        # The lookup grid stands in for the regressor, so it runs the same path
+        grid = LookupGridEstimator.load(args.lookup_grid)
+        engines['lookup'] = (regressor_engine, DisplacementEstimator(regressor=grid, fov=HORIZONTAL_FIELD_OF_VIEW))
+        mlp = engines['regressor'][1]._regressor
+        mlp_bytes = sum(array.nbytes for array in mlp.coefs + mlp.intercepts)
+        print(f'Model size: regressor {mlp_bytes / 1e3:.1f} kB, lookup grid {grid.nbytes / 1e3:.1f} kB')
+
+    print(f'{"engine":<12}{"level":>6}{"codes":>8}{"mean m":>10}{"median m":>10}{"p95 m":>10}{"median %":>10}')
+    frame_corners = []
+    for level, size in QR_SIZES.items():
+        truth = size * sample_displacements(args.samples, *xyz_range)
+        yaws = rng.uniform(-args.max_yaw, args.max_yaw, len(truth))
+        corners = camera.project(truth, np.full(len(truth), size), yaws, args.pixel_noise, rng)
+        visible = camera.visible(corners)
+        truth, corners = truth[visible], corners[visible]
+        frame_corners.append(corners[0])
+        for name, (engine, estimator) in engines.items():
+            summary = error_summary(engine(estimator, corners, [level] * len(corners), camera), truth)
+            print(
+                f'{name:<12}{level:>6}{len(corners):>8}{summary["mean"]:10.4f}{summary["median"]:10.4f}'
+                f'{summary["p95"]:10.4f}{100 * summary["relative_median"]:10.2f}'
+            )
+
+    # Latency of one frame in which every level is visible
+    frame_corners = np.array(frame_corners)
+    frame_levels = list(QR_SIZES.keys())
+    for name, (engine, estimator) in engines.items():
+        seconds = timeit.timeit(lambda: engine(estimator, frame_corners, frame_levels, camera), number=args.repeat)
+        print(f'{name:<12} {seconds / args.repeat * 1e6:8.1f} us per frame of {len(frame_levels)} codes')
+
+
+if __name__ == '__main__':
+    main()
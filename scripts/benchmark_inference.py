@@ -0,0 +1,84 @@
+"""Check the NumPy inference engine against sklearn and compare their latency.
+
+Run from the scripts directory:
+
+    python benchmark_inference.py
+"""
+import argparse
+import pickle
+import sys
+import timeit
+
+import numpy as np
+from sklearn.metrics import r2_score
+
+sys.path.insert(0, '../precision_drone_landing')
+from mlp_inference import NumpyMLP  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='benchmark_inference.py'
+)
+arg_parser.add_argument(
+    '-m',
+    '--model',
+    default='../assets/displacement_detection_models/regressor.pkl',
+    help='A pickle file containing a trained MLPRegressor'
+)
+arg_parser.add_argument(
+    '-n',
+    '--repeat',
+    type=int,
+    default=2000,
+    help='The number of calls to time for each case'
+)
+
+
+def sample_inputs(n, rng):
+    """Get hull angles in the range the regressor is used on.
+
+    :param n: The number of rows to generate.
+    :type n: int
+    :param rng: The random number generator to draw from.
+    :type rng: np.random.Generator
+    :returns: An array of shape (n, 5).
+    :rtype: np.ndarray"""
+    # Side angles of a 1 meter code seen from between 0.05 and 20 meters away
+    return rng.uniform(0.05, 1.5, (n, 5))
+
+
+def microseconds_per_call(func, repeat):
+    """Get the mean wall time of func() in microseconds."""
+    return timeit.timeit(func, number=repeat) / repeat * 1e6
+
+
+def main():
+    args = arg_parser.parse_args()
+    with open(args.model, 'rb') as model_file:
+        regressor = pickle.load(model_file)
+    rng = np.random.default_rng(0)
+    engines = {
+        'float64': NumpyMLP.from_regressor(regressor, dtype=np.float64),
+        'float32': NumpyMLP.from_regressor(regressor, dtype=np.float32)
+    }
+
+    inputs = sample_inputs(10000, rng)
+    expected = regressor.predict(inputs)
+    for name, engine in engines.items():
+        actual = engine.predict(inputs)
+        print(
+            f'{name}: max abs difference from sklearn = {np.max(np.abs(actual - expected)):.3g}, '
+            f'R² against sklearn = {r2_score(expected, actual):.10f}'
+        )
+    assert np.allclose(engines['float64'].predict(inputs), expected, rtol=1e-9, atol=1e-9)
+    assert np.allclose(engines['float32'].predict(inputs), expected, rtol=1e-3, atol=1e-3)
+
+    print(f'{"rows":>5} {"sklearn":>12} {"float64":>12} {"float32":>12}')
+    for rows in (1, 3, 32):
+        batch = sample_inputs(rows, rng)
+        timings = [microseconds_per_call(lambda: regressor.predict(batch), args.repeat)]
+        timings += [microseconds_per_call(lambda: engine.predict(batch), args.repeat) for engine in engines.values()]
+        print(f'{rows:5} ' + ' '.join(f'{timing:9.1f} us' for timing in timings))
+
+
+if __name__ == '__main__':
+    main()
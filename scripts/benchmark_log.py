@@ -0,0 +1,75 @@
+"""Measure how much logging slows down a loop that runs like the control loop.
+
+The loop does a little work and writes a line to the control log every period, with logging off, as CSV
+and as a binary log, and the time of each iteration is reported. The Logger's writer thread runs
+alongside, so its share of the GIL shows up in the tail of the iteration times. Run from the scripts
+directory:
+
+    python benchmark_log.py
+    python benchmark_log.py --period 0
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, '../precision_drone_landing')
+from log import Logger  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='benchmark_log.py'
+)
+arg_parser.add_argument('-n', '--iterations', type=int, default=5000, help='The number of iterations of each loop')
+arg_parser.add_argument('--period', type=float, default=0.002, help='The time in seconds between iterations')
+
+# The columns of the control log, see DroneControl
+PARAMS = ["Time", "Mode", "Roll", "Pitch", "Z Relative distance", "Z Absolute Variance", "X Relative Distance",
+          "X Absolute Variance", "Y Relative Distance", "Y Absolute Variance", "Seconds"]
+DTYPES = ["<f8", "|S8"] + ["<f4"] * 9
+
+
+def work():
+    """Stand in for the arithmetic of one control update."""
+    total = 0.0
+    for i in range(200):
+        total += i * 0.5
+    return total
+
+
+def run(logger, iterations, period):
+    """Run the loop, writing a line to the logger, if any, every iteration.
+
+    :returns: An array of the time each iteration took in seconds."""
+    seconds = np.empty(iterations)
+    for iteration in range(iterations):
+        start = time.perf_counter()
+        if logger is not None:
+            logger.writeline([time.time(), 'Tracking', 0.1, 0.2, 1.0, None, 0.5, 0.6, 0.7, 0.8, 0.001])
+        work()
+        seconds[iteration] = time.perf_counter() - start
+        time.sleep(max(0.0, period - seconds[iteration]))
+    return seconds
+
+
+def main():
+    args = arg_parser.parse_args()
+    print(f'{"":<8}{"median us":>10}{"p99 us":>10}{"p99.9 us":>10}{"max us":>10}')
+    with tempfile.TemporaryDirectory() as directory:
+        for log_format in (None, 'csv', 'binary'):
+            logger = None
+            if log_format is not None:
+                logger = Logger(str(Path(directory) / 'Drone_Control_Log.csv'), PARAMS, DTYPES, log_format)
+            microseconds = run(logger, args.iterations, args.period) * 1e6
+            if logger is not None:
+                logger.close()
+            print(
+                f'{log_format or "off":<8}{np.median(microseconds):10.1f}{np.percentile(microseconds, 99):10.1f}'
+                f'{np.percentile(microseconds, 99.9):10.1f}{microseconds.max():10.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
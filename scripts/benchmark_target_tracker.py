@@ -0,0 +1,175 @@
+"""Compare the ways PositionAggregator can estimate the target position, queried faster than frames arrive.
+
+These are the mean of the windowed layer averages, the robust fusion of the windowed estimates of every
+layer, and the Kalman target tracker. The drone descends over the pad while drifting. Each layer is only
+seen within a band of heights, its estimates are as noisy as fusion.expected_error says, a few of them
+are wild outliers, layers drop out for a few frames at a time, and now and then every layer is lost at
+once for up to a couple of seconds. The position is queried at the control rate, and the error against
+the true position is reported for the frames where the pad is seen and for the blackouts. Run from the
+scripts directory:
+
+    python benchmark_target_tracker.py
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, '../precision_drone_landing')
+from config import MAX_FRAMES_PER_SECOND, QR_SIZES  # noqa: E402
+from fusion import LayerFusion  # noqa: E402
+from layer_estimators import LayerRingBuffer  # noqa: E402
+from target_tracker import KalmanTargetTracker  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='benchmark_target_tracker.py'
+)
+arg_parser.add_argument('-n', '--sequences', type=int, default=20, help='The number of descents to simulate')
+arg_parser.add_argument('--seconds', type=float, default=60, help='The length of each descent')
+arg_parser.add_argument('--control-rate', type=float, default=50, help='The position queries per second')
+arg_parser.add_argument('--dropout', type=float, default=0.1, help='The chance a visible layer drops out each frame')
+arg_parser.add_argument('--blackout', type=float, default=0.01, help='The chance every layer is lost each frame')
+arg_parser.add_argument('--outliers', type=float, default=0.02, help='The fraction of estimates that are outliers')
+arg_parser.add_argument('--acceleration-noise', type=float, default=0.1, help='The tracker\'s acceleration noise')
+
+# Each layer is only visible within a band of heights, like the nested codes of the pad
+VISIBLE_HEIGHTS = [(3, np.inf), (1, 6), (0, 2)]
+
+
+def trajectory(seconds, rng):
+    """Get a function from time to the true drone-space displacement of the pad during a descent."""
+    phase = rng.uniform(0, 2 * np.pi, 2)
+
+    def position(t):
+        progress = t / seconds
+        height = 10 * (1 - progress) + 0.5
+        return np.array([
+            0.3 * height * np.sin(2 * np.pi * progress + phase[0]),
+            0.3 * height * np.cos(3 * np.pi * progress + phase[1]),
+            height
+        ])
+    return position
+
+
+def simulate(seconds, dropout, blackout, outliers, noise_model, rng):
+    """Simulate the estimates made during a descent.
+
+    :returns: A list of (time, layer, position) estimates and a list of (start, end) blackouts."""
+    estimates, blackouts = [], []
+    position = trajectory(seconds, rng)
+    dropped = np.zeros(3, dtype=bool)
+    blackout_end = -np.inf
+    t = 0
+    while t < seconds:
+        # Frames do not arrive at an exact rate
+        t += rng.uniform(0.5, 1.5) / MAX_FRAMES_PER_SECOND
+        if t >= blackout_end and rng.uniform() < blackout:
+            blackout_end = t + rng.uniform(0.2, 2)
+            blackouts.append((t, blackout_end))
+        if t < blackout_end:
+            continue
+        # Dropouts last a few frames, as when a code is briefly out of focus or out of frame
+        dropped = np.where(dropped, rng.uniform(size=3) < 0.7, rng.uniform(size=3) < dropout)
+        truth = position(t)
+        for layer, (lowest, highest) in enumerate(VISIBLE_HEIGHTS):
+            if lowest <= truth[2] < highest and not dropped[layer]:
+                error = rng.normal(0, noise_model(layer, truth[2]), 3)
+                if rng.uniform() < outliers:
+                    # Like a regressor output far outside its training range
+                    error = rng.uniform(-5, 5, 3)
+                estimates.append((t, layer, truth + error))
+    return estimates, blackouts, position
+
+
+def run(estimates, seconds, control_rate, fusion, tracker):
+    """Feed the estimates to windowed layer averages and to the tracker, and query each way at the control rate.
+
+    :returns: A tuple of the windowed, fused and tracked positions, as arrays of shape (N, 3) that are NaN
+        where there was no position, the query times, and the seconds spent in the tracker."""
+    layers = [LayerRingBuffer() for _ in range(3)]
+    queries = np.arange(0, seconds, 1 / control_rate)
+    windowed = np.full((len(queries), 3), np.nan)
+    fused = np.full((len(queries), 3), np.nan)
+    tracked = np.full((len(queries), 3), np.nan)
+    tracker_seconds = 0
+    index = 0
+    for query, now in enumerate(queries):
+        while index < len(estimates) and estimates[index][0] <= now:
+            t, layer, position = estimates[index]
+            layers[layer].append(*position, timestamp=t)
+            start = time.perf_counter()
+            tracker.update(position, layer, t)
+            tracker_seconds += time.perf_counter() - start
+            index += 1
+        for layer in layers:
+            layer.expire(now)
+        averages = [layer.weighted_average(now) for layer in layers if len(layer)]
+        if averages:
+            windowed[query] = [statistics.mean(axis) for axis in zip(*averages)]
+            observations = [layer.observations(now) for layer in layers]
+            position = fusion.fuse(
+                np.concatenate([positions for positions, _ in observations]),
+                np.concatenate([np.full(len(weights), index) for index, (_, weights) in enumerate(observations)]),
+                np.concatenate([weights for _, weights in observations])
+            )
+            if position is not None:
+                fused[query] = position
+        start = time.perf_counter()
+        target = tracker.predict(now)
+        tracker_seconds += time.perf_counter() - start
+        if target is not None:
+            tracked[query] = target.position
+    return windowed, fused, tracked, queries, tracker_seconds
+
+
+def describe(name, errors):
+    covered = ~np.isnan(errors)
+    if not covered.any():
+        return f'{name:<10}{100 * covered.mean():10.1f}'
+    return (
+        f'{name:<10}{100 * covered.mean():10.1f}{np.median(errors[covered]):10.4f}'
+        f'{np.percentile(errors[covered], 95):10.4f}'
+    )
+
+
+def main():
+    args = arg_parser.parse_args()
+    rng = np.random.default_rng(0)
+    fusion = LayerFusion(levels=QR_SIZES)
+    tracker = KalmanTargetTracker(levels=QR_SIZES, acceleration_noise=args.acceleration_noise)
+    errors = {'window': [], 'fusion': [], 'tracker': []}
+    in_blackout, heights = [], []
+    updates, tracker_seconds = 0, 0
+    for _ in range(args.sequences):
+        tracker.reset()
+        estimates, blackouts, position = simulate(
+            args.seconds, args.dropout, args.blackout, args.outliers, tracker.measurement_noise, rng
+        )
+        *positions, queries, seconds = run(estimates, args.seconds, args.control_rate, fusion, tracker)
+        truth = np.array([position(t) for t in queries])
+        heights.append(truth[:, 2])
+        for name, estimated in zip(errors, positions):
+            errors[name].append(np.linalg.norm(estimated - truth, axis=1))
+        in_blackout.append(np.any([(queries >= start) & (queries < end) for start, end in blackouts], axis=0)
+                           if blackouts else np.zeros(len(queries), dtype=bool))
+        updates += len(estimates) + len(queries)
+        tracker_seconds += seconds
+    errors = {name: np.concatenate(name_errors) for name, name_errors in errors.items()}
+    in_blackout = np.concatenate(in_blackout)
+
+    print(f'{"":<10}{"covered %":>10}{"median m":>10}{"p95 m":>10}')
+    low = np.concatenate(heights) < 3
+    for title, selected in [
+            ('Pad in view', ~in_blackout),
+            ('Pad in view below 3 m', ~in_blackout & low),
+            ('Blackouts', in_blackout)]:
+        print(f'{title} ({np.count_nonzero(selected)} queries)')
+        for name, name_errors in errors.items():
+            print(describe(name, name_errors[selected]))
+    print(f'Tracker: {tracker_seconds / updates * 1e6:.1f} us per update or query')
+
+
+if __name__ == '__main__':
+    main()
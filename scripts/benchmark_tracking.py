@@ -0,0 +1,123 @@
+"""Compare estimating every frame from scratch with tracking the pose across frames.
+
+The drone descends over the landing pad while drifting and yawing slowly, and each frame is projected
+into a virtual camera with some corner noise. Run from the scripts directory:
+
+    python benchmark_tracking.py
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from virtual_camera import VirtualCamera
+
+sys.path.insert(0, '../precision_drone_landing')
+from config import HORIZONTAL_FIELD_OF_VIEW, QR_SIZES  # noqa: E402
+from displacement_estimator import DisplacementEstimator  # noqa: E402
+from homography_estimator import HomographyEstimator  # noqa: E402
+from pose_refiner import PoseRefiner  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='benchmark_tracking.py'
+)
+arg_parser.add_argument('-n', '--frames', type=int, default=600, help='The number of frames in the descent')
+arg_parser.add_argument('--start-height', type=float, default=10, help='The height in meters to start from')
+arg_parser.add_argument('--width', type=int, default=640, help='The image width in pixels')
+arg_parser.add_argument('--height', type=int, default=480, help='The image height in pixels')
+arg_parser.add_argument('--pixel-noise', type=float, default=0.5, help='The corner noise in pixels')
+arg_parser.add_argument('--iterations', type=int, default=2, help='The iterations per frame while tracking')
+arg_parser.add_argument(
+    '--tolerance',
+    type=float,
+    default=1,
+    help='The reprojection error in pixels below which the tracked pose is not refined'
+)
+
+
+def descent(frames, start_height, rng):
+    """Get a smooth trajectory of drone-space displacements and yaws."""
+    t = np.linspace(0, 1, frames)
+    phase = rng.uniform(0, 2 * np.pi, 3)
+    displacements = np.stack([
+        0.3 * start_height * (1 - t) * np.sin(2 * np.pi * t + phase[0]),
+        0.3 * start_height * (1 - t) * np.cos(3 * np.pi * t + phase[1]),
+        start_height * (1 - t) + 0.5
+    ], axis=1)
+    yaws = 0.5 * np.sin(np.pi * t + phase[2])
+    return displacements, yaws
+
+
+def visible_codes(camera, displacement, yaw, pixel_noise, rng):
+    """Project every level of the pad and keep the codes the recognizer could find."""
+    levels = list(QR_SIZES.keys())
+    sizes = np.array([QR_SIZES[level] for level in levels])
+    corners = camera.project(np.repeat(displacement[np.newaxis], len(levels), axis=0), sizes,
+                             np.full(len(levels), yaw), pixel_noise, rng)
+    visible = camera.visible(corners)
+    return corners[visible], [level for level, keep in zip(levels, visible) if keep]
+
+
+def cold_pose(estimator, corners, levels, camera):
+    """Estimate the pose from scratch with the homography, like TargetFinder does."""
+    displacements, yaws = estimator.estimate_poses(corners, levels, camera.image_height, camera.image_width)
+    yaw = np.arctan2(np.nanmean(np.sin(yaws)), np.nanmean(np.cos(yaws)))
+    return DisplacementEstimator.target_to_drone_space(np.nanmean(displacements, axis=0), yaw), yaw
+
+
+def summarize(name, estimates, truth, seconds, frames):
+    errors = np.linalg.norm(estimates - truth, axis=1)
+    # Jitter is how much the error changes from one frame to the next
+    jitter = np.linalg.norm(np.diff(estimates - truth, axis=0), axis=1)
+    print(
+        f'{name:<10}{np.nanmedian(errors):10.4f}{np.nanpercentile(errors, 95):10.4f}'
+        f'{np.nanmedian(jitter):10.4f}{seconds / frames * 1e6:10.1f}'
+    )
+
+
+def main():
+    args = arg_parser.parse_args()
+    rng = np.random.default_rng(0)
+    camera = VirtualCamera(HORIZONTAL_FIELD_OF_VIEW, args.width, args.height)
+    homography = HomographyEstimator(levels=QR_SIZES, fov=HORIZONTAL_FIELD_OF_VIEW)
+    refiner = PoseRefiner(
+        levels=QR_SIZES,
+        fov=HORIZONTAL_FIELD_OF_VIEW,
+        iterations=args.iterations,
+        tolerance=args.tolerance
+    )
+    truth, yaws = descent(args.frames, args.start_height, rng)
+    frames = [visible_codes(camera, displacement, yaw, args.pixel_noise, rng) for displacement, yaw in zip(truth, yaws)]
+    seen = np.array([len(levels) > 0 for _, levels in frames])
+    truth = truth[seen]
+    frames = [frame for frame, keep in zip(frames, seen) if keep]
+
+    cold = []
+    start = time.perf_counter()
+    for corners, levels in frames:
+        cold.append(cold_pose(homography, corners, levels, camera)[0])
+    cold_seconds = time.perf_counter() - start
+
+    tracked = []
+    acquisitions = 0
+    iterations = 0
+    start = time.perf_counter()
+    for corners, levels in frames:
+        pose = refiner.track(corners, levels, camera.image_height, camera.image_width)
+        if pose is None:
+            acquisitions += 1
+            displacement, yaw = cold_pose(homography, corners, levels, camera)
+            pose = refiner.acquire(corners, levels, camera.image_height, camera.image_width, displacement, yaw)
+        tracked.append(pose.displacement if pose else np.full(3, np.nan))
+        iterations += pose.iterations if pose else 0
+    tracked_seconds = time.perf_counter() - start
+
+    print(f'{len(frames)} frames, {acquisitions} acquisitions, {iterations / len(frames):.2f} iterations per frame')
+    print(f'{"engine":<10}{"median m":>10}{"p95 m":>10}{"jitter m":>10}{"us/frame":>10}')
+    summarize('cold', np.array(cold), truth, cold_seconds, len(frames))
+    summarize('tracked', np.array(tracked), truth, tracked_seconds, len(frames))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Build the lookup grid used by LookupGridEstimator.
+
+The grid is sampled from the same geometry that generate_displacement_model.py trains the
+regressor on. Run from the scripts directory:
+
+    python build_lookup_grid.py
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from generate_displacement_model import generate_learning_data, training_code_hash, xyz_range
+
+sys.path.insert(0, '../precision_drone_landing')
+from lookup_estimator import LookupGridEstimator, displacement_to_cell_values, hull_features  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='build_lookup_grid.py'
+)
+arg_parser.add_argument('-n', '--samples', type=int, default=1000000, help='The number of samples to draw')
+arg_parser.add_argument('-s', '--size', type=int, default=48, help='The number of cells along each axis')
+arg_parser.add_argument(
+    '-o',
+    '--output',
+    default='../assets/displacement_detection_models/lookup_grid.lut',
+    help='The lookup grid artifact to write'
+)
+
+
+def fill_empty_cells(table, filled):
+    """Give every empty cell the average of its filled neighbours, repeating until no cell is empty.
+
+    This extends the grid past the edge of the sampled geometry, so that noisy queries which land
+    just off of it still get a sensible answer.
+
+    :param table: An array of shape (nx, ny, nz, 3). Modified in place.
+    :type table: np.ndarray
+    :param filled: An array of shape (nx, ny, nz), true where the table has a value. Modified in place.
+    :type filled: np.ndarray"""
+    while not filled.all():
+        sums = np.zeros_like(table)
+        counts = np.zeros(filled.shape)
+        for axis in range(3):
+            for shift in (1, -1):
+                neighbour_filled = np.roll(filled, shift, axis=axis)
+                neighbour_values = np.roll(table, shift, axis=axis)
+                # np.roll wraps around, so ignore the neighbours that came from the opposite face
+                edge = [slice(None)] * 3
+                edge[axis] = 0 if shift == 1 else -1
+                neighbour_filled[tuple(edge)] = False
+                sums[neighbour_filled] += neighbour_values[neighbour_filled]
+                counts += neighbour_filled
+        growing = ~filled & (counts > 0)
+        table[growing] = sums[growing] / counts[growing][:, np.newaxis]
+        filled |= growing
+
+
+def build_lookup_grid(samples, size, chunk_size=100000):
+    """Sample the geometry and average the displacements that fall in each cell.
+
+    :param samples: The number of samples to draw.
+    :type samples: int
+    :param size: The number of cells along each axis.
+    :type size: int
+    :param chunk_size: The number of samples to generate at once.
+    :type chunk_size: int
+    :rtype: LookupGridEstimator"""
+    features = []
+    values = []
+    for start in range(0, samples, chunk_size):
+        angles, displacements = generate_learning_data(min(chunk_size, samples - start), *xyz_range)
+        features.append(hull_features(angles))
+        values.append(displacement_to_cell_values(displacements))
+        print(f'Sampled {start + len(angles)} of {samples}')
+    features = np.concatenate(features)
+    values = np.concatenate(values)
+
+    shape = np.array([size] * 3)
+    lower = features.min(axis=0)
+    cell_size = (features.max(axis=0) - lower) / (shape - 1)
+    cells = np.clip(np.rint((features - lower) / cell_size).astype(int), 0, shape - 1)
+    flat_cells = np.ravel_multi_index(cells.T, shape)
+
+    sums = np.zeros((np.prod(shape), 3))
+    counts = np.zeros(np.prod(shape))
+    np.add.at(sums, flat_cells, values)
+    np.add.at(counts, flat_cells, 1)
+    filled = counts > 0
+    print(f'{np.mean(filled):.1%} of cells were sampled')
+    sums[filled] /= counts[filled][:, np.newaxis]
+    table = sums.reshape(*shape, 3)
+    filled = filled.reshape(*shape)
+    fill_empty_cells(table, filled)
+    return LookupGridEstimator(table.astype(np.float32), lower, cell_size)
+
+
+if __name__ == '__main__':
+    args = arg_parser.parse_args()
+    grid = build_lookup_grid(args.samples, args.size)
+    grid.save(args.output, {'samples': args.samples, 'training_code_hash': training_code_hash()})
+    print(f'Saved "{args.output}" ({grid.nbytes / 1e6:.1f} MB)')
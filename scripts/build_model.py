@@ -0,0 +1,82 @@
+"""Build the displacement model, unless a model built from the current code is already cached.
+
+The model is trained with the hyperparameters in config/model_build.json and stored in the model
+cache under its build key, where the drone software looks for it. See model_cache.py. An interrupted
+build resumes from its checkpoint the next time it is run. Run from the scripts directory:
+
+    python build_model.py
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from generate_displacement_model import generate_displacement_model, load_checkpoint
+
+sys.path.insert(0, '../precision_drone_landing')
+from config import MODEL_CACHE_DIR  # noqa: E402
+from mlp_inference import NumpyMLP  # noqa: E402
+from model_cache import BUILD_CONFIG, build_key, cached_model_path  # noqa: E402
+from model_format import save_mlp  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='build_model.py'
+)
+arg_parser.add_argument('--cache_dir', default=MODEL_CACHE_DIR, help='The model cache directory')
+arg_parser.add_argument('--force', action='store_true', help='Build the model even if it is cached')
+arg_parser.add_argument(
+    '-p',
+    '--processes',
+    type=int,
+    default=os.cpu_count(),
+    help='The number of processes that generate training data'
+)
+
+
+def build_model(cache_dir=MODEL_CACHE_DIR, force=False, processes=None):
+    """Train and cache the model for the current generation code, if it is not cached yet.
+
+    :param cache_dir: The model cache directory.
+    :type cache_dir: str
+    :param force: Whether to build the model even if it is cached.
+    :type force: bool
+    :param processes: The number of processes that generate training data.
+    :type processes: int
+    :returns: The path of the cached model, or None if the build was stopped early.
+    :rtype: Path"""
+    key = build_key()
+    model_path = cached_model_path(key, cache_dir)
+    if model_path.exists() and not force:
+        print(f'"{model_path}" is up to date')
+        return model_path
+    print(f'Building model {key[:12]}...')
+    with open(BUILD_CONFIG, 'r') as config_file:
+        parameters = json.load(config_file)
+    model_path.parent.mkdir(parents=True, exist_ok=True)
+    checkpoint_path = model_path.with_suffix('.checkpoint.pkl')
+    regressor = generate_displacement_model(
+        existing_model=checkpoint_path if checkpoint_path.exists() and not force else None,
+        processes=processes,
+        seed=parameters['seed'],
+        samples=parameters['samples'],
+        batch_size=parameters['batch_size'],
+        checkpoint_path=checkpoint_path,
+        hidden_layer_sizes=parameters['hidden_layer_sizes'],
+        activation=parameters['activation']
+    )
+    if load_checkpoint(checkpoint_path)['batches'] * parameters['batch_size'] < parameters['samples']:
+        print('The build was stopped early, so the model was not cached. Run this script again to resume it.')
+        return None
+    # Write the model under a temporary name, so that a partial file is never mistaken for a cache hit
+    temporary_path = model_path.with_suffix('.tmp')
+    save_mlp(temporary_path, NumpyMLP.from_regressor(regressor), training_code_hash=key)
+    os.replace(temporary_path, model_path)
+    checkpoint_path.unlink()
+    print(f'Saved "{model_path}"')
+    return model_path
+
+
+if __name__ == '__main__':
+    args = arg_parser.parse_args()
+    build_model(Path(args.cache_dir), args.force, args.processes)
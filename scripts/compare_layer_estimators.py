@@ -0,0 +1,134 @@
+"""Compare the windowed and the exponentially decayed averages of the layer positions.
+
+The same sequence of position estimates is fed to a LayerRingBuffer and to DecayedLayerEstimators with a
+range of time constants, the way PositionAggregator feeds them, and both averages are read after every
+frame. The report gives how far each decayed average is from the windowed one, how far both are from the
+true position, and how long an append and a read take.
+
+Sequences are either recorded by the drone software, which writes every estimate it aggregates to
+Layer_Observations.csv (or .bin with LOG_FORMAT=binary), or simulated: a descent that drifts over the
+pad, with noise that grows with height and with layers dropping out for a few frames at a time. Run
+from the scripts directory:
+
+    python compare_layer_estimators.py
+    python compare_layer_estimators.py --recording ../precision_drone_landing/Layer_Observations.csv
+"""
+import argparse
+import csv
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, '../precision_drone_landing')
+from config import MAX_FRAMES_PER_SECOND  # noqa: E402
+from layer_estimators import DecayedLayerEstimator, LayerRingBuffer  # noqa: E402
+from log import BINARY_SUFFIX, read_binary_log  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='compare_layer_estimators.py'
+)
+arg_parser.add_argument('--recording', nargs='+', help='Layer_Observations.csv or .bin files to replay')
+arg_parser.add_argument('-n', '--sequences', type=int, default=20, help='The number of sequences to simulate')
+arg_parser.add_argument('--seconds', type=float, default=60, help='The length of each simulated sequence')
+arg_parser.add_argument('--noise', type=float, default=0.02, help='The estimate noise as a fraction of height')
+arg_parser.add_argument('--dropout', type=float, default=0.1, help='The chance a visible layer drops out each frame')
+arg_parser.add_argument(
+    '--time-constants',
+    type=float,
+    nargs='+',
+    default=[0.25, 0.5, 0.75, 1, 1.5, 2],
+    help='The time constants in seconds of the decayed averages to compare'
+)
+
+
+def simulate(seconds, noise, dropout, rng):
+    """Simulate the estimates of a descent over the pad.
+
+    :returns: A tuple of an array of shape (N, 5) of time, layer, x, y, z rows, and an array of shape
+        (N, 3) of the true positions at those times."""
+    frames = int(seconds * MAX_FRAMES_PER_SECOND)
+    # Frames do not arrive at an exact rate
+    times = np.cumsum(rng.uniform(0.5, 1.5, frames)) / MAX_FRAMES_PER_SECOND
+    progress = times / times[-1]
+    phase = rng.uniform(0, 2 * np.pi, 2)
+    height = 10 * (1 - progress) + 0.5
+    truth = np.stack([
+        0.3 * height * np.sin(2 * np.pi * progress + phase[0]),
+        0.3 * height * np.cos(3 * np.pi * progress + phase[1]),
+        -height
+    ], axis=1)
+    # Each layer is only visible within a band of heights, like the nested codes of the pad
+    visible_heights = [(3, np.inf), (1, 6), (0, 2)]
+    rows, truths = [], []
+    dropped = np.zeros(3, dtype=bool)
+    for t, position, h in zip(times, truth, height):
+        # Dropouts last a few frames, as when a code is briefly out of focus or out of frame
+        dropped = np.where(dropped, rng.uniform(size=3) < 0.7, rng.uniform(size=3) < dropout)
+        for layer, (lowest, highest) in enumerate(visible_heights):
+            if lowest <= h < highest and not dropped[layer]:
+                rows.append([t, layer, *(position + rng.normal(0, noise * h, 3))])
+                truths.append(position)
+    return np.array(rows), np.array(truths)
+
+
+def load_recording(path):
+    """Read the estimates logged by PositionAggregator, as CSV or as a binary log.
+
+    :returns: An array of shape (N, 5) of time, layer, x, y, z rows."""
+    if path.endswith(BINARY_SUFFIX):
+        _, columns = read_binary_log(path)
+        return np.stack(columns, axis=1).astype(float)
+    with open(path, 'r') as recording_file:
+        return np.array([[float(value) for value in row] for row in list(csv.reader(recording_file))[1:]])
+
+
+def replay(rows, layer_estimator):
+    """Feed the estimates to one estimator per layer and read the average of each after every estimate.
+
+    :returns: A tuple of an array of shape (N, 3) of averages, and the seconds spent appending and reading."""
+    layers = [layer_estimator() for _ in range(3)]
+    averages = np.empty((len(rows), 3))
+    start = time.perf_counter()
+    for index, (t, layer, x, y, z) in enumerate(rows):
+        estimator = layers[int(layer)]
+        estimator.append(x, y, z, timestamp=t)
+        estimator.expire(t)
+        averages[index] = estimator.weighted_average(t)
+    return averages, time.perf_counter() - start
+
+
+def main():
+    args = arg_parser.parse_args()
+    rng = np.random.default_rng(0)
+    if args.recording:
+        sequences = [(load_recording(path), None) for path in args.recording]
+    else:
+        sequences = [simulate(args.seconds, args.noise, args.dropout, rng) for _ in range(args.sequences)]
+    estimates = sum(len(rows) for rows, _ in sequences)
+    print(f'{len(sequences)} sequences, {estimates} estimates')
+
+    results = {}
+    for name, layer_estimator in [('window', LayerRingBuffer)] + [
+            (f'decay {time_constant:g} s', lambda time_constant=time_constant: DecayedLayerEstimator(time_constant))
+            for time_constant in args.time_constants]:
+        averages, seconds = zip(*[replay(rows, layer_estimator) for rows, _ in sequences])
+        results[name] = np.concatenate(averages), sum(seconds)
+
+    windowed = results['window'][0]
+    truth = None if args.recording else np.concatenate([truths for _, truths in sequences])
+    print(f'{"":<14}{"median diff":>12}{"p95 diff":>10}{"max diff":>10}'
+          f'{"median err":>12}{"p95 err":>10}{"us/estimate":>13}')
+    for name, (averages, seconds) in results.items():
+        difference = np.linalg.norm(averages - windowed, axis=1)
+        line = f'{name:<14}{np.median(difference):12.4f}{np.percentile(difference, 95):10.4f}{difference.max():10.4f}'
+        if truth is not None:
+            error = np.linalg.norm(averages - truth, axis=1)
+            line += f'{np.median(error):12.4f}{np.percentile(error, 95):10.4f}'
+        else:
+            line += f'{"":>22}'
+        print(line + f'{seconds / estimates * 1e6:13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Convert a pickled MLPRegressor to the pickle-free model artifact format.
+
+The runtime loads the artifact, so it does not need sklearn. The pickle does not record the code that
+trained the regressor, so the artifact records an "unknown" training code hash unless one is given.
+Run from the scripts directory:
+
+    python convert_regressor.py
+"""
+import argparse
+import pickle
+import sys
+
+import numpy as np
+
+sys.path.insert(0, '../precision_drone_landing')
+from mlp_inference import NumpyMLP  # noqa: E402
+from model_format import load_mlp, save_mlp  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='convert_regressor.py'
+)
+arg_parser.add_argument(
+    '-i',
+    '--input',
+    default='../assets/displacement_detection_models/regressor.pkl',
+    help='A pickle file containing a trained MLPRegressor'
+)
+arg_parser.add_argument(
+    '-o',
+    '--output',
+    default='../assets/displacement_detection_models/regressor.mlp',
+    help='The model artifact to write'
+)
+arg_parser.add_argument(
+    '--float32',
+    action='store_true',
+    help='Store the weights as 32-bit floats instead of 64-bit floats'
+)
+arg_parser.add_argument(
+    '--training_code_hash',
+    default='unknown',
+    help='The hash of the code that trained the regressor, as recorded by generate_displacement_model.py'
+)
+
+
+def convert(input_path, output_path, dtype=np.float64, training_code_hash='unknown') -> float:
+    """Convert a pickled MLPRegressor to a model artifact.
+
+    :param input_path: A pickle file containing a trained MLPRegressor.
+    :param output_path: The model artifact to write.
+    :param dtype: The floating point type to store the weights in.
+    :param training_code_hash: The hash of the code that trained the regressor.
+    :returns: The largest difference between the predictions of the saved artifact and of the regressor."""
+    with open(input_path, 'rb') as pickle_file:
+        regressor = pickle.load(pickle_file)
+    save_mlp(output_path, NumpyMLP.from_regressor(regressor, dtype=dtype), training_code_hash=training_code_hash)
+
+    # Make sure the artifact reproduces the regressor before anyone relies on it
+    check_input = np.random.default_rng(0).uniform(0.05, 1.5, (1000, regressor.n_features_in_))
+    return float(np.max(np.abs(load_mlp(output_path).predict(check_input) - regressor.predict(check_input))))
+
+
+if __name__ == '__main__':
+    args = arg_parser.parse_args()
+    difference = convert(
+        args.input,
+        args.output,
+        dtype=np.float32 if args.float32 else np.float64,
+        training_code_hash=args.training_code_hash
+    )
+    tolerance = 1e-3 if args.float32 else 1e-9
+    if difference > tolerance:
+        print(f'ALERT: The converted model differs from the regressor by up to {difference}')
+        sys.exit(1)
+    print(f'Saved "{args.output}" (max difference from the regressor: {difference:.3g})')
@@ -0,0 +1,28 @@
+"""Convert binary logs, written with LOG_FORMAT=binary, to CSV. Run from the scripts directory:
+
+    python export_log.py ../precision_drone_landing/Drone_Control_Log.bin
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, '../precision_drone_landing')
+from log import export_csv  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='export_log.py'
+)
+arg_parser.add_argument('logs', nargs='+', help='The binary logs to convert')
+arg_parser.add_argument('-o', '--output-dir', help='Where to write the CSV files. Defaults to next to each log')
+
+
+def main():
+    args = arg_parser.parse_args()
+    for log in map(Path, args.logs):
+        csv_path = (Path(args.output_dir) if args.output_dir else log.parent) / log.with_suffix('.csv').name
+        export_csv(log, csv_path)
+        print(f'"{log}" -> "{csv_path}"')
+
+
+if __name__ == '__main__':
+    main()
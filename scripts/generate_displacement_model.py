@@ -1,6 +1,13 @@
 import argparse
+import collections
+import contextlib
+import hashlib
+import itertools
+import multiprocessing
 import os
 import pickle
+import sys
+import timeit
 from datetime import datetime
 from functools import partial
 from typing import Optional
@@ -8,22 +15,70 @@ from typing import Optional
 import numpy as np
 import vg
 from sklearn.metrics import r2_score
-from sklearn.model_selection import GridSearchCV
 from sklearn.neural_network import MLPRegressor
 
+sys.path.insert(0, '../precision_drone_landing')
+from mlp_inference import NumpyMLP  # noqa: E402
+from model_format import save_mlp  # noqa: E402
+
 arg_parser = argparse.ArgumentParser(
     prog='generate_displacement_model.py'
 )
 arg_parser.add_argument(
     '-e',
     '--existing_model',
-    type=argparse.FileType('r'),
-    nargs=1,
-    help='A pickle file containing a partially trained MLPRegressor'
+    help='A checkpoint to resume, or a pickle file containing a partially trained MLPRegressor'
+)
+arg_parser.add_argument(
+    '-n',
+    '--samples',
+    type=int,
+    default=100000000,
+    help='The total number of training samples to stream through the regressor'
+)
+arg_parser.add_argument(
+    '-b',
+    '--batch_size',
+    type=int,
+    default=10000,
+    help='The number of samples in each minibatch'
+)
+arg_parser.add_argument(
+    '-k',
+    '--evaluate_every',
+    type=int,
+    default=100,
+    help='The number of minibatches between evaluations and checkpoints'
+)
+arg_parser.add_argument(
+    '-c',
+    '--checkpoint',
+    default='../assets/displacement_detection_models/regressor_checkpoint.pkl',
+    help='The file that checkpoints are written to'
+)
+arg_parser.add_argument(
+    '-p',
+    '--processes',
+    type=int,
+    default=os.cpu_count(),
+    help='The number of processes that generate training data'
+)
+arg_parser.add_argument(
+    '-s',
+    '--seed',
+    type=int,
+    default=None,
+    help='The seed of the training data, for reproducible runs'
+)
+arg_parser.add_argument(
+    '--benchmark',
+    action='store_true',
+    help='Compare the training data generator with the reference implementation instead of training'
 )
 
 
 side_length = 1
+xyz_range = (-2, 2), (-2, 2), (0.001, 20)
 rng = np.random.default_rng()
 
 
@@ -83,9 +138,62 @@ def get_angle(v1, v2, vector, units='rad'):
     return result
 
 
-def generate_learning_data(n, x_range, y_range, z_range):
+def sample_displacements(n, x_range, y_range, z_range, rng=rng):
+    """Draw random displacements of the target from the camera.
+
+    The x and y values are scaled by the z-value, so that the samples fill
+    the camera's field of view rather than a box.
+
+    :param n: The number of displacements to generate.
+    :type n: int
+    :param x_range: A minimum and maximum for the x-value at a z-value of 5.
+    :type x_range: tuple[float, float]
+    :param y_range: A minimum and maximum for the y-value at a z-value of 5.
+    :type y_range: tuple[float, float]
+    :param z_range: A minimum and maximum for the z-value.
+    :type z_range: tuple[float, float]
+    :param rng: The random number generator to draw from.
+    :type rng: np.random.Generator
+    :returns: An array of shape (n, 3).
+    :rtype: np.ndarray"""
+    vectors = rng.uniform(*zip(x_range, y_range, z_range), (n, 3))
+    vectors[:, 0] = vectors[:, 0] * vectors[:, 2] / 5
+    vectors[:, 1] = vectors[:, 1] * vectors[:, 2] / 5
+    return vectors
+
+
+def hull_angles(vectors, length=side_length):
+    """Get the angles between each pair of corners of QR codes, as seen from the camera.
+
+    This is the same computation as get_angle, for many displacements at once.
+
+    :param vectors: An array of shape (n, 3) containing displacements of the
+        target from the camera.
+    :type vectors: np.ndarray
+    :param length: The length of one side of the QR code.
+    :type length: float
+    :returns: An array of shape (n, 5) containing angles in radians.
+    :rtype: np.ndarray"""
+    first, second = pairs(corners(length))
+    v1 = first + vectors[:, np.newaxis, :]
+    v2 = second + vectors[:, np.newaxis, :]
+    dot_products = np.einsum('ijk,ijk->ij', v1, v2)
+    cosines = dot_products / np.linalg.norm(v1, axis=-1) / np.linalg.norm(v2, axis=-1)
+    return np.arccos(np.clip(cosines, -1.0, 1.0))
+
+
+def generate_learning_data(n, x_range, y_range, z_range, rng=rng, chunk_size=100000):
     """Generate a numpy array of training/testing data.
 
+    The data is generated in chunks, so that the temporary arrays stay
+    small no matter how many examples are requested. It is identical to
+    the output of generate_learning_data_reference for the same random state:
+
+    >>> reference = generate_learning_data_reference(1000, *xyz_range, rng=np.random.default_rng(0))
+    >>> vectorized = generate_learning_data(1000, *xyz_range, rng=np.random.default_rng(0), chunk_size=300)
+    >>> all(np.array_equal(a, b) for a, b in zip(reference, vectorized))
+    True
+
     :param n: The number of training examples to generate.
     :type n: int
     :param x_range: A minimum and maximum for the x-value.
@@ -94,9 +202,28 @@ def generate_learning_data(n, x_range, y_range, z_range):
     :type y_range: tuple[float, float]
     :param z_range: A minimum and maximum for the z-value.
     :type z_range: tuple[float, float]
+    :param rng: The random number generator to draw from.
+    :type rng: np.random.Generator
+    :param chunk_size: The number of examples to generate at once.
+    :type chunk_size: int
     :returns A tuple containing learning data. The first value is
         input, the second is correct output.
     :rtype: tuple[np.ndarray, np.ndarray]"""
+    angles = np.empty((n, 5))
+    vectors = np.empty((n, 3))
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        vectors[start:stop] = sample_displacements(stop - start, x_range, y_range, z_range, rng)
+        angles[start:stop] = hull_angles(vectors[start:stop])
+    return angles, vectors
+
+
+def generate_learning_data_reference(n, x_range, y_range, z_range, rng=rng):
+    """Generate training/testing data one example at a time.
+
+    This is the original implementation of generate_learning_data. It is
+    much slower, and is kept to check the vectorized one against.
+    Parameters and return values are the same as generate_learning_data."""
     corner_pairs = pairs(corners(side_length))
     angle_func = partial(get_angle, *corner_pairs)
     vectors = np.apply_along_axis(
@@ -109,83 +236,267 @@ def generate_learning_data(n, x_range, y_range, z_range):
     return angles, vectors
 
 
-def generate_displacement_model(existing_model=None):
+def benchmark_learning_data(n=100000):
+    """Time generate_learning_data against the reference implementation and check that they agree.
+
+    :param n: The number of examples to generate with each.
+    :type n: int"""
+    results = {}
+    for function in (generate_learning_data_reference, generate_learning_data):
+        seconds = timeit.timeit(
+            lambda: results.__setitem__(function, function(n, *xyz_range, rng=np.random.default_rng(0))),
+            number=1
+        )
+        print(f'{function.__name__:<35}{seconds:8.3f} s for {n} examples')
+    reference, vectorized = results.values()
+    identical = all(np.array_equal(a, b) for a, b in zip(reference, vectorized))
+    print(f'Outputs are {"identical" if identical else "DIFFERENT"}')
+    return identical
+
+
+def load_checkpoint(path):
+    """Load a checkpoint written by save_checkpoint, or a pickled regressor.
+
+    :param path: The path of the pickle file.
+    :type path: str
+    :returns: A checkpoint dictionary. For a plain regressor, training starts
+        from the first batch.
+    :rtype: dict"""
+    with open(path, 'rb') as model_file:
+        loaded = pickle.load(model_file)
+    if isinstance(loaded, dict):
+        return loaded
+    return {'regressor': loaded, 'batches': 0}
+
+
+def save_checkpoint(path, checkpoint):
+    """Write a checkpoint, replacing the previous one only once it is complete.
+
+    :param path: The path of the pickle file.
+    :type path: str
+    :param checkpoint: A dictionary containing the regressor and the progress of training.
+    :type checkpoint: dict"""
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as checkpoint_file:
+        pickle.dump(checkpoint, checkpoint_file)
+    os.replace(temporary_path, path)
+
+
+def evaluate(regressor, testing_input, testing_true_output, samples):
+    """Print the R² score of the regressor on the holdout data.
+
+    :param regressor: The regressor to score.
+    :type regressor: MLPRegressor
+    :param testing_input: The holdout input.
+    :type testing_input: np.ndarray
+    :param testing_true_output: The correct output for the holdout input.
+    :type testing_true_output: np.ndarray
+    :param samples: The number of samples trained on so far.
+    :type samples: int
+    :returns: The R² score.
+    :rtype: float"""
+    predicted_output = regressor.predict(testing_input)
+    score = r2_score(testing_true_output, predicted_output)
+    print(f'[{datetime.now()}] {samples:10} samples, R² = {score:7.4f}')
+    return score
+
+
+def generate_displacement_model(
+        existing_model=None,
+        processes=None,
+        seed=None,
+        samples=100000000,
+        batch_size=10000,
+        evaluate_every=100,
+        checkpoint_path=None,
+        hidden_layer_sizes=(16, 16, 16, 16),
+        activation='tanh'):
     """Train a regressor to recognize displacement from QR angles.
 
-    This function will run continuously until cancelled by a KeyboardInterrupt.
-    That is, the user must press Ctrl-C to exit.
+    Training data is generated on the fly, one minibatch at a time, and fed to
+    the regressor with partial_fit, so memory use does not depend on the number
+    of samples. Every few batches, the regressor is scored on a fixed holdout
+    set and a checkpoint is written. Training runs until all samples have been
+    used, or until cancelled by a KeyboardInterrupt. That is, the user may press
+    Ctrl-C to stop early and keep the regressor trained so far.
 
-    :param existing_model: The filepath of an optional model to start with
-        rather than creating a new one.
+    :param existing_model: The filepath of a checkpoint to resume, or of a pickled
+        regressor to start with rather than creating a new one.
     :type existing_model: str
+    :param processes: The number of processes that generate training data.
+    :type processes: int
+    :param seed: The seed of the training data. If None, fresh entropy is used.
+        Resumed checkpoints keep the seed they were started with.
+    :type seed: int
+    :param samples: The total number of training samples, including those of a resumed checkpoint.
+    :type samples: int
+    :param batch_size: The number of samples in each minibatch.
+    :type batch_size: int
+    :param evaluate_every: The number of minibatches between evaluations and checkpoints.
+    :type evaluate_every: int
+    :param checkpoint_path: The file that checkpoints are written to. If None, none are written.
+    :type checkpoint_path: str
+    :param hidden_layer_sizes: The sizes of the hidden layers of a new regressor.
+    :type hidden_layer_sizes: tuple[int, ...]
+    :param activation: The activation function of a new regressor.
+    :type activation: str
     :returns: A regressor trained to take four angles as input and return
         (x,y,z) coordinates as output.
     :rtype: MLPRegressor"""
-    xyz_range = (-2, 2), (-2, 2), (0.001, 20)
-    n = 1000000
-    num_rounds = 0
     if existing_model:
-        with open(existing_model, 'rb') as model_file:
-            regressor = pickle.load(model_file)
-        print(f'Using existing model "{existing_model}"')
+        checkpoint = load_checkpoint(existing_model)
+        print(f'Using existing model "{existing_model}", {checkpoint["batches"]} batches done')
     else:
-        regressor = MLPRegressor(
-            hidden_layer_sizes=(16, 16, 16, 16),
-            activation='tanh',
-            warm_start=True
-        )
+        checkpoint = {
+            'regressor': MLPRegressor(
+                hidden_layer_sizes=tuple(hidden_layer_sizes),
+                activation=activation
+            ),
+            'batches': 0
+        }
         print('Generated new model')
-    testing_input, testing_true_output = generate_learning_data(100000, *xyz_range)
-    print('Starting training...')
-    input_data, true_output = generate_learning_data(n, *xyz_range)
-    print('Fitting regressor, this can take a while (as in hours)...')
-    regressor.fit(X=input_data, y=true_output)
-    num_rounds += 1
+    # A resumed run has to continue the same streams, so its seed and batch size win
+    checkpoint.setdefault('entropy', np.random.SeedSequence(seed).entropy)
+    checkpoint.setdefault('batch_size', batch_size)
+    regressor = checkpoint['regressor']
+    batch_size = checkpoint['batch_size']
 
-    predicted_output = regressor.predict(testing_input)
-    score = r2_score(testing_true_output, predicted_output)
-    print(
-        f'[Round {num_rounds:4}][{datetime.now()}] {n * num_rounds:10} samples, '
-        f'R² = {score:7.4f}'
+    # The testing data gets its own stream, separate from every training batch
+    testing_seed, training_seed = np.random.SeedSequence(checkpoint['entropy']).spawn(2)
+    testing_input, testing_true_output = generate_learning_data(
+        100000, *xyz_range, rng=np.random.default_rng(testing_seed)
     )
+    batches = generate_learning_data_parallel(
+        samples, xyz_range, processes, training_seed, shard_size=batch_size, first_shard=checkpoint['batches']
+    )
+    print('Starting training, press Ctrl-C to stop early...')
+    saved_batches = checkpoint['batches']
+    try:
+        with contextlib.closing(batches):
+            for input_data, true_output in batches:
+                regressor.partial_fit(X=input_data, y=true_output)
+                checkpoint['batches'] += 1
+                if checkpoint['batches'] % evaluate_every == 0:
+                    evaluate(regressor, testing_input, testing_true_output, checkpoint['batches'] * batch_size)
+                    if checkpoint_path:
+                        save_checkpoint(checkpoint_path, checkpoint)
+                    saved_batches = checkpoint['batches']
+    except KeyboardInterrupt:
+        print('Stopping early')
+    if checkpoint['batches'] != saved_batches:
+        evaluate(regressor, testing_input, testing_true_output, checkpoint['batches'] * batch_size)
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, checkpoint)
+    if checkpoint_path:
+        print(f'Checkpoint saved to "{checkpoint_path}", resume it with --existing_model')
     return regressor
 
 
-def go(n, xyz_range, *_):
-    """Wrapper function for go, as Pool.imap requires that the function take an additional arg.
+def training_code_hash():
+    """Get a hash of this script, which is recorded in the model artifacts it produces.
+
+    :returns: A hexadecimal SHA-256 digest.
+    :rtype: str"""
+    with open(__file__, 'rb') as script_file:
+        return hashlib.sha256(script_file.read()).hexdigest()
+
+
+def go(n, xyz_range, seed_sequence):
+    """Wrapper function for _go, which is what the worker pool runs.
 
     :param n: The number of training samples to generate.
     :type n: int
     :param xyz_range: A tuple of the x, y, z minimum and maximum values.
     :type xyz_range: tuple[tuple[float, float], tuple[float, float], tuple[float, float]]
+    :param seed_sequence: The seed of this shard's random number generator.
+    :type seed_sequence: np.random.SeedSequence
     :returns A tuple containing learning data. The first value is
         input, the second is correct output.
     :rtype: tuple[np.ndarray, np.ndarray]"""
-    return _go(n, xyz_range)
+    return _go(n, xyz_range, seed_sequence)
 
 
-def _go(n, xyz_range):
-    """A function which generates one round worth of training data.
+def _go(n, xyz_range, seed_sequence):
+    """A function which generates one shard worth of training data, such as a minibatch.
 
     Used by a multiprocessing pool to generate data in parallel.
     :param n: The number of training samples to generate.
     :type n: int
     :param xyz_range: A tuple of the x, y, z minimum and maximum values.
     :type xyz_range: tuple[tuple[float, float], tuple[float, float], tuple[float, float]]
+    :param seed_sequence: The seed of this shard's random number generator.
+    :type seed_sequence: np.random.SeedSequence
     :returns A tuple containing learning data. The first value is
         input, the second is correct output.
     :rtype: tuple[np.ndarray, np.ndarray]"""
-    pid = os.getpid()
-    print(f'Process {pid} started!')
-    training_data = generate_learning_data(n, *xyz_range)
-    print(f'Training data ready on {pid}!')
-    return training_data
+    return generate_learning_data(n, *xyz_range, rng=np.random.default_rng(seed_sequence))
+
+
+def generate_learning_data_parallel(
+        n, xyz_range, processes=None, seed=None, shard_size=100000, first_shard=0, prefetch=2):
+    """Generate training data in shards across a pool of processes.
+
+    Each shard draws from its own random number generator, spawned from one
+    seed, so the data is reproducible for a given seed and shard size no
+    matter how many processes are used. Shards are yielded in order as soon
+    as they are ready, so the caller can consume them while the next ones
+    are still being generated. Only a few shards per process are generated
+    ahead of the caller, which keeps memory bounded however large n is.
+
+    :param n: The number of training examples to generate, counting skipped shards.
+    :type n: int
+    :param xyz_range: A tuple of the x, y, z minimum and maximum values.
+    :type xyz_range: tuple[tuple[float, float], tuple[float, float], tuple[float, float]]
+    :param processes: The number of processes to use. Defaults to the number of CPUs.
+    :type processes: int
+    :param seed: The seed to spawn each shard's generator from. If None, fresh entropy is used.
+    :type seed: int | np.random.SeedSequence
+    :param shard_size: The number of examples in each shard.
+    :type shard_size: int
+    :param first_shard: The number of shards to skip, e.g. to resume a run.
+    :type first_shard: int
+    :param prefetch: The number of shards per process to generate ahead of the caller.
+    :type prefetch: int
+    :returns: An iterator of (input, correct output) tuples, one per shard.
+    :rtype: Iterator[tuple[np.ndarray, np.ndarray]]"""
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    shard_sizes = [min(shard_size, n - start) for start in range(0, n, shard_size)]
+    # Children are numbered, so shard i gets the same stream however many shards are spawned
+    seed_sequences = seed.spawn(len(shard_sizes))
+    shards = zip(shard_sizes[first_shard:], seed_sequences[first_shard:])
+    with multiprocessing.Pool(processes) as pool:
+        window = prefetch * (processes or os.cpu_count())
+        pending = collections.deque(
+            pool.apply_async(go, (size, xyz_range, seed_sequence))
+            for size, seed_sequence in itertools.islice(shards, window)
+        )
+        while pending:
+            shard = pending.popleft().get()
+            for size, seed_sequence in itertools.islice(shards, 1):
+                pending.append(pool.apply_async(go, (size, xyz_range, seed_sequence)))
+            yield shard
 
 
 if __name__ == '__main__':
     args = arg_parser.parse_args()
-    model = generate_displacement_model(existing_model=args.existing_model)
+    if args.benchmark:
+        sys.exit(0 if benchmark_learning_data() else 1)
+    model = generate_displacement_model(
+        existing_model=args.existing_model,
+        processes=args.processes,
+        seed=args.seed,
+        samples=args.samples,
+        batch_size=args.batch_size,
+        evaluate_every=args.evaluate_every,
+        checkpoint_path=args.checkpoint
+    )
     print('Saving regressor...')
     with open('../assets/displacement_detection_models/regressor.pkl', 'wb') as pickle_file:
         pickle.dump(model, pickle_file)
+    save_mlp(
+        '../assets/displacement_detection_models/regressor.mlp',
+        NumpyMLP.from_regressor(model),
+        training_code_hash=training_code_hash()
+    )
     print('Regressor saved!')
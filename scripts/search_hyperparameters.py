@@ -0,0 +1,174 @@
+"""Search network shapes and activations for the displacement regressor, trading accuracy for latency.
+
+Each candidate is cross-validated in parallel for its R² score, then timed on the runtime path: a
+NumpyMLP with the candidate's shape, called through DisplacementEstimator.estimate_displacements for
+one frame of codes. The candidates that no other candidate beats on both counts form the Pareto front.
+The report lists every candidate and recommends the smallest network that meets the accuracy target.
+Run from the scripts directory:
+
+    python search_hyperparameters.py
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import warnings
+
+import numpy as np
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.model_selection import GridSearchCV
+from sklearn.neural_network import MLPRegressor
+
+from generate_displacement_model import generate_learning_data, xyz_range
+
+sys.path.insert(0, '../precision_drone_landing')
+from displacement_estimator import DisplacementEstimator  # noqa: E402
+from mlp_inference import NumpyMLP  # noqa: E402
+
+arg_parser = argparse.ArgumentParser(
+    prog='search_hyperparameters.py'
+)
+arg_parser.add_argument('-n', '--samples', type=int, default=200000, help='The number of training samples')
+arg_parser.add_argument('--max_iter', type=int, default=200, help='The most epochs to train each candidate for')
+arg_parser.add_argument('--cv', type=int, default=3, help='The number of cross-validation folds')
+arg_parser.add_argument(
+    '-j',
+    '--jobs',
+    type=int,
+    default=os.cpu_count(),
+    help='The number of candidates to train at once'
+)
+arg_parser.add_argument('--min_r2', type=float, default=0.999, help='The R² score a network must reach')
+arg_parser.add_argument('--codes', type=int, default=3, help='The number of codes per frame when timing')
+arg_parser.add_argument('--repeat', type=int, default=2000, help='The number of frames to time')
+arg_parser.add_argument(
+    '-o',
+    '--output',
+    default='hyperparameter_report.json',
+    help='The file to write the report to'
+)
+
+parameter_grid = {
+    'hidden_layer_sizes': [
+        (8,), (16,), (32,),
+        (8, 8), (16, 16), (32, 32),
+        (8, 8, 8), (16, 16, 16),
+        (8, 8, 8, 8), (16, 16, 16, 16), (32, 32, 32, 32)
+    ],
+    'activation': ['tanh', 'relu', 'logistic']
+}
+
+
+def parameter_count(hidden_layer_sizes, n_inputs=5, n_outputs=3):
+    """Get the number of weights and biases in a network.
+
+    >>> parameter_count((16, 16, 16, 16))
+    963
+
+    :param hidden_layer_sizes: The sizes of the hidden layers.
+    :type hidden_layer_sizes: tuple[int, ...]
+    :rtype: int"""
+    sizes = [n_inputs, *hidden_layer_sizes, n_outputs]
+    return sum((fan_in + 1) * fan_out for fan_in, fan_out in zip(sizes[:-1], sizes[1:]))
+
+
+def frame_latency(hidden_layer_sizes, activation, codes, repeat, rng):
+    """Time the runtime path for one frame with a network of the given shape.
+
+    The time does not depend on the values of the weights, so random ones are used.
+
+    :returns: The mean time per frame in seconds.
+    :rtype: float"""
+    sizes = [5, *hidden_layer_sizes, 3]
+    mlp = NumpyMLP(
+        coefs=[rng.normal(size=(fan_in, fan_out)) for fan_in, fan_out in zip(sizes[:-1], sizes[1:])],
+        intercepts=[rng.normal(size=fan_out) for fan_out in sizes[1:]],
+        activation=activation
+    )
+    estimator = DisplacementEstimator(regressor=mlp, levels={'0': 1.0})
+    hull_angles = rng.uniform(0.05, 1.5, (codes, 5))
+    levels = ['0'] * codes
+    estimator.estimate_displacements(hull_angles, levels)  # Warm up the buffers
+    return timeit.timeit(lambda: estimator.estimate_displacements(hull_angles, levels), number=repeat) / repeat
+
+
+def pareto_front(candidates):
+    """Mark the candidates that no other candidate beats on both R² and latency.
+
+    :param candidates: A list of dictionaries with 'r2' and 'latency' keys. Each gets a 'pareto' key."""
+    for candidate in candidates:
+        candidate['pareto'] = not any(
+            other['r2'] >= candidate['r2'] and other['latency'] <= candidate['latency'] and
+            (other['r2'] > candidate['r2'] or other['latency'] < candidate['latency'])
+            for other in candidates
+        )
+
+
+def main():
+    args = arg_parser.parse_args()
+    rng = np.random.default_rng(0)
+    input_data, true_output = generate_learning_data(args.samples, *xyz_range, rng=rng)
+
+    search = GridSearchCV(
+        MLPRegressor(max_iter=args.max_iter, early_stopping=True, random_state=0),
+        parameter_grid,
+        scoring='r2',
+        cv=args.cv,
+        n_jobs=args.jobs,
+        refit=False,
+        verbose=1
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        search.fit(input_data, true_output)
+
+    candidates = []
+    for parameters, r2, r2_std, fit_time in zip(
+            search.cv_results_['params'],
+            search.cv_results_['mean_test_score'],
+            search.cv_results_['std_test_score'],
+            search.cv_results_['mean_fit_time']):
+        # Latency is measured here, one candidate at a time, so that training does not disturb it
+        candidates.append({
+            'hidden_layer_sizes': list(parameters['hidden_layer_sizes']),
+            'activation': parameters['activation'],
+            'parameters': parameter_count(parameters['hidden_layer_sizes']),
+            'r2': float(r2),
+            'r2_std': float(r2_std),
+            'fit_seconds': float(fit_time),
+            'latency': frame_latency(
+                parameters['hidden_layer_sizes'], parameters['activation'], args.codes, args.repeat, rng
+            )
+        })
+    pareto_front(candidates)
+    candidates.sort(key=lambda candidate: candidate['latency'])
+    accurate = [candidate for candidate in candidates if candidate['r2'] >= args.min_r2]
+    recommended = min(accurate, key=lambda candidate: (candidate['parameters'], candidate['latency']), default=None)
+
+    print(f'{"hidden layers":<18}{"activation":<11}{"params":>7}{"R²":>9}{"us/frame":>10}  pareto')
+    for candidate in candidates:
+        print(
+            f'{str(tuple(candidate["hidden_layer_sizes"])):<18}{candidate["activation"]:<11}'
+            f'{candidate["parameters"]:>7}{candidate["r2"]:9.5f}{candidate["latency"] * 1e6:10.1f}'
+            f'  {"*" if candidate["pareto"] else ""}'
+        )
+    if recommended:
+        print(f'Recommended: {tuple(recommended["hidden_layer_sizes"])} {recommended["activation"]}')
+    else:
+        print(f'ALERT: No candidate reached R² = {args.min_r2}')
+
+    with open(args.output, 'w') as report_file:
+        json.dump({
+            'samples': args.samples,
+            'cv': args.cv,
+            'min_r2': args.min_r2,
+            'codes_per_frame': args.codes,
+            'recommended': recommended,
+            'candidates': candidates
+        }, report_file, indent=2)
+    print(f'Report written to "{args.output}"')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""A virtual pinhole camera for testing the displacement estimators without the simulator."""
+import math
+import sys
+
+import numpy as np
+
+sys.path.insert(0, '../precision_drone_landing')
+from homography_estimator import MODEL_CORNERS  # noqa: E402
+
+
+class VirtualCamera:
+    """Projects the corners of QR codes into an image, the way the drone's camera would see them.
+
+    The camera looks straight down at the target. Its image has square pixels and the given horizontal
+    field of view, just like the image that DisplacementEstimator.get_hull_angles assumes."""
+
+    def __init__(
+            self,
+            fov: float,
+            image_width: int = 640,
+            image_height: int = 480):
+        """
+        :param fov: The horizontal field of view in degrees.
+        :param image_width: The width of the image in pixels.
+        :param image_height: The height of the image in pixels.
+        """
+        self.fov = fov
+        self.image_width = image_width
+        self.image_height = image_height
+        self.pixels_per_unit = image_width / (2 * math.tan(math.radians(fov) / 2))
+
+    def project(self, displacements, side_lengths, yaws=None, pixel_noise=0.0, rng=None):
+        """Get the pixel coordinates of the corners of N codes.
+
+        :param displacements: An array of shape (N, 3) containing the displacements of the drone from the
+            target in drone-space, i.e. the values the estimators should return. These follow the convention
+            of the displacement regressor, whose x and y are a quarter turn from the image axes.
+        :param side_lengths: An array of shape (N,) containing the side length of each code in meters.
+        :param yaws: An array of shape (N,) containing the yaw of the drone relative to each code, with
+            the sign of DisplacementEstimator.estimate_rotation. Defaults to zero.
+        :param pixel_noise: The standard deviation in pixels of noise added to each corner.
+        :param rng: The random number generator to draw noise from.
+        :returns: An array of shape (N, 4, 2), in the order the recognizer reports corners. Corners are
+            rounded to whole pixels, as the recognizer reports them."""
+        displacements = np.asarray(displacements, dtype=float)
+        n = len(displacements)
+        yaws = np.zeros(n) if yaws is None else np.asarray(yaws, dtype=float)
+        # Undo the regressor's quarter turn to get the position of the code's center in camera coordinates
+        center_x = -displacements[:, 1]
+        center_y = displacements[:, 0]
+        depth = displacements[:, 2]
+
+        # A positive yaw means the code appears rotated the other way in the image
+        cos_theta = np.cos(-yaws)[:, np.newaxis]
+        sin_theta = np.sin(-yaws)[:, np.newaxis]
+        model = MODEL_CORNERS[np.newaxis] * np.asarray(side_lengths, dtype=float)[:, np.newaxis, np.newaxis]
+        corner_x = cos_theta * model[..., 0] - sin_theta * model[..., 1] + center_x[:, np.newaxis]
+        corner_y = sin_theta * model[..., 0] + cos_theta * model[..., 1] + center_y[:, np.newaxis]
+
+        pixels = np.stack([
+            corner_x / depth[:, np.newaxis] * self.pixels_per_unit + self.image_width / 2,
+            corner_y / depth[:, np.newaxis] * self.pixels_per_unit + self.image_height / 2
+        ], axis=-1)
+        if pixel_noise:
+            rng = rng or np.random.default_rng()
+            pixels += rng.normal(0, pixel_noise, pixels.shape)
+        return np.round(pixels)
+
+    def visible(self, corners, min_side: float = 10) -> np.ndarray:
+        """Get which of the projected codes the recognizer could plausibly find.
+
+        :param corners: An array of shape (N, 4, 2) as returned by project.
+        :param min_side: The shortest side in pixels a code may have.
+        :returns: A boolean array of shape (N,)."""
+        inside = np.all(
+            (corners[..., 0] >= 0) & (corners[..., 0] < self.image_width) &
+            (corners[..., 1] >= 0) & (corners[..., 1] < self.image_height),
+            axis=1
+        )
+        sides = np.linalg.norm(corners - np.roll(corners, 1, axis=1), axis=-1)
+        return inside & (sides.min(axis=1) >= min_side)
@@ -0,0 +1,14 @@
+"""Make the modules of the software and its scripts importable the way they import each other.
+
+The software runs from the precision_drone_landing directory and reads ../config and ../assets relative to
+it, so the tests run from there too."""
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE_DIRECTORY = ROOT / 'precision_drone_landing'
+
+sys.path.insert(0, str(ROOT / 'scripts'))
+sys.path.insert(0, str(PACKAGE_DIRECTORY))
+os.chdir(PACKAGE_DIRECTORY)
@@ -0,0 +1,44 @@
+import pickle
+
+import numpy as np
+import pytest
+from sklearn.neural_network import MLPRegressor
+
+from convert_regressor import convert
+from model_format import load_arrays, load_mlp
+
+pytestmark = pytest.mark.filterwarnings('ignore::sklearn.exceptions.ConvergenceWarning')
+
+
+@pytest.fixture(scope='module')
+def regressor():
+    rng = np.random.default_rng(0)
+    inputs = rng.uniform(0.05, 1.5, (500, 5))
+    outputs = np.stack([inputs.sum(axis=1), inputs[:, 0] - inputs[:, 1], np.sin(inputs[:, 2])], axis=1)
+    return MLPRegressor(hidden_layer_sizes=(16, 16), max_iter=50, random_state=0).fit(inputs, outputs)
+
+
+@pytest.fixture
+def pickle_path(tmp_path, regressor):
+    path = tmp_path / 'regressor.pkl'
+    with open(path, 'wb') as pickle_file:
+        pickle.dump(regressor, pickle_file)
+    return path
+
+
+@pytest.mark.parametrize('dtype, tolerance', [(np.float64, 1e-9), (np.float32, 1e-3)])
+def test_round_trip(tmp_path, regressor, pickle_path, dtype, tolerance):
+    output_path = tmp_path / 'regressor.mlp'
+    assert convert(pickle_path, output_path, dtype=dtype) <= tolerance
+    engine = load_mlp(output_path)
+    # The weights are used straight from the memory mapped file
+    assert all(isinstance(coef.base, np.memmap) for coef in engine.coefs)
+    inputs = np.random.default_rng(1).uniform(0.05, 1.5, (64, 5))
+    assert np.allclose(engine.predict(inputs), regressor.predict(inputs), rtol=tolerance, atol=tolerance)
+
+
+def test_training_code_hash_defaults_to_unknown(tmp_path, pickle_path):
+    convert(pickle_path, tmp_path / 'unknown.mlp')
+    assert load_arrays(tmp_path / 'unknown.mlp', 'mlp')[1]['training_code_hash'] == 'unknown'
+    convert(pickle_path, tmp_path / 'known.mlp', training_code_hash='abc123')
+    assert load_arrays(tmp_path / 'known.mlp', 'mlp')[1]['training_code_hash'] == 'abc123'
@@ -0,0 +1,62 @@
+import pytest
+
+from degradation import DegradationPolicy, QualityLevel
+
+# The time in seconds that the work each level sheds takes per frame
+SHED = {QualityLevel.NO_PREVIEW: 0.04, QualityLevel.REDUCED_DECODE: 0.02, QualityLevel.REDUCED_LOGGING: 0.01}
+
+
+def frame_cost(level, base):
+    """The cost of a frame that takes `base` seconds with every optional piece of work shed."""
+    return base + sum(seconds for shed_level, seconds in SHED.items() if level < shed_level)
+
+
+def run(policy, base, frames):
+    """Feed a steady load to the policy and return the level after each frame."""
+    return [policy.update({'estimate': frame_cost(policy.level, base)}) for _ in range(frames)]
+
+
+@pytest.fixture
+def policy(tmp_path):
+    policy = DegradationPolicy(frame_budget=0.1, stage_budgets={'decode': 0.05}, headroom=0.8,
+                               log_filename=str(tmp_path / 'Degradation_Log.csv'))
+    yield policy
+    policy.logger.close()
+
+
+def test_degrades_one_level_per_run_of_overruns(policy):
+    levels = [policy.update({'estimate': 0.2}) for _ in range(12)]
+    assert levels == [QualityLevel.FULL] * 2 + [QualityLevel.NO_PREVIEW] * 3 + [QualityLevel.REDUCED_DECODE] * 3 \
+        + [QualityLevel.REDUCED_LOGGING] * 4
+    assert not policy.preview_enabled
+    assert policy.reduced_decode
+    assert policy.reduced_logging
+
+
+def test_stage_overrun_degrades(policy):
+    for _ in range(3):
+        policy.update({'decode': 0.06, 'estimate': 0.01})
+    assert policy.level == QualityLevel.NO_PREVIEW
+
+
+def test_overruns_must_be_consecutive(policy):
+    for _ in range(10):
+        policy.update({'estimate': 0.2})
+        policy.update({'estimate': 0.08})
+    assert policy.level == QualityLevel.FULL
+
+
+def test_steady_load_does_not_oscillate(policy):
+    # Overruns at FULL, and has headroom at NO_PREVIEW only because the preview is shed
+    levels = run(policy, base=0.035, frames=500)
+    assert levels[-1] == QualityLevel.NO_PREVIEW
+    assert sum(before != after for before, after in zip(levels, levels[1:])) == 1
+
+
+def test_restores_when_the_load_drops(policy):
+    run(policy, base=0.08, frames=100)
+    assert policy.level == QualityLevel.REDUCED_DECODE
+    levels = run(policy, base=0, frames=100)
+    assert levels[29] == QualityLevel.NO_PREVIEW
+    assert levels[59] == QualityLevel.FULL
+    assert levels[-1] == QualityLevel.FULL
@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+import pytest
+
+from displacement_estimator import DisplacementEstimator
+
+# The corners of an upright code, in the order the recognizer reports them
+UPRIGHT = np.array([[-1, -1], [-1, 1], [1, 1], [1, -1]], dtype=float)
+
+
+def reference_hull_angles(estimator, hull, image_height, image_width):
+    """The hull angles of one code, computed point by point as get_hull_angles used to."""
+    virtual_width = 2 * math.tan(estimator.horizontal_fov / 2)
+    virtual_height = virtual_width * image_height / image_width
+    points = [
+        ((x - image_width / 2) * virtual_width / image_width, (y - image_height / 2) * virtual_height / image_height, 1)
+        for x, y in hull
+    ]
+    return [
+        math.acos(np.dot(p1, p2) / (np.linalg.norm(p1) * np.linalg.norm(p2)))
+        for p1, p2 in estimator.pairs(points)
+    ]
+
+
+def rotated_codes(rng, yaws):
+    """Squares of random size and position in a 1280x1024 image, rotated by each yaw."""
+    codes = []
+    for yaw in yaws:
+        rotation = np.array([[math.cos(yaw), -math.sin(yaw)], [math.sin(yaw), math.cos(yaw)]])
+        codes.append(UPRIGHT @ rotation.T * rng.uniform(5, 200) + rng.uniform(200, 800, 2))
+    return np.array(codes)
+
+
+@pytest.fixture
+def estimator():
+    # The hull angles and rotation do not use the regressor
+    return DisplacementEstimator(regressor=object(), levels={'0': 1})
+
+
+@pytest.mark.parametrize('image_height, image_width', [(1024, 1280), (480, 640), (720, 720)])
+def test_hull_angles_batch_matches_per_code(estimator, image_height, image_width):
+    rng = np.random.default_rng(image_height)
+    corners = rng.uniform(0, min(image_height, image_width), (50, 4, 2))
+    batch = estimator.get_hull_angles_batch(corners, image_height=image_height, image_width=image_width)
+    assert batch.shape == (50, 5)
+    for hull, angles in zip(corners, batch):
+        assert np.allclose(angles, reference_hull_angles(estimator, hull, image_height, image_width),
+                           rtol=0, atol=1e-12)
+        assert np.array_equal(estimator.get_hull_angles(hull, image_height, image_width)[0], angles)
+
+
+def test_hull_angles_of_no_codes(estimator):
+    assert estimator.get_hull_angles_batch(np.empty((0, 4, 2)), 1024, 1280).shape == (0, 5)
+
+
+@pytest.mark.parametrize('yaw', [0, 0.3, -2, math.pi - 1e-9, -math.pi + 1e-9, math.pi, 3 * math.pi / 4])
+def test_rotation_batch_matches_per_code(yaw):
+    corners = rotated_codes(np.random.default_rng(0), [yaw])
+    rotation, confidence = DisplacementEstimator.estimate_rotation_batch(corners)
+    expected = DisplacementEstimator.estimate_rotation(corners[0])
+    # Both are in (-pi, pi], but may round to opposite ends of it near a half turn
+    assert abs(math.remainder(rotation - expected, 2 * math.pi)) < 1e-12
+    assert confidence == pytest.approx(1)
+
+
+def test_rotation_batch_matches_per_code_on_random_yaws():
+    rng = np.random.default_rng(1)
+    for yaw in rng.uniform(-math.pi, math.pi, 200):
+        # Every code of a frame is seen at the same yaw
+        corners = rotated_codes(rng, [yaw] * 3)
+        rotation, _ = DisplacementEstimator.estimate_rotation_batch(corners)
+        for hull in corners:
+            assert abs(math.remainder(rotation - DisplacementEstimator.estimate_rotation(hull), 2 * math.pi)) < 1e-12
+
+
+def test_rotation_of_no_codes():
+    assert DisplacementEstimator.estimate_rotation_batch(np.empty((0, 4, 2))) == (0.0, 0.0)
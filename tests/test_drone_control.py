@@ -0,0 +1,87 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('dronekit')
+import drone_control  # noqa: E402
+from target_handler import LandingZone, TargetHandler  # noqa: E402
+
+
+class Vehicle:
+    """A vehicle that records the velocities it is sent."""
+    is_armable = True
+
+    def __init__(self):
+        self.mode = SimpleNamespace(name='GUIDED')
+        self.attitude = SimpleNamespace(roll=0.0, pitch=0.0, yaw=0.0)
+        self.location = SimpleNamespace(local_frame=SimpleNamespace(north=0.0, east=0.0, down=-5.0))
+        self.message_factory = SimpleNamespace(set_position_target_local_ned_encode=lambda *fields: fields[8:11])
+        self.velocities = []
+
+    def send_mavlink(self, message):
+        self.velocities.append(message)
+
+
+class SimplePosition:
+    def get_scale_and_offset(self, layer):
+        return None, None, None
+
+
+@pytest.fixture
+def control(tmp_path, monkeypatch):
+    # The control logs are written to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(drone_control, 'connect', lambda *args, **kwargs: Vehicle())
+    control = drone_control.DroneControl(TargetHandler())
+    control.loc = control.vehicle.location
+    control.north_start = control.east_start = 0.0
+    control.down_start = -5.0
+    control.simplePosition = SimplePosition()
+    control.waiting = False
+    yield control
+    for logger in (control.logging, control.timingLogger, control.positioning.logger,
+                   control.positioning.observationLogger):
+        logger.close()
+
+
+def test_stops_resending_once_frames_stop(control):
+    control.positioning.targetHandler.update((LandingZone(0, 'code', 0.5, 0.2, 3), None, None))
+    asyncio.run(control.update_velocity())
+    command = control.lastCommand
+    assert command is not None
+    assert control.vehicle.velocities == [command]
+
+    # Between frames, the last command is sent again
+    asyncio.run(control.update_velocity())
+    assert control.vehicle.velocities == [command] * 2
+
+    # Once the last frame is too old, the drone hovers and the missed frames are counted
+    control.positioning.lastFrameTime = time.time() - control.maxFrameAge - 0.1
+    misses = control.positioning.missCount
+    for _ in range(3):
+        asyncio.run(control.update_velocity())
+        time.sleep(drone_control.SECONDS_PER_FRAME)
+    assert control.vehicle.velocities[2:] == [(0, 0, 0)] * 3
+    assert control.lastCommand is None
+    assert control.positioning.missCount == misses + 3
+
+    # A new frame brings back steering
+    control.positioning.targetHandler.update((LandingZone(0, 'code', 0.5, 0.2, 3), None, None))
+    asyncio.run(control.update_velocity())
+    assert control.lastCommand is not None
+    assert control.vehicle.velocities[-1] == control.lastCommand
+
+
+def test_stop_holds_position(control):
+    async def stop_soon():
+        # The first frame never arrives, as when the vision loop fails at once
+        task = asyncio.create_task(control.run())
+        await asyncio.sleep(0.01)
+        control.stop()
+        await asyncio.wait_for(task, timeout=1)
+
+    asyncio.run(stop_soon())
+    assert control.vehicle.velocities == [(0, 0, 0)]
+    assert control.exitStatus is None
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from generate_displacement_model import generate_learning_data, generate_learning_data_reference, xyz_range
+
+
+@pytest.fixture(scope='module')
+def reference():
+    return generate_learning_data_reference(2000, *xyz_range, rng=np.random.default_rng(0))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 300, 2000, 100000])
+def test_matches_reference(reference, chunk_size):
+    vectorized = generate_learning_data(2000, *xyz_range, rng=np.random.default_rng(0), chunk_size=chunk_size)
+    for expected, actual in zip(reference, vectorized):
+        assert np.array_equal(expected, actual)
+
+
+def test_shapes():
+    angles, vectors = generate_learning_data(10, *xyz_range, rng=np.random.default_rng(0))
+    assert angles.shape == (10, 5)
+    assert vectors.shape == (10, 3)
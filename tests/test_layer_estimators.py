@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from compare_layer_estimators import replay, simulate
+from layer_estimators import DecayedLayerEstimator, LayerRingBuffer
+
+
+class ListReference:
+    """The list of (time, x, y, z) rows PositionAggregator used to keep for each layer."""
+
+    def __init__(self, capacity, max_age):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.rows = []
+
+    def append(self, x, y, z, timestamp):
+        self.rows.append((timestamp, x, y, z))
+        del self.rows[:-self.capacity]
+
+    def expire(self, now):
+        self.rows = [row for row in self.rows if now - row[0] <= self.max_age]
+
+    def weighted_average(self, now):
+        if not self.rows:
+            return None, None, None
+        weights = [1 / (1 + (now - row[0])) for row in self.rows]
+        return tuple(
+            sum(weight * row[axis] for weight, row in zip(weights, self.rows)) / sum(weights)
+            for axis in (1, 2, 3)
+        )
+
+
+@pytest.mark.parametrize('capacity', [4, 32, 256])
+def test_ring_buffer_matches_list_reference(capacity):
+    rng = np.random.default_rng(capacity)
+    buffer = LayerRingBuffer(capacity=capacity, max_age=3)
+    reference = ListReference(capacity, max_age=3)
+    now = 0
+    for _ in range(2000):
+        now += rng.exponential(0.1)
+        if rng.uniform() < 0.8:
+            position = rng.normal(0, 5, 3)
+            buffer.append(*position, timestamp=now)
+            reference.append(*position, timestamp=now)
+        if rng.uniform() < 0.3:
+            # Expire at a later time than the last append, as the control loop does between frames
+            later = now + rng.exponential(1)
+            buffer.expire(later)
+            reference.expire(later)
+        assert len(buffer) == len(reference.rows)
+        expected = reference.weighted_average(now)
+        if expected[0] is None:
+            assert buffer.weighted_average(now) == (None, None, None)
+        else:
+            assert np.allclose(buffer.weighted_average(now), expected)
+
+
+def test_ring_buffer_overwrites_oldest():
+    buffer = LayerRingBuffer(capacity=3)
+    for timestamp in range(5):
+        buffer.append(timestamp, 0, 0, timestamp=timestamp)
+    assert buffer.rows()[:, 0].tolist() == [2, 3, 4]
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.weighted_average(5) == (None, None, None)
+
+
+def test_decayed_average_stays_close_to_window():
+    # The sequences scripts/compare_layer_estimators.py simulates, with its default noise and dropout
+    rng = np.random.default_rng(0)
+    differences, window_errors, decayed_errors = [], [], []
+    for _ in range(5):
+        rows, truth = simulate(60, 0.02, 0.1, rng)
+        windowed, _ = replay(rows, LayerRingBuffer)
+        decayed, _ = replay(rows, lambda: DecayedLayerEstimator(time_constant=1))
+        differences.append(np.linalg.norm(decayed - windowed, axis=1))
+        window_errors.append(np.linalg.norm(windowed - truth, axis=1))
+        decayed_errors.append(np.linalg.norm(decayed - truth, axis=1))
+    # A median of about 0.044 m when this was written
+    assert np.median(np.concatenate(differences)) < 0.06
+    assert np.median(np.concatenate(decayed_errors)) < 1.1 * np.median(np.concatenate(window_errors))
+
+
+def test_unknown_layer_estimator():
+    pytest.importorskip('dronekit')
+    from drone_control import PositionAggregator
+    from target_handler import TargetHandler
+
+    with pytest.raises(ValueError):
+        PositionAggregator(TargetHandler(), layer_estimator='median')
@@ -0,0 +1,29 @@
+import numpy as np
+
+from log import Logger, export_csv, read_binary_log
+
+
+def test_binary_round_trip(tmp_path):
+    logger = Logger(str(tmp_path / 'Test_Log.csv'), ['Time', 'Mode', 'X'], ['<f8', '|S8', '<f4'], 'binary')
+    for line in range(1000):
+        logger.writeline([line, 'Tracking', None if line % 10 == 0 else line / 2])
+    logger.close()
+    names, (times, modes, xs) = read_binary_log(tmp_path / 'Test_Log.bin')
+    assert names == ['Time', 'Mode', 'X']
+    assert np.array_equal(times, np.arange(1000))
+    assert set(modes) == {b'Tracking'}
+    assert np.isnan(xs[::10]).all()
+    assert np.array_equal(xs[1::10], np.arange(1, 1000, 10) / 2)
+    export_csv(tmp_path / 'Test_Log.bin', tmp_path / 'Exported.csv')
+    assert (tmp_path / 'Exported.csv').read_text().splitlines()[:2] == ['Time,Mode,X', '0.0,Tracking,']
+
+
+def test_bad_lines_are_counted(tmp_path):
+    logger = Logger(str(tmp_path / 'Test_Log.csv'), ['Time', 'Layer'], ['<f8', '|i1'], 'binary')
+    for line in range(100):
+        logger.writeline([line, 1000 if line == 50 else line])
+    logger.close()
+    assert logger.failed == 1
+    assert isinstance(logger.error, OverflowError)
+    _, (times, _) = read_binary_log(tmp_path / 'Test_Log.bin')
+    assert len(times) == 99
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from lookup_estimator import LookupGridEstimator
+
+
+def test_save_and_load(tmp_path):
+    table = np.random.default_rng(0).normal(size=(4, 5, 6, 3))
+    grid = LookupGridEstimator(table, lower=[-1, -1, -3], cell_size=[0.5, 0.5, 0.25])
+    grid.save(tmp_path / 'lookup_grid.lut', {'samples': 10})
+    loaded = LookupGridEstimator.load(tmp_path / 'lookup_grid.lut')
+    assert np.array_equal(loaded.table, table)
+    hull_angles = np.random.default_rng(1).uniform(0.05, 0.3, (20, 5))
+    assert np.array_equal(loaded.predict(hull_angles), grid.predict(hull_angles))
+
+
+def test_missing_grid_says_how_to_build_it(tmp_path):
+    with pytest.raises(FileNotFoundError, match='build_lookup_grid.py'):
+        LookupGridEstimator.load(tmp_path / 'lookup_grid.lut')
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from sklearn.neural_network import MLPRegressor
+
+from mlp_inference import NumpyMLP
+
+# The networks only need to be fitted well enough to have varied weights
+pytestmark = pytest.mark.filterwarnings('ignore::sklearn.exceptions.ConvergenceWarning')
+
+
+@pytest.fixture(scope='module', params=['tanh', 'relu', 'logistic'])
+def regressor(request):
+    rng = np.random.default_rng(0)
+    inputs = rng.uniform(0.05, 1.5, (500, 5))
+    outputs = np.stack([inputs.sum(axis=1), inputs[:, 0] - inputs[:, 1], np.sin(inputs[:, 2])], axis=1)
+    return MLPRegressor(
+        hidden_layer_sizes=(16, 16, 16, 16),
+        activation=request.param,
+        max_iter=50,
+        random_state=0
+    ).fit(inputs, outputs)
+
+
+@pytest.mark.parametrize('rows', [1, 3, 32])
+def test_matches_sklearn(regressor, rows):
+    inputs = np.random.default_rng(1).uniform(0.05, 1.5, (rows, 5))
+    expected = regressor.predict(inputs)
+    assert np.allclose(NumpyMLP.from_regressor(regressor).predict(inputs), expected, rtol=1e-9, atol=1e-9)
+    assert np.allclose(
+        NumpyMLP.from_regressor(regressor, dtype=np.float32).predict(inputs), expected, rtol=1e-3, atol=1e-3
+    )
+
+
+def test_single_sample(regressor):
+    engine = NumpyMLP.from_regressor(regressor)
+    sample = np.full(5, 0.5)
+    assert engine.predict(sample).shape == (1, 3)
+    assert np.allclose(engine.predict(sample)[0], regressor.predict(sample[np.newaxis])[0])
+
+
+def test_wrong_feature_count(regressor):
+    with pytest.raises(ValueError):
+        NumpyMLP.from_regressor(regressor).predict(np.zeros((2, 4)))
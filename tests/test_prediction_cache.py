@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from config import PREDICTION_CACHE_SIZE
+from displacement_estimator import DisplacementEstimator
+from mlp_inference import NumpyMLP
+from prediction_cache import PredictionCache
+
+
+class CountingRegressor:
+    """A small fixed network that counts the rows it is asked to predict."""
+
+    def __init__(self):
+        rng = np.random.default_rng(0)
+        self.mlp = NumpyMLP(
+            coefs=[rng.normal(size=(5, 8)), rng.normal(size=(8, 3))],
+            intercepts=[rng.normal(size=8), rng.normal(size=3)],
+            activation='tanh',
+            out_activation='identity'
+        )
+        self.rows = 0
+
+    def predict(self, X):
+        self.rows += len(X)
+        return self.mlp.predict(X)
+
+
+def hull_angles(rows, seed=0):
+    return np.random.default_rng(seed).uniform(0.05, 1.5, (rows, 5))
+
+
+def test_hit_returns_the_same_prediction_as_miss():
+    regressor = CountingRegressor()
+    cache = PredictionCache(regressor, maxsize=64)
+    # Rows on the quantization grid, so that the noise below cannot round them onto another key
+    X = np.rint(hull_angles(16) / cache.step) * cache.step
+    missed = cache.predict(X)
+    assert regressor.rows == 16
+    # Noise well below the quantization step lands on the same keys
+    hit = cache.predict(X + 1e-8)
+    assert regressor.rows == 16
+    assert np.array_equal(hit, missed)
+    assert cache.cache_info() == (16, 16, 64, 16)
+    # A cache that has never seen the rows gives the same answer too
+    assert np.array_equal(PredictionCache(CountingRegressor(), maxsize=64).predict(X), missed)
+
+
+def test_predictions_are_for_the_quantized_angles():
+    regressor = CountingRegressor()
+    cache = PredictionCache(regressor, step=1e-3)
+    X = hull_angles(8)
+    assert np.allclose(cache.predict(X), regressor.mlp.predict(np.rint(X / 1e-3) * 1e-3), rtol=0, atol=1e-12)
+
+
+def test_repeated_rows_are_predicted_once():
+    regressor = CountingRegressor()
+    cache = PredictionCache(regressor)
+    X = np.repeat(hull_angles(3), 4, axis=0)
+    predictions = cache.predict(X)
+    assert regressor.rows == 3
+    assert np.array_equal(predictions[::4], predictions[3::4])
+
+
+@pytest.mark.parametrize('maxsize', [1, 8, PREDICTION_CACHE_SIZE])
+def test_least_recently_used_is_evicted(maxsize):
+    regressor = CountingRegressor()
+    cache = PredictionCache(regressor, maxsize=maxsize)
+    X = hull_angles(maxsize + 1)
+    cache.predict(X[:maxsize])
+    # Using the first row again makes the second the least recently used
+    cache.predict(X[:1])
+    cache.predict(X[maxsize:])
+    assert cache.cache_info().currsize == maxsize
+    regressor.rows = 0
+    cache.predict(X[:1])
+    assert regressor.rows == (1 if maxsize == 1 else 0)
+    if maxsize > 1:
+        cache.predict(X[1:2])
+        assert regressor.rows == 1
+
+
+def test_displacement_estimator_cache_size():
+    estimator = DisplacementEstimator(regressor=CountingRegressor(), levels={'0': 1}, cache_size=PREDICTION_CACHE_SIZE)
+    estimator.estimate_displacements(hull_angles(PREDICTION_CACHE_SIZE + 10), ['0'] * (PREDICTION_CACHE_SIZE + 10))
+    assert estimator.cache_info() == (0, PREDICTION_CACHE_SIZE + 10, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_SIZE)
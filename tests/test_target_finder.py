@@ -0,0 +1,99 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from config import HORIZONTAL_FIELD_OF_VIEW, QR_SIZES
+from virtual_camera import VirtualCamera
+
+# Needs the camera, recognizer and drone libraries, and the zbar shared library
+target_finder = pytest.importorskip('target_finder', exc_type=ImportError)
+
+from degradation import DegradationPolicy  # noqa: E402
+from detection import Detection  # noqa: E402
+from displacement_estimator import DisplacementEstimator  # noqa: E402
+from homography_estimator import HomographyEstimator  # noqa: E402
+from target_handler import TargetHandler  # noqa: E402
+
+# The displacement of the drone from each layer's code, in meters
+TRUTH = {0: [0.6, -0.4, 5], 1: [0.2, 0.3, 2], 2: [0.05, -0.05, 0.8]}
+
+
+class Stub:
+    """Accepts any method call and does nothing."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class Camera:
+    """A camera whose frames are blank images of a fixed size."""
+
+    def __init__(self, image_height, image_width):
+        self.shape = (image_height, image_width, 3)
+
+    def get_frame(self):
+        return np.zeros(self.shape, dtype=np.uint8)
+
+
+class Recognizer:
+    """Finds codes whose corners were projected by a VirtualCamera."""
+
+    def __init__(self, detections):
+        self.detections = detections
+
+    def recognize(self, image):
+        return self.detections
+
+
+class Parser:
+    def parse(self, qr_codes, frame_id):
+        return [detection._replace(frame_id=frame_id) for detection in qr_codes]
+
+
+class Guidance:
+    async def update_state(self, detections):
+        pass
+
+
+class DroneControl(Stub):
+    def timing(self):
+        return None
+
+
+@pytest.mark.parametrize('image_height, image_width', [(1024, 1280), (480, 640)])
+def test_loop_body_estimates_with_the_image_size(tmp_path, image_height, image_width):
+    camera = VirtualCamera(HORIZONTAL_FIELD_OF_VIEW, image_width=image_width, image_height=image_height)
+    detections = []
+    for layer, displacement in TRUTH.items():
+        corners = camera.project([displacement], [QR_SIZES[str(layer)]])
+        assert camera.visible(corners).all()
+        detections.append(Detection(layer, f'code {layer}', corners[0], 0))
+
+    # Everything but the estimation is stubbed out, so that no simulator, camera or drone is needed
+    finder = target_finder.TargetFinder.__new__(target_finder.TargetFinder)
+    finder.camera_input = Camera(image_height, image_width)
+    finder.recognizer = Recognizer(detections)
+    finder.detection_parser = Parser()
+    finder.simple_guidance = Guidance()
+    finder.preview_output = Stub()
+    finder.drone_control = DroneControl()
+    finder.handler = TargetHandler()
+    finder.degradation = DegradationPolicy(frame_budget=1, log_filename=str(tmp_path / 'Degradation_Log.csv'))
+    finder.previous_codes = []
+    finder.frame_id = 0
+    # The homography engine depends on the exact image geometry
+    finder.displacement_estimator = DisplacementEstimator(regressor=object(), levels=QR_SIZES,
+                                                          fov=HORIZONTAL_FIELD_OF_VIEW)
+    finder.homography_estimator = HomographyEstimator(levels=QR_SIZES, fov=HORIZONTAL_FIELD_OF_VIEW)
+    finder.pose_refiner = None
+
+    asyncio.run(finder.loop_body())
+    finder.degradation.logger.close()
+
+    snapshot = finder.handler.snapshot()
+    assert snapshot.frame_id == 1
+    for layer, displacement in TRUTH.items():
+        position = np.array(snapshot.targets[layer].getPosition())
+        # Only the rounding of the corners to whole pixels is left
+        assert np.linalg.norm(position - displacement) < 0.02 * np.linalg.norm(displacement)
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from target_handler import LandingZone, TargetHandler
+
+TARGETS = (LandingZone(0, 'code', 0.1, 0.2, 3), None, None)
+
+
+def waiters(handler):
+    # The futures of the coroutines still waiting, which are private to the handler
+    return handler._TargetHandler__waiters
+
+
+def update_later(handler, delay=0.05, **kwargs):
+    """Publish a snapshot from another thread, as the vision loop does for the control loop."""
+    thread = threading.Timer(delay, handler.update, args=(TARGETS,), kwargs=kwargs)
+    thread.start()
+    return thread
+
+
+def test_frame_ids_increase():
+    handler = TargetHandler()
+    assert handler.snapshot().frame_id == 0
+    assert handler.snapshot_after(0) is None
+    assert handler.update(TARGETS).frame_id == 1
+    snapshot = handler.update(TARGETS, frame_id=5, timestamp=123.0)
+    assert snapshot == (5, 123.0, TARGETS)
+    assert handler.get_target(0) == TARGETS[0]
+    assert handler.snapshot_after(4) is snapshot
+    assert handler.snapshot_after(5) is None
+    with pytest.raises(ValueError):
+        handler.update(TARGETS, frame_id=5)
+    assert handler.update(TARGETS).frame_id == 6
+
+
+def test_wait_returns_a_newer_snapshot_at_once():
+    handler = TargetHandler()
+    handler.update(TARGETS)
+    assert asyncio.run(handler.wait_for_snapshot(0)).frame_id == 1
+    assert not waiters(handler)
+
+
+def test_waiter_is_woken_from_another_thread():
+    handler = TargetHandler()
+
+    async def wait():
+        start = time.perf_counter()
+        snapshot = await asyncio.wait_for(handler.wait_for_snapshot(0), timeout=5)
+        return snapshot, time.perf_counter() - start
+
+    thread = update_later(handler, frame_id=3)
+    snapshot, seconds = asyncio.run(wait())
+    thread.join()
+    assert snapshot.frame_id == 3
+    assert seconds < 1
+    assert not waiters(handler)
+
+
+def test_waiters_on_several_event_loops():
+    handler = TargetHandler()
+    results = []
+
+    def wait_in_own_loop():
+        results.append(asyncio.run(asyncio.wait_for(handler.wait_for_snapshot(0), timeout=5)).frame_id)
+
+    threads = [threading.Thread(target=wait_in_own_loop) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while len(waiters(handler)) < len(threads):
+        time.sleep(0.001)
+    handler.update(TARGETS)
+    for thread in threads:
+        thread.join()
+    assert results == [1, 1, 1]
+
+
+def test_timed_out_waiter_is_removed():
+    handler = TargetHandler()
+
+    async def time_out():
+        for _ in range(10):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(handler.wait_for_snapshot(0), timeout=0.001)
+        assert not waiters(handler)
+        # Later waiters are still woken
+        thread = update_later(handler)
+        snapshot = await asyncio.wait_for(handler.wait_for_snapshot(0), timeout=5)
+        thread.join()
+        return snapshot
+
+    assert asyncio.run(time_out()).frame_id == 1
+
+
+def test_cancelled_waiter_is_removed():
+    handler = TargetHandler()
+
+    async def cancel():
+        task = asyncio.create_task(handler.wait_for_snapshot(0))
+        await asyncio.sleep(0)
+        assert len(waiters(handler)) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not waiters(handler)
+        handler.update(TARGETS)
+
+    asyncio.run(cancel())
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from config import QR_SIZES
+from target_tracker import KalmanTargetTracker
+
+
+@pytest.fixture
+def tracker():
+    return KalmanTargetTracker(levels=QR_SIZES)
+
+
+def test_predict_does_not_change_the_track(tracker):
+    assert tracker.predict(0) is None
+    tracker.update([0.5, -0.2, 2], layer=0, timestamp=0)
+    assert tracker.tracking
+    first = tracker.predict(0.5)
+    second = tracker.predict(0.5)
+    assert np.array_equal(first.position, second.position)
+    assert np.array_equal(first.std, second.std)
+    # Predicting ahead only adds uncertainty
+    assert np.all(tracker.predict(0.5).std > tracker.predict(0).std)
+    assert np.allclose(tracker.predict(0).position, [0.5, -0.2, 2])
+
+
+def test_follows_a_constant_velocity(tracker):
+    velocity = np.array([0.3, -0.1, -0.2])
+    start = np.array([1, 0.5, 3])
+    for step in range(60):
+        timestamp = step / 15
+        assert tracker.update(start + velocity * timestamp, layer=0, timestamp=timestamp)
+    target = tracker.predict(4 + 0.5)
+    assert np.allclose(target.velocity, velocity, atol=0.01)
+    assert np.allclose(target.position, start + velocity * 4.5, atol=0.01)
+    # An update at the predicted position hardly moves the track
+    predicted = tracker.predict(4).position
+    tracker.update(predicted, layer=0, timestamp=4)
+    assert np.allclose(tracker.predict(4).position, predicted)
+
+
+def test_estimates_are_weighted_by_layer(tracker):
+    assert tracker.measurement_noise(0, 2) < tracker.measurement_noise(1, 2) < tracker.measurement_noise(2, 2)
+    moved = {}
+    for layer in ('0', '2'):
+        layer_tracker = KalmanTargetTracker(levels=QR_SIZES)
+        layer_tracker.update([0, 0, 2], layer=1, timestamp=0)
+        assert layer_tracker.update([0.1, 0, 2], layer=layer, timestamp=0)
+        moved[layer] = layer_tracker.predict(0).position[0]
+    # The large outer code is trusted much more than the small inner one from the same height
+    assert 0 < moved['2'] < moved['0'] / 3
+
+
+def test_outliers_are_gated(tracker):
+    for step in range(10):
+        tracker.update([0, 0, 2], layer=0, timestamp=step / 15)
+    assert not tracker.update([3, 0, 2], layer=0, timestamp=10 / 15)
+    assert np.allclose(tracker.predict(10 / 15).position, [0, 0, 2], atol=0.01)
+
+
+def test_restarts_after_repeated_outliers(tracker):
+    for step in range(10):
+        tracker.update([0, 0, 2], layer=0, timestamp=step / 15)
+    for step in range(10, 10 + tracker.max_rejections):
+        assert not tracker.update([3, 0, 2], layer=0, timestamp=step / 15)
+    assert tracker.update([3, 0, 2], layer=0, timestamp=1.5)
+    assert np.allclose(tracker.predict(1.5).position, [3, 0, 2])
+
+
+def test_resets_after_losing_the_target(tracker):
+    for step in range(10):
+        tracker.update([0.1 * step, 0, 2], layer=0, timestamp=step / 15)
+    last = 9 / 15
+    assert tracker.predict(last + tracker.max_prediction) is not None
+    assert tracker.predict(last + tracker.max_prediction + 0.01) is None
+    # The next estimate starts a new track there, without the old velocity, however far it is
+    assert tracker.update([-2, 1, 4], layer=0, timestamp=last + 2)
+    target = tracker.predict(last + 2)
+    assert np.allclose(target.position, [-2, 1, 4])
+    assert np.array_equal(target.velocity, np.zeros(3))
+    tracker.reset()
+    assert not tracker.tracking
+    assert tracker.predict(last + 2) is None